@@ -0,0 +1,213 @@
+#! /usr/bin/env python3.5
+
+import asyncio
+import os
+import signal
+import time
+
+import process240
+
+
+# METHODS ######################################################################
+
+################################################################################
+# processes
+################################################################################
+
+async def reap(proc, deadline):
+    """
+    Waits for a process to exit without blocking the event loop, collecting
+    its resource usage.
+    Args:
+        proc (obj): The subprocess.Popen object.
+        deadline (float): A time.monotonic() value after which to give up.
+    Returns:
+        int: The raw wait status, or None if the deadline passed first.
+        obj: The resource usage of the process, or None.
+    """
+    delay = 0.0005
+    while True:
+        pid, wait_status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            return (wait_status, rusage)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return (None, None)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+async def run_stream(command, stdin = None, timeout = 5, max_bytes = None,
+                     max_lines = None, limits = None, semaphore = None):
+    """
+    The asyncio version of process240.run_stream. The output is read through
+    the event loop, so one grader process can wait on any number of runs at
+    once. Every process runs in its own session, and a run that times out,
+    exceeds an output limit or is cancelled is stopped by killing its whole
+    process group.
+    Args:
+        semaphore (:obj): An asyncio.Semaphore held while the process runs,
+                          limiting the child processes of the whole run.
+        The other arguments and the return values are as for
+        process240.run_stream.
+    """
+    if semaphore is None:
+        return await _run_stream(command, stdin, timeout, max_bytes,
+                                 max_lines, limits)
+    async with semaphore:
+        return await _run_stream(command, stdin, timeout, max_bytes,
+                                 max_lines, limits)
+
+async def _run_stream(command, stdin, timeout, max_bytes, max_lines, limits):
+    loop = asyncio.get_event_loop()
+    start = time.monotonic()
+    proc = process240.start_process(command, stdin, limits, new_session=True)
+    reader = asyncio.StreamReader()
+    transport = None
+
+    deadline = start + timeout
+    chunks = []
+    n_bytes = 0
+    n_lines = 0
+    status = "ok"
+    wait_status = None
+    rusage = None
+    try:
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), proc.stdout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                status = "timeout"
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                status = "timeout"
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+            n_bytes += len(chunk)
+            n_lines += chunk.count(b'\n')
+            if process240.output_exceeded(n_bytes, n_lines, max_bytes,
+                                          max_lines):
+                status = "truncated"
+                break
+        if status == "ok":
+            wait_status, rusage = await reap(proc, deadline)
+            if wait_status is None:
+                status = "timeout"
+    finally:
+        if wait_status is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            # SIGKILL cannot be ignored, so this is quick; waiting in the
+            # loop also keeps a cancelled run from leaving a zombie behind
+            _, wait_status, rusage = os.wait4(proc.pid, 0)
+        if transport is not None:
+            transport.close()
+        else:
+            proc.stdout.close()
+        max_rss_kb = process240.child_rss(proc)
+
+    metrics = process240.process_metrics(time.monotonic() - start,
+                                         wait_status, rusage, max_rss_kb)
+    # the process was reaped with os.wait4, so tell Popen not to wait for it
+    proc.returncode = (-os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status)
+                       else os.WEXITSTATUS(wait_status))
+    return (process240.decode_output(chunks, status, max_bytes, max_lines),
+            status, metrics)
+
+async def run(command, stdin = None, timeout = 5, semaphore = None):
+    """
+    The asyncio version of process240.run.
+    """
+    result, status, _ = await run_stream(command, stdin, timeout,
+                                         semaphore=semaphore)
+    if status == "timeout":
+        return "__TIMEOUT__"
+    return result
+
+async def gather_limited(function, items, jobs = 1):
+    """
+    Awaits function(item) for each item, up to jobs at a time.
+    Returns:
+        obj: A list of the results, in the order of items.
+    """
+    limit = asyncio.Semaphore(max(1, jobs))
+
+    async def call(item):
+        async with limit:
+            return await function(item)
+
+    return await asyncio.gather(*[call(item) for item in items])
+
+################################################################################
+# grading
+################################################################################
+
+async def grade_all(grade, students, hw, args, results_dir, student_files_dir,
+                    bundle, index, max_processes, on_result=None):
+    # one semaphore for every compiler and test process in the run; the
+    # students are limited too, so that only so many reports are open
+    semaphore = asyncio.Semaphore(max_processes)
+    student_semaphore = asyncio.Semaphore(max_processes)
+    results = [None] * len(students)
+
+    async def grade_one(i, student):
+        async with student_semaphore:
+            results[i] = await grade(student, hw, args, results_dir,
+                                     student_files_dir, bundle,
+                                     index["students"].get(student),
+                                     semaphore)
+        if on_result is not None:
+            on_result(results[i])
+
+    await asyncio.gather(*[grade_one(i, student)
+                           for i, student in enumerate(students)])
+    return results
+
+def grade_students(grade, students, hw, args, results_dir, student_files_dir,
+                   bundle, index, max_processes, on_result=None):
+    """
+    Grades a list of students in this process on an asyncio event loop,
+    with at most max_processes compilers and test programs running at once.
+    Args:
+        grade (obj): The pipeline for one student, a coroutine function
+                     called with the arguments of
+                     grade240.grade_student_safe_async.
+        students (obj): A list of unix name strings.
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        results_dir (str): The directory report files are written to.
+        student_files_dir (str): The directory executables are built in.
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        index (obj): A course index covering the students (see scan240).
+        max_processes (int): The limit on concurrent child processes.
+        on_result (:obj): Called with each result dict as soon as that
+                          student is finished.
+    Returns:
+        obj: A list of result dicts, in the same order as students.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(grade_all(grade, students, hw, args, results_dir,
+                                      student_files_dir, bundle, index,
+                                      max_processes, on_result))
+    try:
+        return loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        # cancelling kills the process group of every run still going
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        raise
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+# END METHODS ##################################################################
@@ -0,0 +1,524 @@
+#! /usr/bin/env python3.5
+
+import argparse
+import base64
+import json
+import os
+import random
+from shutil import rmtree
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+
+# CONSTANTS ####################################################################
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_HW = "hw1"
+BENCH_SOURCE = "upper.c"
+
+# kinds of synthetic submission and the share of the class that gets each
+DEFAULT_RATIOS = {"correct": 0.7,
+                  "broken": 0.1,
+                  "infinite": 0.05,
+                  "huge": 0.05,
+                  "missing": 0.1}
+
+SOURCES = {
+    "correct": ('#include <stdio.h>\n'
+                '#include <ctype.h>\n\n'
+                'int main(void)\n'
+                '{\n'
+                '  int c;\n'
+                '  while ((c = getchar()) != EOF)\n'
+                '    putchar(toupper(c));\n'
+                '  return 0;\n'
+                '}\n'),
+    "broken": ('#include <stdio.h>\n\n'
+               'int main(void)\n'
+               '{\n'
+               '  printf("missing semicolon\\n")\n'
+               '  return 0;\n'
+               '}\n'),
+    "infinite": ('int main(void)\n'
+                 '{\n'
+                 '  volatile int spin = 1;\n'
+                 '  while (spin)\n'
+                 '    ;\n'
+                 '  return 0;\n'
+                 '}\n'),
+    "huge": ('#include <stdio.h>\n\n'
+             'int main(void)\n'
+             '{\n'
+             '  for (;;)\n'
+             '    puts("all work and no play makes jack a dull boy");\n'
+             '  return 0;\n'
+             '}\n'),
+}
+
+GRADING_CRITERIA = ("----------------------------------------------------------------------\n"
+                    "hw1: Benchmark Grading Criteria\n"
+                    "----------------------------------------------------------------------\n\n"
+                    "uppercase conversion (10)\n\n"
+                    "Total\n"
+                    "10/10\n")
+
+RESULTS_DIR_NAME = "bench_results"
+
+
+# METHODS ######################################################################
+
+################################################################################
+# synthetic course
+################################################################################
+
+def parse_ratios(value):
+    """
+    Parses "kind=share,kind=share" into a dict of submission kind ratios for
+    argparse. Kinds that are not named get a share of 0.
+    """
+    ratios = dict.fromkeys(DEFAULT_RATIOS, 0.0)
+    for item in value.split(","):
+        kind, _, share = item.partition("=")
+        if kind not in ratios:
+            raise argparse.ArgumentTypeError("unknown submission kind: " + kind)
+        try:
+            ratios[kind] = float(share)
+        except ValueError:
+            raise argparse.ArgumentTypeError("bad share for " + kind)
+    if sum(ratios.values()) <= 0:
+        raise argparse.ArgumentTypeError("ratios must add up to more than 0")
+    return ratios
+
+def assign_kinds(n_students, ratios, rng):
+    """
+    Assigns a submission kind to each student in proportion to ratios.
+    Returns:
+        obj: A shuffled list of n_students kind strings.
+    """
+    total = sum(ratios.values())
+    kinds = []
+    for kind in sorted(ratios):
+        kinds += [kind] * int(round(n_students * ratios[kind] / total))
+    while len(kinds) < n_students:
+        kinds.append(max(ratios, key=ratios.get))
+    kinds = kinds[:n_students]
+    rng.shuffle(kinds)
+    return kinds
+
+def student_name(i):
+    return "student" + str(i).rjust(4, '0')
+
+def make_gradebook(students, rng, n_hw=5):
+    """
+    Builds a gradebook in the format of config/sample_gradebook.json.
+    Args:
+        students (obj): A list of unix names.
+        rng (obj): A random.Random instance.
+        n_hw (:int): The number of homeworks in the gradebook.
+    Returns:
+        obj: A list of student dicts, starting with the max_score entry.
+    """
+    max_score = {"unixName": "max_score", "lastName": "score",
+                 "firstName": "max", "withdrawn": 1, "lateUsed": 0}
+    for i in range(1, n_hw + 1):
+        max_score["hw" + str(i).rjust(2, '0')] = 10 * i
+    for i in range(1, 4):
+        max_score["ex" + str(i).rjust(2, '0')] = 100
+        max_score["qz" + str(i).rjust(2, '0')] = 100
+    gradebook = [max_score]
+    for unix in students:
+        student = {"unixName": unix, "lastName": unix, "firstName": "Test",
+                   "withdrawn": 0, "lateUsed": 0}
+        for key, top in max_score.items():
+            if key[:2] in ("hw", "ex", "qz"):
+                student[key] = rng.randint(top // 2, top)
+        gradebook.append(student)
+    return gradebook
+
+def generate_course(workdir, n_students, ratios, n_tests=3, seed=240):
+    """
+    Creates a self-contained workspace with a synthetic course: student
+    submissions, a matching gradebook, support files for BENCH_HW and a
+    config/settings.json pointing at them.
+    Args:
+        workdir (str): The directory to create (emptied if it exists).
+        n_students (int): The number of students.
+        ratios (obj): A dict of submission kind shares (see DEFAULT_RATIOS).
+        n_tests (:int): The number of test input files.
+        seed (:int): Seed for the random choices, so runs are repeatable.
+    Returns:
+        obj: A dict mapping unix names to submission kinds.
+    """
+    rng = random.Random(seed)
+    if os.path.isdir(workdir):
+        rmtree(workdir)
+    course_dir = os.path.join(workdir, "course")
+    os.makedirs(course_dir)
+
+    students = [student_name(i) for i in range(n_students)]
+    kinds = dict(zip(students, assign_kinds(n_students, ratios, rng)))
+    for unix, kind in kinds.items():
+        hw_dir = os.path.join(course_dir, unix, BENCH_HW)
+        os.makedirs(hw_dir)
+        if kind == "missing":
+            # submitted, but under the wrong file name
+            with open(os.path.join(hw_dir, "upper_final.c"), 'w') as f:
+                f.write(SOURCES["correct"])
+        else:
+            with open(os.path.join(hw_dir, BENCH_SOURCE), 'w') as f:
+                f.write(SOURCES[kind])
+
+    support_dir = os.path.join(workdir, "support_files")
+    for sub in ("alt_main", "grading_criteria", "required_files"):
+        os.makedirs(os.path.join(support_dir, sub))
+    with open(os.path.join(support_dir, "grading_criteria", BENCH_HW + "_gc.txt"), 'w') as f:
+        f.write(GRADING_CRITERIA)
+    with open(os.path.join(support_dir, "required_files", BENCH_HW + "_rf.txt"), 'w') as f:
+        f.write(BENCH_SOURCE + "\n")
+    input_dir = os.path.join(support_dir, "test_files", BENCH_HW, "input")
+    output_dir = os.path.join(support_dir, "test_files", BENCH_HW, "output")
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    words = ["cs240", "pointer", "malloc", "struct", "linked", "list", "printf"]
+    for i in range(1, n_tests + 1):
+        lines = [" ".join(rng.choice(words) for _ in range(8))
+                 for _ in range(50 * i)]
+        text = "\n".join(lines) + "\n"
+        with open(os.path.join(input_dir, "test" + str(i)), 'w') as f:
+            f.write(text)
+        with open(os.path.join(output_dir, "test" + str(i)), 'w') as f:
+            f.write(text.upper())
+
+    with open(os.path.join(workdir, "gradebook.json"), 'w') as f:
+        json.dump(make_gradebook(students, rng), f, indent=2)
+    write_settings(workdir, 0)
+    return kinds
+
+def write_settings(workdir, smtp_port):
+    """
+    Writes config/settings.json for a workspace. Email goes to the stub
+    SMTP server on localhost:smtp_port, without STARTTLS or a rate limit.
+    """
+    settings = {"test_mode": False,
+                "grades": {"path": os.path.join(workdir, "gradebook.json")},
+                "course": {"name": "cs240 benchmark",
+                           "path": os.path.join(workdir, "course")},
+                "grader_email": "grader@localhost",
+                "smt": {"user": "grader", "server": "localhost",
+                        "port": smtp_port, "pass": "benchmark", "tls": False,
+                        "messages_per_second": 0}}
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    with open(os.path.join(workdir, "config", "settings.json"), 'w') as f:
+        json.dump(settings, f, indent=2)
+
+################################################################################
+# local SMTP stand-in
+################################################################################
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+    for smtplib to deliver messages. Delivered messages are counted on the
+    server, and their recipients listed, but not stored.
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        self.reply("220 localhost stub SMTP")
+        messages = 0
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', errors='replace').strip()
+            verb = command.split(" ")[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                parts = command.split()
+                if parts[1].upper() == "LOGIN":
+                    self.reply("334 " + base64.b64encode(b"Username:").decode())
+                    self.rfile.readline()
+                    self.reply("334 " + base64.b64encode(b"Password:").decode())
+                    self.rfile.readline()
+                elif len(parts) < 3:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL" and server.max_messages and messages >= server.max_messages:
+                self.reply("421 Too many messages on this connection")
+                return
+            elif verb == "MAIL" and server.hang_up():
+                # drop the session without a reply, like a lost connection
+                return
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[-1].strip(" <>"))
+                self.reply("250 OK")
+            elif verb in ("MAIL", "RSET", "NOOP"):
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                messages += 1
+                with server.lock:
+                    server.messages += 1
+                    server.bytes += size
+                    server.recipients.extend(recipients)
+                recipients = []
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP server for benchmarks and tests. Use port 0 to pick a free
+    port and read it back from server_address. max_messages makes the server
+    drop each connection after that many messages, like a provider limit.
+    hang_up_at lists MAIL commands (numbered from 0 across all connections)
+    that are answered by closing the connection without a reply.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, max_messages=0, hang_up_at=()):
+        socketserver.ThreadingTCPServer.__init__(self, ("localhost", port),
+                                                 StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.max_messages = max_messages
+        self.hang_up_at = set(hang_up_at)
+        self.mail_commands = 0
+        self.messages = 0
+        self.logins = 0
+        self.bytes = 0
+        self.recipients = []
+
+    def hang_up(self):
+        """
+        Counts a MAIL command and returns True if the session should be
+        dropped instead of answering it.
+        """
+        with self.lock:
+            self.mail_commands += 1
+            return self.mail_commands - 1 in self.hang_up_at
+
+    def start(self):
+        """
+        Serves requests on a background thread and returns the port.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+################################################################################
+# benchmark
+################################################################################
+
+def time_tool(workdir, script, args, repeat):
+    """
+    Runs one of the tools in a workspace and times it.
+    Args:
+        workdir (str): The workspace to run in.
+        script (str): The tool's file name, e.g. "grade240.py".
+        args (obj): A list of command line arguments.
+        repeat (int): The number of timed runs.
+    Returns:
+        obj: A list of wall clock times in seconds, or None if the tool
+             failed.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cp = subprocess.run([sys.executable, os.path.join(REPO_DIR, script)] + args,
+                            cwd=workdir,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+        elapsed = time.perf_counter() - start
+        if cp.returncode != 0:
+            print("  " + script + " failed:\n" + cp.stderr)
+            return None
+        times.append(round(elapsed, 4))
+    return times
+
+def git_revision():
+    """
+    Returns the current git commit of the repository, or None.
+    """
+    try:
+        cp = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                            cwd=REPO_DIR,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL,
+                            universal_newlines=True)
+        return cp.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmark(workdir, grade_args, repeat, tools):
+    """
+    Times each tool end to end in a generated workspace.
+    Args:
+        workdir (str): A workspace created by generate_course.
+        grade_args (obj): Extra grade240 command line arguments.
+        repeat (int): The number of timed runs per tool.
+        tools (obj): The tools to time ("grade240", "status240", "notify240").
+    Returns:
+        obj: A dict mapping tool names to lists of times in seconds.
+    """
+    smtp = StubSMTPServer()
+    write_settings(workdir, smtp.start())
+    timings = {}
+    try:
+        if "grade240" in tools:
+            print("timing grade240 ...")
+            timings["grade240"] = time_tool(workdir, "grade240.py",
+                                            [BENCH_HW] + grade_args, repeat)
+        if "status240" in tools:
+            print("timing status240 ...")
+            timings["status240"] = time_tool(workdir, "status240.py", [], repeat)
+        if "notify240" in tools:
+            print("timing notify240 ...")
+            timings["notify240"] = time_tool(workdir, "notify240.py",
+                                             [BENCH_HW], repeat)
+            print("  stub SMTP server received " + str(smtp.messages) +
+                  " messages over " + str(smtp.logins) + " logins")
+    finally:
+        smtp.stop()
+    return timings
+
+def print_comparison(current, baseline):
+    """
+    Prints median times for each tool next to a baseline run.
+    Args:
+        current (obj): A benchmark result dict.
+        baseline (:obj): An earlier benchmark result dict, or None.
+    """
+    print("\n" + "tool".ljust(12) + "median".rjust(10) +
+          ("baseline".rjust(10) + "speedup".rjust(10) if baseline else ""))
+    for tool, times in sorted(current["timings"].items()):
+        if not times:
+            print(tool.ljust(12) + "failed".rjust(10))
+            continue
+        median = statistics.median(times)
+        line = tool.ljust(12) + ("%.3fs" % median).rjust(10)
+        if baseline and baseline["timings"].get(tool):
+            base = statistics.median(baseline["timings"][tool])
+            line += ("%.3fs" % base).rjust(10) + ("%.2fx" % (base / median)).rjust(10)
+        print(line)
+
+def config_argparser():
+    """
+    Sets up command line options using argparse and returns the argparse
+    argument parser object.
+    """
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic course and time grade240, "
+                    "status240 and notify240 on it end to end.")
+    parser.add_argument("-n",
+                        "--students",
+                        help="Number of students in the synthetic course",
+                        type=int,
+                        default=100)
+    parser.add_argument("-r",
+                        "--ratios",
+                        help="Share of each submission kind, e.g. "
+                             "correct=0.7,broken=0.1,infinite=0.05,huge=0.05,missing=0.1",
+                        type=parse_ratios,
+                        default=DEFAULT_RATIOS)
+    parser.add_argument("-t",
+                        "--tests",
+                        help="Number of test input files",
+                        type=int,
+                        default=3)
+    parser.add_argument("-w",
+                        "--workdir",
+                        help="Directory to generate the course in",
+                        default=os.path.join(os.getcwd(), "bench_workspace"))
+    parser.add_argument("--repeat",
+                        help="Number of timed runs of each tool",
+                        type=int,
+                        default=1)
+    parser.add_argument("--tools",
+                        help="Comma separated tools to time",
+                        default="grade240,status240,notify240")
+    parser.add_argument("--grade-args",
+                        help="Extra arguments for grade240, e.g. \"-j 8\"",
+                        default="")
+    parser.add_argument("-o",
+                        "--output",
+                        help="Where to store the results (default: bench_results/<time>.json)")
+    parser.add_argument("-b",
+                        "--baseline",
+                        help="An earlier results file to compare against")
+    parser.add_argument("--reuse",
+                        help="Reuse an existing workspace instead of regenerating it",
+                        action="store_true")
+    return parser
+
+
+def main():
+    parser = config_argparser()
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir)
+    if not (args.reuse and os.path.isdir(workdir)):
+        print("generating " + str(args.students) + " students in " + workdir)
+        generate_course(workdir, args.students, args.ratios, args.tests)
+
+    grade_args = args.grade_args.split()
+    timings = run_benchmark(workdir, grade_args, args.repeat,
+                            args.tools.split(","))
+    result = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "revision": git_revision(),
+              "students": args.students,
+              "ratios": args.ratios,
+              "tests": args.tests,
+              "grade_args": grade_args,
+              "timings": timings}
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR_NAME, exist_ok=True)
+        output = os.path.join(RESULTS_DIR_NAME,
+                              time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_comparison(result, baseline)
+    print("\nresults written to " + output)
+
+
+# END METHODS ##################################################################
+
+
+if __name__ == '__main__':
+    main()
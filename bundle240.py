@@ -0,0 +1,221 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import json
+import os
+
+from config.settings240 import (ALT_MAIN_PATH_PREFIX,
+                                GRADING_CRITERIA_PATH_PREFIX,
+                                REFERENCE_PATH_PREFIX,
+                                REQUIRED_FILES_PATH_PREFIX,
+                                TEST_FILES_PATH_PREFIX, BUNDLE_CACHE_PATH)
+
+
+# CONSTANTS ####################################################################
+
+# bump when the layout of a bundle changes so old cache files are rebuilt
+BUNDLE_VERSION = 3
+
+
+# METHODS ######################################################################
+
+class BundleError(Exception):
+    """
+    A support file needed to grade a homework is missing or incomplete.
+    """
+
+################################################################################
+# support files
+################################################################################
+
+def support_layout(hw):
+    """
+    Returns the paths of a homework's support files.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+    Returns:
+        obj: A dict with "required_files", "grading_criteria", "alt_main",
+             "input", "output", "nondeterministic", "performance" and
+             "reference" paths.
+    """
+    test_dir = os.path.join(TEST_FILES_PATH_PREFIX, hw)
+    return {"required_files": os.path.join(REQUIRED_FILES_PATH_PREFIX,
+                                           hw + "_rf.txt"),
+            "grading_criteria": os.path.join(GRADING_CRITERIA_PATH_PREFIX,
+                                             hw + "_gc.txt"),
+            "alt_main": os.path.join(ALT_MAIN_PATH_PREFIX, hw + "_am.c"),
+            "input": os.path.join(test_dir, "input"),
+            "output": os.path.join(test_dir, "output"),
+            "nondeterministic": os.path.join(test_dir, "nondeterministic"),
+            "performance": os.path.join(test_dir, "performance"),
+            "reference": os.path.join(REFERENCE_PATH_PREFIX, hw)}
+
+def support_stamps(hw):
+    """
+    Describes every support file and directory of a homework by modification
+    time and size, so a cached bundle can be checked without reading any file
+    contents. Missing paths are recorded as None.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+    Returns:
+        obj: A dict mapping paths to [mtime, size] lists or None.
+    """
+    stamps = {}
+    for support_path in sorted(support_layout(hw).values()):
+        try:
+            st = os.stat(support_path)
+        except OSError:
+            stamps[support_path] = None
+            continue
+        stamps[support_path] = [st.st_mtime, st.st_size]
+        if os.path.isdir(support_path):
+            for name in sorted(os.listdir(support_path)):
+                full = os.path.join(support_path, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                stamps[full] = [st.st_mtime, st.st_size]
+    return stamps
+
+################################################################################
+# bundles
+################################################################################
+
+def build_bundle(hw):
+    """
+    Reads and checks all support files for a homework: the required file
+    list, the grading criteria, the alt_main source and every test input
+    with its expected output. Tests named in the optional
+    test_files/<hw>/nondeterministic file (one per line, or "*" for all)
+    are marked so their results are never memoized. Tests named in the
+    optional test_files/<hw>/performance file are the ones timed against the
+    reference solution in support_files/reference/<hw> (see perf240).
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+    Returns:
+        obj: A json serializable dict with "hw", "required_files" (a list of
+             file names), "grading_criteria" (str), "alt_main" (a path, or
+             None if there is none), "tests" and "stamps". Each test is a
+             dict with "name", "input" (a path, or None when the program is
+             run without input), "input_sha256", "expected" (str), "sha256"
+             of the expected output and "deterministic" (bool).
+             "performance" lists the names of the timed tests and
+             "reference" is the reference solution's directory (or None).
+    Raises:
+        BundleError: if a support file is missing.
+    """
+    layout = support_layout(hw)
+    stamps = support_stamps(hw)
+
+    try:
+        with open(layout["required_files"], 'r') as f:
+            required_files = [line.rstrip("\n") for line in f]
+    except IOError:
+        raise BundleError("Unable to find required files for " + hw + ".")
+
+    try:
+        with open(layout["grading_criteria"], 'r') as f:
+            grading_criteria = f.read() + "\n"
+    except IOError:
+        raise BundleError("Unable to find grading criteria for " + hw + ".")
+
+    alt_main = layout["alt_main"]
+    if not os.path.isfile(alt_main):
+        alt_main = None
+
+    if not os.path.isdir(layout["input"]):
+        raise BundleError("Unable to find test input directory for " + hw +
+                          " (" + layout["input"] + ").")
+    inputs = sorted(os.listdir(layout["input"]))
+    # with no input files the program is run once and compared with output/<hw>
+    if not inputs:
+        names = [(hw, None)]
+    else:
+        names = [(name, os.path.join(layout["input"], name)) for name in inputs]
+
+    nondeterministic = set()
+    if os.path.isfile(layout["nondeterministic"]):
+        with open(layout["nondeterministic"], 'r') as f:
+            nondeterministic = set(line.strip() for line in f if line.strip())
+
+    performance = []
+    if os.path.isfile(layout["performance"]):
+        with open(layout["performance"], 'r') as f:
+            performance = [line.strip() for line in f
+                           if line.strip() and not line.startswith("#")]
+        unknown = set(performance) - set(name for name, _ in names)
+        if unknown:
+            raise BundleError("Unknown performance test " +
+                              ", ".join(sorted(unknown)) + " for " + hw + ".")
+
+    reference = layout["reference"]
+    if not os.path.isdir(reference):
+        reference = None
+
+    tests = []
+    for name, input_path in names:
+        try:
+            with open(os.path.join(layout["output"], name), 'r') as f:
+                expected = f.read()
+        except IOError:
+            raise BundleError("Unable to find expected output " + name +
+                              " for " + hw + ".")
+        input_digest = hashlib.sha256()
+        if input_path is not None:
+            with open(input_path, 'rb') as f:
+                input_digest.update(f.read())
+        tests.append({"name": name,
+                      "input": input_path,
+                      "input_sha256": input_digest.hexdigest(),
+                      "expected": expected,
+                      "sha256": hashlib.sha256(
+                          expected.encode('utf-8', errors='replace')).hexdigest(),
+                      "deterministic": not (name in nondeterministic or
+                                            "*" in nondeterministic)})
+
+    return {"version": BUNDLE_VERSION,
+            "hw": hw,
+            "required_files": required_files,
+            "grading_criteria": grading_criteria,
+            "alt_main": alt_main,
+            "tests": tests,
+            "performance": performance,
+            "reference": reference,
+            "stamps": stamps}
+
+def load_bundle(hw, cache_dir=BUNDLE_CACHE_PATH):
+    """
+    Returns the bundle for a homework, from the on-disk cache if none of the
+    support files have changed since it was built, otherwise by building it
+    and updating the cache.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+        cache_dir (:str): Where parsed bundles are kept. None to skip the
+                          cache.
+    Returns:
+        obj: A bundle dict (see build_bundle).
+    Raises:
+        BundleError: if a support file is missing.
+    """
+    if cache_dir is None:
+        return build_bundle(hw)
+    cache_path = os.path.join(cache_dir, hw + ".json")
+    try:
+        with open(cache_path, 'r') as f:
+            bundle = json.load(f)
+        if (bundle.get("version") == BUNDLE_VERSION and
+                bundle.get("stamps") == support_stamps(hw)):
+            return bundle
+    except (IOError, ValueError):
+        pass
+
+    bundle = build_bundle(hw)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp." + str(os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(bundle, f)
+    os.replace(tmp_path, cache_path)
+    return bundle
+
+# END METHODS ##################################################################
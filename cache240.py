@@ -0,0 +1,285 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import json
+import os
+import re
+from shutil import copyfile, rmtree
+import subprocess
+import tempfile
+
+
+# CONSTANTS ####################################################################
+
+# #include "name" or #include <name>
+INCLUDE_RE = re.compile(r'^\s*#\s*include\s*(?:"([^"]+)"|<([^>]+)>)',
+                        re.MULTILINE)
+
+RESULT_FILE = "result.json"
+EXEC_FILE = "main"
+
+
+# METHODS ######################################################################
+
+################################################################################
+# hashing helpers
+################################################################################
+
+def hash_file(file_path, digest=None):
+    """
+    Feeds the contents of a file into a hashlib digest.
+    Args:
+        file_path (str): The file to hash.
+        digest (:obj): The digest to update. A new sha256 is used if None.
+    Returns:
+        obj: The updated digest.
+    """
+    if digest is None:
+        digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest
+
+def include_dirs(gccflags):
+    """
+    Extracts the -I include directories from a gcc flag string.
+    """
+    return [flag[2:] for flag in gccflags.split() if flag.startswith("-I")]
+
+def local_headers(source_path_list, search_dirs):
+    """
+    Finds every header pulled in with #include "..." by a list of sources,
+    following includes recursively. Headers included with #include <...>
+    are found too if they are in one of search_dirs (as gcc looks in -I
+    directories first); otherwise they are system headers and left out.
+    Args:
+        source_path_list (obj): A list of paths to source files.
+        search_dirs (obj): Extra directories to look for headers in.
+    Returns:
+        obj: A sorted list of (header name, path or None if not found) tuples.
+    """
+    found = {}
+    pending = list(source_path_list)
+    seen = set()
+    while pending:
+        src = pending.pop()
+        if src in seen or not os.path.isfile(src):
+            continue
+        seen.add(src)
+        with open(src, 'r', errors='replace') as f:
+            includes = INCLUDE_RE.findall(f.read())
+        for quoted, angled in includes:
+            if quoted:
+                name = quoted
+                dirs = [os.path.dirname(src)] + search_dirs
+            else:
+                name = angled
+                dirs = search_dirs
+            header = None
+            for d in dirs:
+                candidate = os.path.join(d, name)
+                if os.path.isfile(candidate):
+                    header = candidate
+                    break
+            if header is None and not quoted:
+                continue
+            found.setdefault(name, header)
+            if header is not None:
+                pending.append(header)
+    return sorted(found.items(), key=lambda item: (item[0], item[1] or ''))
+
+_compiler_version = None
+
+def compiler_version():
+    """
+    Returns the gcc version string, so that upgrading gcc invalidates the cache.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        try:
+            cp = subprocess.run(["gcc", "--version"],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+            _compiler_version = cp.stdout
+        except OSError:
+            _compiler_version = ""
+    return _compiler_version
+
+def compile_key(source_path_list, gccflags):
+    """
+    Builds a key identifying the compilation of a list of sources with
+    gccflags.
+    Args:
+        source_path_list (obj): A list of paths to source files.
+        gccflags (str): The gcc flags, e.g. "-I/some/dir -std=c99".
+    Returns:
+        str: A hex digest of the source contents, the headers they include,
+             the gcc flags and the gcc version.
+    """
+    digest = hashlib.sha256()
+    digest.update(compiler_version().encode('utf-8'))
+    digest.update(b'\0flags\0' + gccflags.encode('utf-8'))
+    for src in source_path_list:
+        digest.update(b'\0source\0' + os.path.basename(src).encode('utf-8') + b'\0')
+        hash_file(src, digest)
+    for name, header in local_headers(source_path_list, include_dirs(gccflags)):
+        digest.update(b'\0header\0' + name.encode('utf-8') + b'\0')
+        if header is None:
+            digest.update(b'\0missing\0')
+        else:
+            hash_file(header, digest)
+    return digest.hexdigest()
+
+################################################################################
+# compile cache
+################################################################################
+
+class CompileCache:
+    """
+    An on-disk cache of compiled executables and compiler output.
+
+    Entries are directories under cache_dir named by a sha256 of the source
+    contents, the headers they include, the gcc flags and the gcc version.
+    Each holds the executable and a json file with the compilation result.
+    The modification time of an entry is bumped whenever it is used, and
+    evict() removes the least recently used entries once the cache grows
+    past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, source_path_list, gccflags):
+        """
+        Builds the cache key for compiling a list of sources with gccflags
+        (see compile_key). Any alt_main file should already be in the list.
+        """
+        return compile_key(source_path_list, gccflags)
+
+    def lookup(self, key, exec_path):
+        """
+        Copies a cached executable to exec_path.
+        Args:
+            key (str): A cache key returned by key().
+            exec_path (str): Where to place the executable.
+        Returns:
+            obj: The cached (bool, str) compilation result, or None on a miss.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry, RESULT_FILE), 'r') as f:
+                result = json.load(f)
+            if result["success"]:
+                copyfile(os.path.join(entry, EXEC_FILE), exec_path)
+                os.chmod(exec_path, 0o755)
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (result["success"], result["output"])
+
+    def store(self, key, exec_path, success, output):
+        """
+        Adds a compilation result to the cache. Entries are written to a
+        temporary directory and renamed into place, so concurrent graders
+        never see a partial entry.
+        Args:
+            key (str): A cache key returned by key().
+            exec_path (str): The freshly compiled executable.
+            success (bool): Whether compilation succeeded.
+            output (str): The compilation result string.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            return
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp")
+        try:
+            if success:
+                copyfile(exec_path, os.path.join(tmp, EXEC_FILE))
+            with open(os.path.join(tmp, RESULT_FILE), 'w') as f:
+                json.dump({"success": success, "output": output}, f)
+            os.rename(tmp, entry)
+        except OSError:
+            rmtree(tmp, ignore_errors=True)
+
+    def entries(self):
+        """
+        Lists cache entries as (last used time, size in bytes, path) tuples.
+        """
+        result = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = 0
+            for f in os.listdir(entry):
+                size += os.path.getsize(os.path.join(entry, f))
+            result.append((os.path.getmtime(entry), size, entry))
+        return result
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        Returns:
+            int: The number of entries removed.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+################################################################################
+# shared objects
+################################################################################
+
+def evict_objects(object_dir, max_bytes):
+    """
+    Removes the least recently used shared object files (see
+    grade240.shared_object, which bumps their modification time on use)
+    until object_dir fits in max_bytes, like CompileCache.evict.
+    Returns:
+        int: The number of object files removed.
+    """
+    entries = []
+    try:
+        names = os.listdir(object_dir)
+    except OSError:
+        return 0
+    for name in names:
+        # skip objects still being written (see shared_object)
+        if not name.endswith(".o"):
+            continue
+        object_path = os.path.join(object_dir, name)
+        try:
+            st = os.stat(object_path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, object_path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, object_path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(object_path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+# END METHODS ##################################################################
@@ -0,0 +1,111 @@
+#! /usr/bin/env python3.5
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+
+# CONSTANTS ####################################################################
+
+# subcommands and the modules whose main() runs them; a module (and the
+# settings file it reads) is only imported when its subcommand is used
+COMMANDS = {
+    "grade": "grade240",
+    "status": "status240",
+    "notify": "notify240",
+    "gradebook": "gradebook240",
+    "pack": "pack240",
+}
+
+# the longest a subcommand may take to start (interpreter start up, imports
+# and settings) before "startup" reports it as over budget, in seconds
+STARTUP_BUDGET = 0.15
+
+
+# METHODS ######################################################################
+
+################################################################################
+# startup time
+################################################################################
+
+def time_startup(command, repeat=5):
+    """
+    Times "cli240.py <command> --help" in fresh interpreters, which measures
+    everything a real invocation does before it starts work.
+    Args:
+        command (str): A COMMANDS key.
+        repeat (:int): How many times to run it.
+    Returns:
+        float: The median time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), command,
+                        "--help"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+def check_startup(commands, repeat=5, budget=STARTUP_BUDGET):
+    """
+    Prints each command's startup time against the budget.
+    Returns:
+        bool: True if every command is within budget.
+    """
+    ok = True
+    for command in commands:
+        seconds = time_startup(command, repeat)
+        over = seconds > budget
+        ok = ok and not over
+        print("  " + command.ljust(15, '.') + " " + "%6.3f" % seconds + "s" +
+              ("  OVER BUDGET" if over else ""))
+    print("Budget: " + "%.3f" % budget + "s per command.")
+    return ok
+
+################################################################################
+# command line
+################################################################################
+
+def config_argparser():
+    """
+    Sets up command line options using argparse and returns the argparse
+    argument parser object.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run one of the cs240 grading tools.",
+        epilog="Use \"cli240.py <command> --help\" for a command's options.")
+    parser.add_argument("command",
+                        choices=sorted(COMMANDS) + ["startup"],
+                        help="The tool to run, or \"startup\" to check how "
+                             "quickly each tool starts")
+    parser.add_argument("args",
+                        nargs=argparse.REMAINDER,
+                        help="Arguments for the tool")
+    return parser
+
+
+def main():
+    parser = config_argparser()
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        unknown = [command for command in args.args if command not in COMMANDS]
+        if unknown:
+            parser.error("unknown command: " + ", ".join(unknown))
+        ok = check_startup(args.args or sorted(COMMANDS))
+        sys.exit(0 if ok else 1)
+
+    # hand the remaining arguments to the tool as if it had been run directly
+    sys.argv = [os.path.basename(sys.argv[0]) + " " + args.command] + args.args
+    importlib.import_module(COMMANDS[args.command]).main()
+
+# END METHODS ##################################################################
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import re
+
+
+# CONSTANTS ####################################################################
+
+# normalization modes that can be applied before comparing outputs
+NORMALIZE_MODES = {
+    "trailing": "ignore whitespace at the end of each line",
+    "space": "treat any run of whitespace inside a line as a single space",
+    "blank": "ignore blank lines",
+    "case": "ignore upper/lower case",
+}
+
+NUMBER_RE = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+
+# METHODS ######################################################################
+
+################################################################################
+# normalization
+################################################################################
+
+def normalize(text, modes=()):
+    """
+    Splits program output into lines after applying normalization modes.
+    Leading and trailing whitespace of the whole output is always ignored.
+    Args:
+        text (str): The output to normalize.
+        modes (:obj): A collection of NORMALIZE_MODES keys.
+    Returns:
+        obj: A list of line strings.
+    """
+    lines = text.strip().splitlines()
+    if "trailing" in modes:
+        lines = [line.rstrip() for line in lines]
+    if "space" in modes:
+        lines = [" ".join(line.split()) for line in lines]
+    if "blank" in modes:
+        lines = [line for line in lines if line.strip()]
+    if "case" in modes:
+        lines = [line.lower() for line in lines]
+    return lines
+
+def digest(lines):
+    """
+    Returns a sha256 hex digest of a list of normalized lines.
+    """
+    h = hashlib.sha256()
+    for line in lines:
+        h.update(line.encode('utf-8', errors='replace') + b'\n')
+    return h.hexdigest()
+
+def numbers_close(line_a, line_b, tolerance):
+    """
+    Returns True if two lines have the same tokens, treating numeric tokens
+    as equal when they are within tolerance of each other.
+    """
+    tokens_a = line_a.split()
+    tokens_b = line_b.split()
+    if len(tokens_a) != len(tokens_b):
+        return False
+    for a, b in zip(tokens_a, tokens_b):
+        if a == b:
+            continue
+        if not (NUMBER_RE.match(a) and NUMBER_RE.match(b)):
+            return False
+        if abs(float(a) - float(b)) > tolerance:
+            return False
+    return True
+
+################################################################################
+# diff
+################################################################################
+
+def edit_script(a_ids, b_ids, equal, max_edits):
+    """
+    Finds a shortest edit script between two sequences with Myers' O(ND)
+    algorithm.
+    Args:
+        a_ids (obj): The first sequence (line ids).
+        b_ids (obj): The second sequence (line ids).
+        equal (obj): A function (i, j) -> bool comparing a[i] and b[j].
+        max_edits (int): Give up once more than this many edits are needed.
+    Returns:
+        obj: A list of ("=", i, j), ("-", i, None) and ("+", None, j) tuples,
+             or None if the sequences differ by more than max_edits.
+    """
+    n = len(a_ids)
+    m = len(b_ids)
+    v = {1: 0}
+    trace = []
+    for d in range(0, min(n + m, max_edits) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and equal(x, y):
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return backtrack(trace, n, m, d)
+    return None
+
+def backtrack(trace, n, m, d):
+    """
+    Rebuilds the edit script from the saved Myers frontiers.
+    """
+    script = []
+    x, y = n, m
+    for d in range(d, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v.get(k - 1, -1) < v.get(k + 1, -1)):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k] if d > 0 else 0
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            script.append(("=", x, y))
+        if d > 0:
+            if x == prev_x:
+                script.append(("+", None, prev_y))
+            else:
+                script.append(("-", prev_x, None))
+        x, y = prev_x, prev_y
+    script.reverse()
+    return script
+
+def unified_diff(a, b, script, fromfile, tofile, context):
+    """
+    Formats an edit script as unified diff lines (without line terminators).
+    """
+    changes = [i for i, op in enumerate(script) if op[0] != "="]
+    if not changes:
+        return []
+    lines = ["--- " + fromfile, "+++ " + tofile]
+    groups = []
+    start = changes[0]
+    end = changes[0]
+    for i in changes[1:]:
+        if i - end > 2 * context:
+            groups.append((start, end))
+            start = i
+        end = i
+    groups.append((start, end))
+    for start, end in groups:
+        lo = max(start - context, 0)
+        hi = min(end + context + 1, len(script))
+        hunk = script[lo:hi]
+        a_lines = [op for op in hunk if op[0] != "+"]
+        b_lines = [op for op in hunk if op[0] != "-"]
+        a_start = a_lines[0][1] + 1 if a_lines else 0
+        b_start = b_lines[0][2] + 1 if b_lines else 0
+        if not a_lines:
+            a_start = sum(1 for op in script[:lo] if op[0] != "+")
+        if not b_lines:
+            b_start = sum(1 for op in script[:lo] if op[0] != "-")
+        lines.append("@@ -%d,%d +%d,%d @@" % (a_start, len(a_lines),
+                                              b_start, len(b_lines)))
+        for op, i, j in hunk:
+            if op == "=":
+                lines.append(" " + a[i])
+            elif op == "-":
+                lines.append("-" + a[i])
+            else:
+                lines.append("+" + b[j])
+    return lines
+
+################################################################################
+# comparison
+################################################################################
+
+def compare(actual, expected, modes=(), tolerance=None, max_edits=1000,
+            max_diff_lines=200, context=3, expected_digest=None):
+    """
+    Compares a program's output to the reference output.
+
+    Outputs that are identical after normalization are recognized from their
+    hashes without diffing. Otherwise lines are interned as integers, the
+    common prefix and suffix are trimmed, and the rest is diffed with Myers'
+    algorithm, giving up once more than max_edits edits are needed.
+    Args:
+        actual (str): The student program's output.
+        expected (str): The reference output.
+        modes (:obj): A collection of NORMALIZE_MODES keys.
+        tolerance (:float): Numeric tokens within this distance are equal.
+        max_edits (:int): The largest edit distance to compute a diff for.
+        max_diff_lines (:int): The most diff lines to return.
+        context (:int): Lines of context around each diff hunk.
+        expected_digest (:str): digest() of the normalized expected output,
+                                if already known.
+    Returns:
+        obj: A dict with "verdict" ("pass", "partial" or "fail"), "matched"
+             (reference lines matched), "expected" and "actual" (line counts),
+             "diff" (a list of unified diff lines) and "diff_truncated".
+    """
+    a = normalize(actual, modes)
+    b = normalize(expected, modes)
+    result = {"verdict": "pass", "matched": len(b), "expected": len(b),
+              "actual": len(a), "diff": [], "diff_truncated": False}
+
+    if expected_digest is None:
+        expected_digest = digest(b)
+    if len(a) == len(b) and digest(a) == expected_digest:
+        return result
+
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+
+    def equal(i, j):
+        if a_ids[i] == b_ids[j]:
+            return True
+        return tolerance is not None and numbers_close(a[i], b[j], tolerance)
+
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and equal(prefix, prefix):
+        prefix += 1
+    suffix = 0
+    while (suffix < len(a) - prefix and suffix < len(b) - prefix and
+           equal(len(a) - 1 - suffix, len(b) - 1 - suffix)):
+        suffix += 1
+
+    middle = edit_script(a_ids[prefix:len(a) - suffix],
+                         b_ids[prefix:len(b) - suffix],
+                         lambda i, j: equal(i + prefix, j + prefix),
+                         max_edits)
+    if middle is None:
+        result["matched"] = prefix + suffix
+        result["diff"] = ["Outputs differ by more than " + str(max_edits) +
+                          " lines; first difference at line " +
+                          str(prefix + 1) + ":",
+                          "-" + (a[prefix] if prefix < len(a) else ""),
+                          "+" + (b[prefix] if prefix < len(b) else "")]
+    else:
+        script = [("=", i, i) for i in range(prefix)]
+        for op, i, j in middle:
+            script.append((op,
+                           None if i is None else i + prefix,
+                           None if j is None else j + prefix))
+        for s in range(suffix, 0, -1):
+            script.append(("=", len(a) - s, len(b) - s))
+        result["matched"] = sum(1 for op in script if op[0] == "=")
+        result["diff"] = unified_diff(a, b, script, 'Student Output',
+                                      'Reference Output', context)
+
+    if len(result["diff"]) > max_diff_lines:
+        result["diff"] = result["diff"][:max_diff_lines]
+        result["diff_truncated"] = True
+    if result["matched"] == len(a) == len(b):
+        result["verdict"] = "pass"
+    elif result["matched"] > 0:
+        result["verdict"] = "partial"
+    else:
+        result["verdict"] = "fail"
+    return result
+
+# END METHODS ##################################################################
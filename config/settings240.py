@@ -2,6 +2,7 @@
 
 import json
 from os import path, getcwd
+import sys
 
 settings_path = path.join(getcwd(), "config", "settings.json")
 
@@ -10,8 +11,14 @@ settings_path = path.join(getcwd(), "config", "settings.json")
 with open(settings_path) as settings_file:
     config = json.load(settings_file)
 try:
+    # in test mode no email is sent -- email contents are sent to stdout
+    TEST_MODE = config.get("test_mode", True)
+
     # grade info
     GRADE_JSON_PATH = config["grades"]["path"]
+    # indexed SQLite copy of the gradebook (see gradebook240.py)
+    GRADE_DB_PATH = config["grades"].get("db",
+                                         path.splitext(GRADE_JSON_PATH)[0] + ".db")
 
     # course info
     COURSE_NAME = config["course"]["name"]
@@ -21,6 +28,11 @@ try:
     # smtp server
     SMT_SERV = config["smt"]["server"]
     SMT_PORT = config["smt"]["port"]
+    SMT_TLS = config["smt"].get("tls", True)
+    SMT_MAX_MESSAGES = config["smt"].get("max_messages_per_connection", 50)
+    SMT_WORKERS = config["smt"].get("workers", 4)
+    SMT_RATE = config["smt"].get("messages_per_second", 5)
+    SMT_RETRIES = config["smt"].get("retries", 3)
 
     # credentials
     SMT_USER = config["smt"]["user"]
@@ -36,16 +48,116 @@ ALT_MAIN_PATH_PREFIX = path.join(getcwd(), SUPPORT_DIR_NAME, "alt_main")
 GRADING_CRITERIA_PATH_PREFIX = path.join(getcwd(), SUPPORT_DIR_NAME, "grading_criteria")
 REQUIRED_FILES_PATH_PREFIX = path.join(getcwd(), SUPPORT_DIR_NAME, "required_files")
 TEST_FILES_PATH_PREFIX = path.join(getcwd(), SUPPORT_DIR_NAME, "test_files")
+REFERENCE_PATH_PREFIX = path.join(getcwd(), SUPPORT_DIR_NAME, "reference")
 
 # result file path prefixes ####################################################
 
 RESULTS_PATH_PREFIX = path.join(getcwd(), "results")
 
+# cache paths and limits ######################################################
+
+CACHE_PATH_PREFIX = path.join(getcwd(), "cache")
+COMPILE_CACHE_PATH = path.join(CACHE_PATH_PREFIX, "compile")
+COMPILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+BUNDLE_CACHE_PATH = path.join(CACHE_PATH_PREFIX, "bundles")
+# recorded test results, reused for identical executables and inputs
+RESULT_MEMO_PATH = path.join(CACHE_PATH_PREFIX, "memo")
+RESULT_MEMO_MAX_BYTES = 256 * 1024 * 1024
+# object files for support sources shared by every student (e.g. alt_main)
+SHARED_OBJECT_PATH = path.join(CACHE_PATH_PREFIX, "objects")
+SHARED_OBJECT_MAX_BYTES = 64 * 1024 * 1024
+# sizes, modification times and content hashes of the files in every
+# student's homework directories, from the last scan of COURSE_DIR
+COURSE_INDEX_PATH = path.join(CACHE_PATH_PREFIX, "course_index.json")
+# helper programs the grader builds for itself (see process240)
+HELPER_PATH = path.join(CACHE_PATH_PREFIX, "bin")
+
+# test output limits ###########################################################
+
+OUTPUT_MAX_BYTES = 1024 * 1024
+OUTPUT_MAX_LINES = 20000
+
+# per-process limits applied to test runs in sandbox mode (with prlimit).
+# "processes" is RLIMIT_NPROC, which the kernel checks against every process
+# of the user running the test, not just the test's own. It is only a
+# backstop against fork bombs (a test's process group is killed when it
+# times out), so it is set far above what graders sharing a host and user
+# (-j, --async, several --worker processes) run at once; a small value would
+# make tests that fork fail or pass depending on what else is running.
+SANDBOX_LIMITS = {
+    "cpu": 5,                           # seconds of cpu time
+    "memory": 512 * 1024 * 1024,        # bytes of address space
+    "file_size": 16 * 1024 * 1024,      # bytes written to any one file
+    "processes": 4096                   # processes for the grading user
+}
+
+# number of test inputs run at the same time for one student
+TEST_JOBS = 4
+
+# number of a student's source files compiled at the same time
+COMPILE_JOBS = 4
+
+# number of compilers and test programs run at the same time by grade240 --async
+ASYNC_MAX_PROCESSES = 64
+
+# performance tests (grade240 --perf) #########################################
+
+# timed runs of each performance test, after the untimed warmup runs
+PERF_RUNS = 5
+PERF_WARMUP = 1
+# seconds allowed for each timed run
+PERF_TIMEOUT = 30
+# cpu times below this many seconds count as this many, so that the noise in
+# very fast runs does not turn into large slowdowns
+PERF_MIN_SECONDS = 0.01
+# ratings for a student's slowdown (their median cpu time over the reference
+# solution's, geometric mean over the performance tests); the first rating
+# whose limit the slowdown does not exceed is used. Refer to the ratings in
+# the homework's grading criteria.
+PERF_THRESHOLDS = [
+    (1.5, "EFFICIENT"),
+    (4.0, "ACCEPTABLE"),
+    (10.0, "SLOW"),
+    (None, "TOO SLOW")
+]
+
+# watch mode (grade240 --watch) ###############################################
+
+# seconds a submission must go unchanged before it is graded
+WATCH_SETTLE = 10.0
+# seconds between scans when inotify is not available
+WATCH_POLL_INTERVAL = 2.0
+
+# coordinator / worker mode (grade240 --coordinator, --worker) ################
+
+# students per work item
+DIST_SHARD_SIZE = 10
+# seconds a worker holds a work item without renewing its lease
+DIST_LEASE_SECONDS = 120.0
+# times a work item is handed out before its students are given up on
+DIST_MAX_ATTEMPTS = 3
+# seconds between checks of the queue
+DIST_POLL_INTERVAL = 1.0
+
+# grade emails (notify240) ####################################################
+
+# reports larger than this many bytes are sent gzipped by notify240 --compress
+NOTIFY_INLINE_MAX_BYTES = 256 * 1024
+
+# output comparison limits #####################################################
+
+DIFF_MAX_EDITS = 1000
+DIFF_MAX_LINES = 200
+
 # default error strings ########################################################
 
 TIMEOUT_MSG = ("Execution timed out. The most common reason for this is an "
              + "infinite loop.\n")
 
+TRUNCATED_MSG = ("OUTPUT TRUNCATED: execution was stopped after exceeding the "
+               + "output limit. The most common reason for this is an "
+               + "infinite loop.\n")
+
 MISSING_MSG = ("Homework file/directory not found.\n" +
                "  If you completed this homework, contact instructor.\n" +
                "  DO NOT modify your hw directory in any way, as this will " +
@@ -0,0 +1,248 @@
+#! /usr/bin/env python3.5
+
+import fcntl
+import json
+import os
+import socket
+import time
+from shutil import rmtree
+
+
+# CONSTANTS ####################################################################
+
+QUEUE_DIR_NAME = ".queue"
+JOB_FILE = "job.json"
+LOCK_FILE = "lock"
+FINISHED_FILE = "finished"
+
+
+# METHODS ######################################################################
+
+################################################################################
+# helpers
+################################################################################
+
+def worker_name():
+    """
+    Returns a name for this worker process that is unique across hosts.
+    """
+    return socket.gethostname() + ":" + str(os.getpid())
+
+def write_json(file_path, data):
+    """
+    Writes a json file through a temporary file and a rename, so readers on
+    other hosts never see a partial file.
+    """
+    tmp_path = file_path + ".tmp." + worker_name()
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, file_path)
+
+def read_json(file_path):
+    """
+    Reads a json file, returning None if it is missing or unreadable.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def shard(students, shard_size):
+    """
+    Splits a list of students into work items of at most shard_size students.
+    """
+    shard_size = max(1, shard_size)
+    return [students[i:i + shard_size]
+            for i in range(0, len(students), shard_size)]
+
+################################################################################
+# shard queue
+################################################################################
+
+class ShardQueue:
+    """
+    A work queue kept in a directory that the coordinator and every worker
+    can reach (e.g. the course directory on the shared home filesystem):
+
+        job.json           the homework and grading options
+        items/<id>.json    shards of students still to be graded
+        leases/<id>.json   which worker holds a shard, and until when
+        done/<id>.json     a finished shard's results, including reports
+        finished           written by the coordinator once it is done
+
+    Claims, lease renewals and completions happen under an fcntl lock on
+    the lock file (POSIX locks, which NFS supports). A lease that is not
+    renewed before it expires, because its worker crashed or lost its
+    connection, can be claimed by another worker. Lease times are wall
+    clock times, so hosts should keep their clocks in sync.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+
+    def path(self, *parts):
+        return os.path.join(self.queue_dir, *parts)
+
+    def lock(self):
+        return _QueueLock(self.path(LOCK_FILE))
+
+    def create(self, job, shards):
+        """
+        Replaces any earlier queue with a new job.
+        Args:
+            job (obj): A json serializable description of the job.
+            shards (obj): A list of lists of students.
+        """
+        if os.path.isdir(self.queue_dir):
+            rmtree(self.queue_dir)
+        for sub in ("items", "leases", "done"):
+            os.makedirs(self.path(sub))
+        for i, students in enumerate(shards):
+            shard_id = str(i).rjust(5, '0')
+            write_json(self.path("items", shard_id + ".json"),
+                       {"id": shard_id, "students": students, "attempts": 0})
+        write_json(self.path(JOB_FILE), job)
+
+    def job(self):
+        """
+        Returns the job description, or None if there is no queue.
+        """
+        return read_json(self.path(JOB_FILE))
+
+    def items(self):
+        """
+        Returns the shards not yet completed.
+        """
+        try:
+            names = sorted(os.listdir(self.path("items")))
+        except OSError:
+            return []
+        items = [read_json(self.path("items", name)) for name in names
+                 if name.endswith(".json")]
+        return [item for item in items if item is not None]
+
+    def claim(self, worker, lease_seconds, max_attempts):
+        """
+        Takes a lease on the first shard that is neither completed nor
+        leased to a live worker.
+        Args:
+            worker (str): The claiming worker's name.
+            lease_seconds (float): How long the lease lasts unless renewed.
+            max_attempts (int): Shards claimed this many times are skipped.
+        Returns:
+            obj: The shard's item dict, or None if no shard is available.
+        """
+        with self.lock():
+            now = time.time()
+            for item in self.items():
+                lease = read_json(self.path("leases", item["id"] + ".json"))
+                if lease is not None and lease["expires"] > now:
+                    continue
+                if item["attempts"] >= max_attempts:
+                    continue
+                item["attempts"] += 1
+                write_json(self.path("items", item["id"] + ".json"), item)
+                write_json(self.path("leases", item["id"] + ".json"),
+                           {"worker": worker, "expires": now + lease_seconds})
+                return item
+        return None
+
+    def renew(self, shard_id, worker, lease_seconds):
+        """
+        Extends a lease.
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        with self.lock():
+            lease_path = self.path("leases", shard_id + ".json")
+            lease = read_json(lease_path)
+            if lease is None or lease["worker"] != worker:
+                return False
+            lease["expires"] = time.time() + lease_seconds
+            write_json(lease_path, lease)
+            return True
+
+    def complete(self, shard_id, worker, results):
+        """
+        Records a shard's results and removes it from the queue. If another
+        worker already completed the shard, its results are kept instead.
+        """
+        with self.lock():
+            done_path = self.path("done", shard_id + ".json")
+            if not os.path.isfile(done_path):
+                write_json(done_path, {"id": shard_id, "worker": worker,
+                                       "results": results})
+            for sub in ("items", "leases"):
+                try:
+                    os.remove(self.path(sub, shard_id + ".json"))
+                except OSError:
+                    pass
+
+    def collect(self, seen):
+        """
+        Returns completed shards not in seen, adding their ids to seen.
+        Returns:
+            obj: A list of done dicts ({"id", "worker", "results"}).
+        """
+        done = []
+        try:
+            names = sorted(os.listdir(self.path("done")))
+        except OSError:
+            return done
+        for name in names:
+            shard_id = name[:-len(".json")]
+            if not name.endswith(".json") or shard_id in seen:
+                continue
+            entry = read_json(self.path("done", name))
+            if entry is not None:
+                seen.add(shard_id)
+                done.append(entry)
+        return done
+
+    def stuck(self, max_attempts):
+        """
+        Returns the shards that used up their attempts and are not leased.
+        """
+        now = time.time()
+        stuck = []
+        for item in self.items():
+            lease = read_json(self.path("leases", item["id"] + ".json"))
+            if (item["attempts"] >= max_attempts and
+                    (lease is None or lease["expires"] <= now)):
+                stuck.append(item)
+        return stuck
+
+    def remove(self, shard_id):
+        """
+        Drops a shard from the queue without results.
+        """
+        with self.lock():
+            for sub in ("items", "leases"):
+                try:
+                    os.remove(self.path(sub, shard_id + ".json"))
+                except OSError:
+                    pass
+
+    def finish(self):
+        with open(self.path(FINISHED_FILE), 'w') as f:
+            f.write(worker_name() + "\n")
+
+    def finished(self):
+        return os.path.isfile(self.path(FINISHED_FILE))
+
+class _QueueLock:
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+
+    def __enter__(self):
+        self.file = open(self.lock_path, 'a')
+        fcntl.lockf(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+# END METHODS ##################################################################
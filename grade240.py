@@ -1,13 +1,26 @@
 #! /usr/bin/env python3.5
 
 import argparse
+import bundle240
 from datetime import datetime, timezone, timedelta
-import difflib
+import io
 import json
 import os
+import queue
+import signal
+from cache240 import CompileCache, compile_key, evict_objects, local_headers
+import compare240
 from config.settings240 import *
-from shutil import rmtree
-import subprocess
+from gradebook240 import GradebookError, open_gradebook
+import manifest240
+import memo240
+import pack240
+import process240
+from process240 import run, run_stream
+import scan240
+from trace240 import StageTimer
+import trace240
+from shutil import copy2, rmtree, which
 import sys
 import time
 
@@ -25,6 +38,31 @@ DEADLINE = time.mktime(DEADLINE_DT.timetuple())
 # config methods
 ################################################################################
 
+def normalize_modes(value):
+    """
+    Parses a comma separated list of normalization modes for argparse.
+    """
+    modes = [mode for mode in value.split(",") if mode]
+    for mode in modes:
+        if mode not in compare240.NORMALIZE_MODES:
+            raise argparse.ArgumentTypeError("unknown normalization: " + mode)
+    return modes
+
+def at_least(minimum):
+    """
+    Returns an argparse type for whole numbers no smaller than minimum.
+    """
+    def count(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError("not a whole number: " + value)
+        if number < minimum:
+            raise argparse.ArgumentTypeError("must be at least " +
+                                             str(minimum) + ": " + value)
+        return number
+    return count
+
 def config_argparser():
     """
     Sets up command line options using argparse and returns the argparse
@@ -56,21 +94,108 @@ def config_argparser():
                         "--make",
                         help="Include if this homework should be compiled with a makefile",
                         action="store_true")
+    parser.add_argument("-j",
+                        "--jobs",
+                        help="Number of students to grade in parallel",
+                        type=int,
+                        default=1)
+    parser.add_argument("--async",
+                        help="Grade every student in this one process with asyncio instead of -j worker processes, running up to N compilers and tests at once (default "
+                             + str(ASYNC_MAX_PROCESSES) + ")",
+                        metavar="N",
+                        dest="async_processes",
+                        type=int,
+                        nargs="?",
+                        const=ASYNC_MAX_PROCESSES)
+    parser.add_argument("-t",
+                        "--test-jobs",
+                        help="Number of test inputs to run in parallel for each student",
+                        type=int,
+                        default=TEST_JOBS)
+    parser.add_argument("-i",
+                        "--incremental",
+                        help="Only grade students whose submission or the support files changed since the last run",
+                        action="store_true")
+    parser.add_argument("--max-output-bytes",
+                        help="Stop a test run once it prints this many bytes",
+                        type=int,
+                        default=OUTPUT_MAX_BYTES)
+    parser.add_argument("--max-output-lines",
+                        help="Stop a test run once it prints this many lines",
+                        type=int,
+                        default=OUTPUT_MAX_LINES)
+    parser.add_argument("--normalize",
+                        help="Comma separated normalizations applied before comparing output ("
+                             + ", ".join(sorted(compare240.NORMALIZE_MODES)) + ")",
+                        type=normalize_modes,
+                        default=[])
+    parser.add_argument("--tolerance",
+                        help="Treat numbers in the output as equal if within this tolerance",
+                        type=float)
+    parser.add_argument("-s",
+                        "--sandbox",
+                        help="Run tests under the SANDBOX_LIMITS resource limits and report per-test metrics",
+                        action="store_true")
+    parser.add_argument("--perf",
+                        help="Also time the performance tests against the reference solution and rate each submission's slowdown",
+                        action="store_true")
+    parser.add_argument("--perf-runs",
+                        help="Timed runs of each performance test",
+                        type=at_least(1),
+                        default=PERF_RUNS)
+    parser.add_argument("--perf-warmup",
+                        help="Untimed runs of each performance test before the timed runs",
+                        type=at_least(0),
+                        default=PERF_WARMUP)
+    parser.add_argument("--no-cache",
+                        help="Always recompile instead of reusing cached executables",
+                        dest="cache",
+                        action="store_false")
+    parser.add_argument("--no-memo",
+                        help="Always run every test instead of reusing results recorded for identical executables and inputs",
+                        dest="memo",
+                        action="store_false")
+    parser.add_argument("-p",
+                        "--pack",
+                        help="Append reports to one packed archive (results/hwN_results/reports.pack) instead of a file per student",
+                        action="store_true")
+    parser.add_argument("-w",
+                        "--watch",
+                        help="Keep running and grade each submission in the background when it changes (implies -i)",
+                        action="store_true")
+    parser.add_argument("--settle",
+                        help="Seconds a submission must go unchanged before watch mode grades it",
+                        type=float,
+                        default=WATCH_SETTLE)
+    parser.add_argument("--coordinator",
+                        help="Queue the students to grade for --worker processes (on any host sharing this directory) and collect their reports",
+                        action="store_true")
+    parser.add_argument("--worker",
+                        help="Grade students from the queue of a --coordinator run, -j at a time, until the queue is empty",
+                        action="store_true")
+    parser.add_argument("--shard-size",
+                        help="Students per work item in coordinator mode",
+                        type=int,
+                        default=DIST_SHARD_SIZE)
     return parser
 
 ################################################################################
 # submission time methods
 ################################################################################
 
-def time_submitted(file_path):
+def time_submitted(file_path, mtime=None):
     """
     Gets the time a file was last modified.
     Args:
         file_path (str): the path to the file whose last edit time is desired.
+        mtime (:float): The file's modification time if already known (e.g.
+                        from the course index), to save a stat.
     Returns:
         float: epoch time of last modification time of filepath as a float.
     """
-    last_mod_ts = time.localtime(os.path.getmtime(file_path))
+    if mtime is None:
+        mtime = os.path.getmtime(file_path)
+    last_mod_ts = time.localtime(mtime)
     return time.mktime(last_mod_ts)
 
 def format_time(time_float):
@@ -98,7 +223,7 @@ def is_late(time_submitted):
     else:
         return False
 
-def check_submission_time(list_of_files, output, hw):
+def check_submission_time(list_of_files, output, hw, mtimes=None):
     """
     For each file in a list, determine whether it was submitted late or not and
     write the result to the provided output file.
@@ -106,13 +231,17 @@ def check_submission_time(list_of_files, output, hw):
         list_of_files (obj): A list of file paths to check.
         output (obj): The file object to write results to.
         hw (str): The homework being graded (e.g., "hw2").
+        mtimes (:obj): A dict mapping the paths to their modification times,
+                       if already known.
     """
+    mtimes = mtimes or {}
     for fp in list_of_files:
+        submitted = time_submitted(fp, mtimes.get(fp))
         output.write(format_time(DEADLINE) + " (" + hw + " deadline)\n")
-        output.write(format_time(time_submitted(fp)) +
+        output.write(format_time(submitted) +
                     " (" + os.path.basename(os.path.normpath(fp)) +
                     " submission time)\n")
-        if is_late(time_submitted(fp)):
+        if is_late(submitted):
             output.write("LATE SUBMISSION.\n")
     output.write(DIVIDER)
 
@@ -120,60 +249,272 @@ def check_submission_time(list_of_files, output, hw):
 # compile and run methods
 ################################################################################
 
-def run(command, stdin = None, timeout = 5):
+def compile(source_path_list, exec_path, gccflags='', cache=None, objects=(),
+            jobs=1):
     """
-    Invokes an executable in the shell and returns the output as a string.
+    Compile C source code.
     Args:
-        command (str): The string to execute in the shell.
-        stdin(:string): File to be treated as standard in.
-        timeout(:int): How long to wait (in seconds) before timing out.
+        source_path_list(obj): A list of paths to required source files.
+        exec_path(str): The path to the executable.
+        gccflags(str): A string containing any gcc flags to compile with.
+        cache(:obj): A CompileCache to reuse earlier compilations from.
+        objects(:obj): (source path, object file path) pairs for support
+                       sources compiled ahead of time (see shared_object).
+                       They are linked in instead of being compiled again.
+        jobs(:int): How many translation units to compile at the same time.
     Returns:
-        str: The output produced by the command being executed or "__TIMEOUT__"
-             if the command fails to complete within specified timeout.
+        bool: True if compilation was successful, False otherwise.
+        str: A string describing the compilation result, including errors.
     """
-    try:
-        if not stdin is None:
-            in_file = open(stdin, 'r')
-            cp = subprocess.run(command.split(),
-                                stdin=in_file,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,
-                                timeout=timeout,
-                                universal_newlines=True)
-            in_file.close()
-            return cp.stdout
-        else:
-            cp = subprocess.run(command.split(),
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,
-                                timeout=timeout,
-                                universal_newlines=True)
-            return cp.stdout
-    except subprocess.TimeoutExpired:
-        return "__TIMEOUT__"
+    key, cached = compile_lookup(cache, source_path_list, exec_path, gccflags,
+                                 objects)
+    if cached is not None:
+        return cached
+    command = single_command(source_path_list, exec_path, gccflags, objects)
+    if command is not None:
+        output = run(command)
+    else:
+        output = compile_separately(source_path_list, exec_path, gccflags,
+                                    [obj for _, obj in objects], jobs)
+    return compile_store(cache, key, output, exec_path)
 
-def compile(source_path_list, exec_path, gccflags=''):
+async def compile_async(source_path_list, exec_path, gccflags='', cache=None,
+                        objects=(), jobs=1, semaphore=None):
     """
-    Compile C source code.
+    The asyncio version of compile, for async240. gcc runs through the event
+    loop, holding semaphore while it runs.
+    """
+    import async240
+
+    key, cached = compile_lookup(cache, source_path_list, exec_path, gccflags,
+                                 objects)
+    if cached is not None:
+        return cached
+    command = single_command(source_path_list, exec_path, gccflags, objects)
+    if command is not None:
+        output = await async240.run(command, semaphore=semaphore)
+    else:
+        output = await compile_separately_async(source_path_list, exec_path,
+                                                gccflags,
+                                                [obj for _, obj in objects],
+                                                jobs, semaphore)
+    return compile_store(cache, key, output, exec_path)
+
+def compile_lookup(cache, source_path_list, exec_path, gccflags, objects):
+    """
+    Looks a compilation up in the compile cache, restoring the executable
+    on a hit.
+    Returns:
+        str: The cache key, or None without a cache.
+        obj: The cached compile result, or None.
+    """
+    if cache is None:
+        return (None, None)
+    key = cache.key(list(source_path_list) + [src for src, _ in objects],
+                    gccflags)
+    return (key, cache.lookup(key, exec_path))
+
+def compile_store(cache, key, output, exec_path):
+    """
+    Turns the compiler output into compile's result and keeps it in the
+    compile cache.
+    """
+    result = compile_result(output, exec_path)
+    if cache is not None:
+        cache.store(key, exec_path, result[0], result[1])
+    return result
+
+def single_command(source_path_list, exec_path, gccflags, objects):
+    """
+    Returns the gcc command that builds the executable in one call, for
+    sources with at most one translation unit and no prebuilt objects, or
+    None if they are compiled separately (see compile_separately).
+    """
+    if len(object_targets(source_path_list, exec_path)) > 1 or objects:
+        return None
+    return ("gcc " + gccflags + " %s -o %s" %
+            (" ".join(source_path_list), exec_path))
+
+def compile_result(output, exec_path, failed=None):
+    """
+    Turns the compiler output for an executable into compile's result.
     Args:
-        source_path_list(obj): A list of paths to required source files.
+        output(str): The compiler output.
         exec_path(str): The path to the executable.
-        gccflags(str): A string containing any gcc flags to compile with.
+        failed(:bool): Whether the build failed, if known from more than the
+                       output (see make). Otherwise it failed if the output
+                       mentions an error.
     Returns:
         bool: True if compilation was successful, False otherwise.
         str: A string describing the compilation result, including errors.
     """
-    sources = " ".join(source_path_list)
-    output = run("gcc " + gccflags + " %s -o %s" % (sources, exec_path))
-    if "error" in output:
+    if failed is None:
+        failed = "error" in output
+    if failed:
         return (False,
                 "COMPILATION FAILURE (" +
                 os.path.basename(os.path.normpath(exec_path)) +
                 ")\n" + output + "\n")
+    return (True, "COMPILATION SUCCESSFUL (" +
+            os.path.basename(os.path.normpath(exec_path)) +
+            ")\n")
+
+def make(source_dir, files, exec_path):
+    """
+    Builds an executable with a student's makefile (-m). Their homework
+    files are copied next to the executable and make runs there, so nothing
+    is written into the submission. The makefile has to build the
+    executable under its name (main).
+    Args:
+        source_dir(str): The student's homework directory.
+        files(obj): The paths of its files, relative to source_dir.
+        exec_path(str): The path to the executable.
+    Returns:
+        bool: True if make succeeded and built the executable.
+        str: A string describing the compilation result, including make's
+             output.
+    """
+    output, status, metrics = run_stream(make_command(source_dir, files,
+                                                      exec_path))
+    return make_result(output, status, metrics, exec_path)
+
+async def make_async(source_dir, files, exec_path, semaphore=None):
+    """
+    The asyncio version of make, for async240.
+    """
+    import async240
+
+    output, status, metrics = await async240.run_stream(
+        make_command(source_dir, files, exec_path), semaphore=semaphore)
+    return make_result(output, status, metrics, exec_path)
+
+def make_command(source_dir, files, exec_path):
+    """
+    Copies a student's homework files next to the executable and returns
+    the command that runs their makefile there.
+    """
+    build_dir = os.path.dirname(exec_path)
+    for name in files:
+        path = os.path.join(build_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        copy2(os.path.join(source_dir, name), path)
+    return ("make --no-print-directory -j" + str(COMPILE_JOBS) + " -C " +
+            build_dir)
+
+def make_result(output, status, metrics, exec_path):
+    """
+    Turns make's run_stream result into compile's result.
+    """
+    failed = status != "ok" or metrics["exit_code"] != 0
+    if status == "timeout":
+        output += "make timed out\n"
+    elif not failed and not os.path.isfile(exec_path):
+        failed = True
+        output += ("make did not build " +
+                   os.path.basename(os.path.normpath(exec_path)) + "\n")
+    return compile_result(output, exec_path, failed)
+
+def compile_separately(source_path_list, exec_path, gccflags, objects, jobs=1):
+    """
+    Compiles each C source to an object file next to the executable, up to
+    jobs at a time, then links them with the prebuilt objects. Headers are
+    not compiled (gcc -c would turn them into precompiled headers), and any
+    other inputs go straight to the link. Nothing is linked if any source
+    fails to compile.
+    Returns:
+        str: The compiler output for every source, followed by the linker's.
+    """
+    targets = object_targets(source_path_list, exec_path)
+    commands = [object_command(gccflags, target) for target in targets]
+    if jobs > 1 and len(commands) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            outputs = list(executor.map(run, commands))
     else:
-        return(True, "COMPILATION SUCCESSFUL (" +
-               os.path.basename(os.path.normpath(exec_path)) +
-               ")\n")
+        outputs = [run(command) for command in commands]
+    output = "".join(outputs)
+    if "error" in output:
+        return output
+    return output + run(link_command(source_path_list, exec_path, gccflags,
+                                     targets, objects))
+
+async def compile_separately_async(source_path_list, exec_path, gccflags,
+                                   objects, jobs, semaphore):
+    """
+    The asyncio version of compile_separately, for async240.
+    """
+    import async240
+
+    targets = object_targets(source_path_list, exec_path)
+    commands = [object_command(gccflags, target) for target in targets]
+    outputs = await async240.gather_limited(
+        lambda command: async240.run(command, semaphore=semaphore),
+        commands, jobs)
+    output = "".join(outputs)
+    if "error" in output:
+        return output
+    return output + await async240.run(
+        link_command(source_path_list, exec_path, gccflags, targets, objects),
+        semaphore=semaphore)
+
+def object_command(gccflags, target):
+    """
+    Returns the gcc command that compiles one (source, object) target.
+    """
+    return "gcc " + gccflags + " -c %s -o %s" % target
+
+def link_command(source_path_list, exec_path, gccflags, targets, objects):
+    """
+    Returns the gcc command that links the object files of targets, the
+    inputs that are neither C sources nor headers and the prebuilt objects
+    into the executable.
+    """
+    link = " ".join([obj for _, obj in targets] +
+                    [src for src in source_path_list
+                     if not src.endswith((".c", ".h"))] +
+                    list(objects))
+    return "gcc " + gccflags + " %s -o %s" % (link, exec_path)
+
+def object_targets(source_path_list, exec_path):
+    """
+    Returns (source path, object file path) pairs for compiling each C
+    source separately, with the object files next to the executable.
+    """
+    build_dir = os.path.dirname(exec_path)
+    return [(src, os.path.join(build_dir, str(i) + "_" +
+                               os.path.basename(src) + ".o"))
+            for i, src in enumerate(source_path_list) if src.endswith(".c")]
+
+def shared_object(source_path, gccflags, object_dir):
+    """
+    Compiles a support source shared by every student (e.g. alt_main) to an
+    object file, named by its compile_key so that later runs reuse it.
+    Sources that include headers found only in the student's directory are
+    not shared, since their object would differ between students.
+    Args:
+        source_path (str): The support source.
+        gccflags (str): The gcc flags, without the student's -I directory.
+        object_dir (str): Where to keep object files.
+    Returns:
+        str: The object file path, or None if the source cannot be shared
+             or does not compile on its own.
+    """
+    if any(header is None for _, header in local_headers([source_path], [])):
+        return None
+    os.makedirs(object_dir, exist_ok=True)
+    object_path = os.path.join(object_dir,
+                               compile_key([source_path], gccflags) + ".o")
+    if os.path.isfile(object_path):
+        os.utime(object_path)
+        return object_path
+    tmp_path = object_path + ".tmp" + str(os.getpid())
+    output = run("gcc " + gccflags + " -c %s -o %s" % (source_path, tmp_path))
+    if "error" in output or not os.path.isfile(tmp_path):
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, object_path)
+    return object_path
 
 ################################################################################
 # misc helpers
@@ -187,13 +528,11 @@ def active_students(path_to_json):
     Returns:
         obj: A list of unix name strings.
     """
-    with open(path_to_json) as data_file:
-        data = json.load(data_file)
-    students = []
-    for student in data:
-        if student["withdrawn"] == 0:
-            students.append(student["unixName"])
-    return students
+    gradebook = open_gradebook(path_to_json, GRADE_DB_PATH)
+    try:
+        return gradebook.active_students()
+    finally:
+        gradebook.close()
 
 def empty_dir(dir_path):
     """
@@ -205,44 +544,6 @@ def empty_dir(dir_path):
         rmtree(dir_path)
     os.mkdir(dir_path)
 
-def get_gc_string(hw):
-    """
-    Gets the grading criteria for the homework currently being graded
-    as a string. Ends process if grading criteria is not found.
-    Args:
-        hw (str): The homework currently being graded (e.g., "hw2").
-    Returns:
-        str: The grading criteria or "Error: grading criteria not found."
-    """
-    try:
-        gc_path = os.path.join(GRADING_CRITERIA_PATH_PREFIX, hw + "_gc.txt")
-        with open(gc_path,'r') as f:
-            return f.read() + "\n"
-    except IOError:
-        print("Error: Unable to find grading criteria for " + hw + ".")
-        sys.exit()
-
-def get_rf_list(hw):
-    """
-    Gets the required files for this homework as a list.
-    Ends process if required file list is not found.
-    Args:
-        hw (str): The homework currently being graded (e.g., "hw2").
-    Returns:
-        obj: A list of required file name strings.
-    """
-    try:
-        rf_path = os.path.join(REQUIRED_FILES_PATH_PREFIX, hw + "_rf.txt")
-        files = []
-        with open(rf_path,'r') as f:
-            for line in f:
-                files.append(line[:-1])
-        return files
-    except IOError:
-        print("Error: Unable to find required files for " + hw + ".")
-        sys.exit()
-
-
 def print_source(list_of_files, output):
     """
     Send a list of source files to output, separated by dividers.
@@ -253,75 +554,1088 @@ def print_source(list_of_files, output):
                          os.path.basename(os.path.normpath(src)) + "):\n")
             output.write(f.read() + "\n" + DIVIDER)
 
-def files_exist(list_of_files):
+def write_result(name, result, status, op_string, output, diff=False,
+                 modes=(), tolerance=None, expected_digest=None,
+                 comparison=None):
     """
-    Returns False if any files in argument list of paths are missing.
+    Compares one test's output with the expected output and writes the
+    output, the verdict and optionally the diff to the report, one write per
+    section.
+    Args:
+        name (str): The test name shown in the report.
+        result (str): The output of the student's program.
+        status (str): The run_stream status ("ok" or "truncated").
+        op_string (str): The expected output.
+        output (obj): File to write results to.
+        diff (:bool): Output as diff.
+        modes (:obj): Normalization modes used when comparing.
+        tolerance (:float): Tolerance used when comparing numbers.
+        expected_digest (:str): compare240.digest of the normalized expected
+                                output, if already known.
+        comparison (:obj): The compare240.compare result for this output, if
+                           already known (e.g. from the result memo).
+    Returns:
+        str: The verdict ("pass", "partial" or "fail").
     """
-    for file in list_of_files:
-        if not os.path.isfile(file):
-            return False
-    return True
+    if comparison is None:
+        comparison = compare240.compare(result, op_string, modes, tolerance,
+                                        DIFF_MAX_EDITS, DIFF_MAX_LINES,
+                                        expected_digest=expected_digest)
+    output.write("\n\nOUTPUT: " + name + "\n\n" + result)
+    if status == "truncated":
+        output.write("\n" + TRUNCATED_MSG)
+    output.write("\n\nRESULT: " + comparison["verdict"].upper() + " (" +
+                 str(comparison["matched"]) + "/" +
+                 str(comparison["expected"]) + " reference lines matched)\n")
+    if diff:
+        output.write("\n\nDIFF: " + name + "\n\n" +
+                     "".join(line + "\n" for line in comparison["diff"]))
+        if comparison["diff_truncated"]:
+            output.write("(diff truncated after " + str(DIFF_MAX_LINES) +
+                         " lines)\n")
+        output.write("\n\n")
+    return comparison["verdict"]
 
-def run_tests(hw, executable, output, diff=False):
+def format_metrics(metrics):
+    """
+    Formats run_stream metrics as a line for the report.
+    """
+    line = ("METRICS: wall " + "%.3f" % metrics["wall"] + "s, cpu " +
+            "%.3f" % metrics["cpu"] + "s, peak rss ")
+    if metrics["max_rss_kb"] is not None:
+        line += "%.1f" % (metrics["max_rss_kb"] / 1024) + " MB, "
+    else:
+        line += "unknown, "
+    if metrics["signal"] is not None:
+        line += "killed by " + metrics["signal"]
+    else:
+        line += "exit code " + str(metrics["exit_code"])
+    if metrics.get("memoized"):
+        line += " (memoized from an earlier run)"
+    return line + "\n"
+
+def run_tests(hw, executable, output, diff=False,
+              max_bytes=OUTPUT_MAX_BYTES, max_lines=OUTPUT_MAX_LINES,
+              modes=(), tolerance=None, jobs=1, limits=None, timer=None,
+              bundle=None, memo=None):
     """
     Run an executable with various inputs and print the results to output.
+    Up to jobs inputs are run at the same time; results are always written in
+    the sorted order of the input file names.
     Args:
         hw (str): The homework being graded (e.g., "hw2")
         executable (str): Path to an executable file.
         output (obj): File to write results to.
         diff (:bool): Output as diff.
+        max_bytes (:int): Output limit in bytes for each run.
+        max_lines (:int): Output limit in lines for each run.
+        modes (:obj): Normalization modes used when comparing outputs.
+        tolerance (:float): Tolerance used when comparing numbers.
+        jobs (:int): The number of inputs to run concurrently.
+        limits (:obj): Resource limits for each run (see limit_command).
+                       When given, each test's metrics are also written to
+                       the report.
+        timer (:obj): A StageTimer to record run and compare times with.
+        bundle (:obj): The homework's assignment bundle (see bundle240).
+                       Loaded here if None.
+        memo (:obj): A RunMemo to reuse the results of deterministic tests
+                     from, for byte-identical executables.
+    Returns:
+        obj: A list of {"test", "verdict", "status", "metrics", "memo"}
+             dicts, one per test. "memo" is "hit", "miss" or None if the
+             memo was not used.
+    """
+    if bundle is None:
+        bundle = bundle240.load_bundle(hw)
+    tests = bundle["tests"]
+    lookup = memo_lookup(memo, executable, max_bytes, max_lines, modes,
+                         tolerance, limits)
+
+    def run_test(test):
+        """
+        Returns the run_stream result, the memoized comparison (or None),
+        the memo key (or None) and the memo state for one test.
+        """
+        key, memoized = lookup(test)
+        if memoized is not None:
+            return memoized
+        result, status, metrics = run_stream(executable, stdin=test["input"],
+                                             max_bytes=max_bytes,
+                                             max_lines=max_lines,
+                                             limits=limits)
+        return test_run(key, result, status, metrics)
+
+    # the threads only wait on child processes, so they run in parallel
+    if jobs > 1 and len(tests) > 1:
+        # imported here so single-student runs start quickly
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            runs = list(executor.map(run_test, tests))
+    else:
+        runs = [run_test(test) for test in tests]
+    return report_tests(tests, runs, output, diff, modes, tolerance, limits,
+                        timer, memo)
+
+async def run_tests_async(hw, executable, output, diff=False,
+                          max_bytes=OUTPUT_MAX_BYTES,
+                          max_lines=OUTPUT_MAX_LINES, modes=(),
+                          tolerance=None, jobs=1, limits=None, timer=None,
+                          bundle=None, memo=None, semaphore=None):
+    """
+    The asyncio version of run_tests, for async240. Up to jobs tests run
+    through the event loop at once, each holding semaphore while it runs.
+    """
+    import async240
+
+    if bundle is None:
+        bundle = bundle240.load_bundle(hw)
+    tests = bundle["tests"]
+    lookup = memo_lookup(memo, executable, max_bytes, max_lines, modes,
+                         tolerance, limits)
+
+    async def run_test(test):
+        key, memoized = lookup(test)
+        if memoized is not None:
+            return memoized
+        result, status, metrics = await async240.run_stream(
+            executable, stdin=test["input"], max_bytes=max_bytes,
+            max_lines=max_lines, limits=limits, semaphore=semaphore)
+        return test_run(key, result, status, metrics)
+
+    runs = await async240.gather_limited(run_test, tests, jobs)
+    return report_tests(tests, runs, output, diff, modes, tolerance, limits,
+                        timer, memo)
+
+def test_run(key, result, status, metrics):
+    """
+    Returns a test that was run, rather than found in the result memo, in
+    the form run_tests' run results take.
     """
-    # the path to the input directory
-    input_path = os.path.join(TEST_FILES_PATH_PREFIX, hw, "input")
-    output_path = os.path.join(TEST_FILES_PATH_PREFIX, hw, "output")
-    input_list = list(map(lambda x: input_path + "/" + x, os.listdir(input_path)))
+    return (result, status, metrics, None, key,
+            "miss" if key is not None else None)
 
-    if not input_list:
-        result = run(executable)
-        if result == "__TIMEOUT__":
+def memo_lookup(memo, executable, max_bytes, max_lines, modes, tolerance,
+                limits):
+    """
+    Builds a function that looks a test of executable up in the result memo.
+    The function returns the test's memo key (None for tests that are not
+    memoized) and, on a hit, the memoized run in the form run_tests' run
+    results take; otherwise None.
+    """
+    if memo is None:
+        return lambda test: (None, None)
+    exec_hash = memo240.executable_hash(executable)
+    memo_settings = {"max_bytes": max_bytes,
+                     "max_lines": max_lines,
+                     "limits": limits,
+                     "modes": sorted(modes),
+                     "tolerance": tolerance,
+                     "diff_max_edits": DIFF_MAX_EDITS,
+                     "diff_max_lines": DIFF_MAX_LINES}
+
+    def lookup(test):
+        if not test["deterministic"]:
+            return (None, None)
+        key = memo.key(exec_hash, test, memo_settings)
+        entry = memo.lookup(key)
+        if entry is None:
+            return (key, None)
+        return (key, (entry["output"], entry["status"], entry["metrics"],
+                      entry["comparison"], key, "hit"))
+    return lookup
+
+def report_tests(tests, runs, output, diff=False, modes=(), tolerance=None,
+                 limits=None, timer=None, memo=None):
+    """
+    Compares each test run with its expected output, writes the results to
+    the report in test order and stores new runs in the result memo.
+    Args:
+        tests (obj): The bundle's test dicts.
+        runs (obj): For each test, its output, run status, metrics,
+                    memoized comparison (or None), memo key (or None) and
+                    memo state.
+        The other arguments are as for run_tests.
+    Returns:
+        obj: The run_tests verdicts.
+    """
+    verdicts = []
+    for test, run_result in zip(tests, runs):
+        result, status, metrics, comparison, key, memo_state = run_result
+        name = test["name"]
+        compare_start = time.perf_counter()
+        if status == "timeout":
             output.write(TIMEOUT_MSG)
+            verdict = "fail"
         else:
-            with open(output_path + "/" +hw) as opf:
-                op_string = opf.read()
-            output.write("\n\nOUTPUT: " + hw + "\n\n")
-            for line in result:
-                output.write(line)
-            if diff:
-                output.write("\n\nDIFF: " + hw + "\n\n")
-                for line in difflib.unified_diff(result.strip().splitlines(),
-                                                 op_string.strip().splitlines(),
-                                                 fromfile='Student Output',
-                                                 tofile='Reference Output'):
-                    output.write(line + '\n')
-                output.write("\n\n")
-    else:
-        for input in input_list:
-            result = run(executable, stdin=input)
-            if result == "__TIMEOUT__":
-                output.write(TIMEOUT_MSG)
-            else:
-                op = os.path.basename(os.path.normpath(input))
-                with open(output_path + "/" + op) as opf:
-                    op_string = opf.read()
-                output.write("\n\nOUTPUT: " + op + "\n\n")
-                for line in result:
-                    output.write(line)
-                if diff:
-                    output.write("\n\nDIFF: " + op + "\n\n")
-                    for line in difflib.unified_diff(result.strip().splitlines(),
-                                                     op_string.strip().splitlines(),
-                                                     fromfile='Student Output',
-                                                     tofile='Reference Output',
-                                                     lineterm=''):
-                        output.write(line)
-                    output.write("\n\n")
+            if comparison is None:
+                comparison = compare240.compare(result, test["expected"],
+                                                modes, tolerance,
+                                                DIFF_MAX_EDITS, DIFF_MAX_LINES,
+                                                expected_digest=test.get("digest"))
+                # a run stopped by the cpu limit depends on the machine's
+                # load, so it is not kept (stopping at the output limit is
+                # deterministic)
+                limit_kill = (metrics["signal"] == "SIGXCPU" or
+                              (metrics["signal"] == "SIGKILL" and
+                               status != "truncated"))
+                if key is not None and not limit_kill:
+                    memo.store(key, result, status, metrics, comparison)
+            verdict = write_result(name, result, status, test["expected"],
+                                   output, diff, modes, tolerance,
+                                   test.get("digest"), comparison)
+        if memo_state == "hit":
+            # the numbers were measured on the run the memo entry came from
+            metrics = dict(metrics, memoized=True)
+        if timer is not None:
+            timer.record("run", 0.0 if memo_state == "hit" else metrics["wall"],
+                         name)
+            timer.record("compare", time.perf_counter() - compare_start, name)
+        if limits is not None:
+            output.write(format_metrics(metrics))
+        verdicts.append({"test": name, "verdict": verdict, "status": status,
+                         "metrics": metrics, "memo": memo_state})
     output.write(DIVIDER)
+    return verdicts
 
 
 ################################################################################
 # main
 ################################################################################
 
+def grade_student(student, hw, args, results_dir, student_files_dir, bundle,
+                  entry):
+    """
+    Runs the full grading pipeline (submission time, source, compile, tests,
+    grading criteria) for one student and writes their report file. Each call
+    touches only the student's own report and student_files directory, so
+    students can be graded concurrently. grade_student_async is the same
+    pipeline for async240, and both are built from the same steps.
+    Args:
+        student (str): The unix name of the student to grade.
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        results_dir (str): The directory report files are written to.
+        student_files_dir (str): The directory executables are built in.
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        entry (obj): The student's course index entry (see scan240), None
+                     if the student has no directory.
+    Returns:
+        obj: A dict with the student's unix name, a description of any
+             failure (None if grading succeeded), whether the compile
+             cache was hit ("hit", "miss" or None if not used), the
+             run_tests verdicts and the StageTimer events for each stage.
+             With args.pack the report text is returned as "report" instead
+             of being written to a file.
+    """
+    timer, result, output = start_student(student, args, results_dir)
+    try:
+        grade_submission(student, hw, args, output, results_dir,
+                         student_files_dir, bundle, entry, result, timer)
+        if args.pack:
+            result["report"] = output.getvalue()
+    finally:
+        output.close()
+        timer.total()
+    return result
+
+async def grade_student_async(student, hw, args, results_dir,
+                              student_files_dir, bundle, entry, semaphore):
+    """
+    The asyncio version of grade_student, for async240. Every compiler and
+    test process runs through the event loop, holding semaphore while it
+    runs.
+    """
+    timer, result, output = start_student(student, args, results_dir)
+    try:
+        await grade_submission_async(student, hw, args, output, results_dir,
+                                     student_files_dir, bundle, entry, result,
+                                     timer, semaphore)
+        if args.pack:
+            result["report"] = output.getvalue()
+    finally:
+        output.close()
+        timer.total()
+    return result
+
+def start_student(student, args, results_dir):
+    """
+    Sets up grading one student.
+    Returns:
+        obj: The student's StageTimer.
+        obj: Their result dict (see grade_student).
+        obj: The file their report is written to.
+    """
+    timer = StageTimer(student)
+    result = {"student": student, "failure": None, "compile_cache": None,
+              "tests": [], "timings": timer.events}
+    # packed reports are built in memory and appended to the pack by main
+    if args.pack:
+        output = io.StringIO()
+    else:
+        output = open(os.path.join(results_dir, student), "a")
+    return (timer, result, output)
+
+def grade_submission(student, hw, args, output, results_dir,
+                     student_files_dir, bundle, entry, result, timer):
+    """
+    The body of grade_student. Writes the report to output, fills in result
+    and records each stage with timer.
+    """
+    student_src = prepare_submission(student, hw, output, student_files_dir,
+                                     bundle, entry, result, timer)
+    if student_src is None:
+        return
+
+    # path to executable (always named "main" for grading)
+    student_exec_path = os.path.join(student_files_dir, student, "main")
+
+    # compile student source
+    with timer.stage("compile"):
+        cache = compile_cache(args)
+        if args.make:
+            compile_result, compile_str = make(
+                os.path.join(COURSE_DIR, student, hw),
+                scan240.homework_files(entry, hw), student_exec_path)
+        else:
+            sources, gccflags, objects = compile_inputs(student, hw, args,
+                                                        bundle, student_src)
+            compile_result, compile_str = compile(sources, student_exec_path,
+                                                  gccflags, cache, objects,
+                                                  COMPILE_JOBS)
+        write_compile(output, result, cache, compile_str)
+
+    write_notes(student, hw, args, output, timer)
+
+    if compile_result:
+        # successfully compiled, run program with test input
+        result["tests"] = run_tests(hw, student_exec_path, output,
+                                    timer=timer, bundle=bundle,
+                                    **test_options(args))
+        if args.perf:
+            import perf240
+            result["performance"] = perf240.grade_performance(
+                student_exec_path, bundle, args, result["tests"], output,
+                timer)
+
+    finish_report(student, args, output, results_dir, bundle, result, timer,
+                  compile_result)
+
+async def grade_submission_async(student, hw, args, output, results_dir,
+                                 student_files_dir, bundle, entry, result,
+                                 timer, semaphore):
+    """
+    The body of grade_student_async (see grade_submission).
+    """
+    student_src = prepare_submission(student, hw, output, student_files_dir,
+                                     bundle, entry, result, timer)
+    if student_src is None:
+        return
+
+    student_exec_path = os.path.join(student_files_dir, student, "main")
+
+    with timer.stage("compile"):
+        cache = compile_cache(args)
+        if args.make:
+            compile_result, compile_str = await make_async(
+                os.path.join(COURSE_DIR, student, hw),
+                scan240.homework_files(entry, hw), student_exec_path,
+                semaphore)
+        else:
+            sources, gccflags, objects = compile_inputs(student, hw, args,
+                                                        bundle, student_src)
+            compile_result, compile_str = await compile_async(
+                sources, student_exec_path, gccflags, cache, objects,
+                COMPILE_JOBS, semaphore)
+        write_compile(output, result, cache, compile_str)
+
+    write_notes(student, hw, args, output, timer)
+
+    if compile_result:
+        result["tests"] = await run_tests_async(hw, student_exec_path, output,
+                                                timer=timer, bundle=bundle,
+                                                semaphore=semaphore,
+                                                **test_options(args))
+        if args.perf:
+            import perf240
+            result["performance"] = await perf240.grade_performance_async(
+                student_exec_path, bundle, args, result["tests"], output,
+                timer, semaphore)
+
+    finish_report(student, args, output, results_dir, bundle, result, timer,
+                  compile_result)
+
+def prepare_submission(student, hw, output, student_files_dir, bundle, entry,
+                       result, timer):
+    """
+    The setup and source stages of grading a student: starts their report,
+    checks their required files and their submission time, and prints
+    their source code.
+    Returns:
+        obj: The paths of the student's required files, or None (with
+             result["failure"] set) if the submission cannot be graded.
+    """
+    with timer.stage("setup"):
+        student_src, mtimes = submission_sources(student, hw, output,
+                                                 student_files_dir, bundle,
+                                                 entry, result)
+    if student_src is None:
+        return None
+
+    with timer.stage("source"):
+        check_submission_time(student_src, output, hw, mtimes)
+
+        # print student source code
+        print_source(student_src, output)
+    return student_src
+
+def compile_cache(args):
+    """
+    Returns the CompileCache for the run, or None if it is not used.
+    """
+    # make's results are not cached, the makefile decides what is built
+    if args.cache and not args.make:
+        return CompileCache(COMPILE_CACHE_PATH, COMPILE_CACHE_MAX_BYTES)
+    return None
+
+def write_compile(output, result, cache, compile_str):
+    """
+    Adds the compile result to the report and records whether the compile
+    cache was hit.
+    """
+    if cache is not None:
+        result["compile_cache"] = "hit" if cache.hits else "miss"
+
+    output.write(compile_str)
+    output.write(DIVIDER)
+
+def submission_sources(student, hw, output, student_files_dir, bundle, entry,
+                       result):
+    """
+    Starts a student's report, makes their build directory and checks that
+    their required files are present, using their course index entry.
+    Returns:
+        obj: The paths of the student's required files, or None (with
+             result["failure"] set) if the submission cannot be graded.
+        obj: A dict mapping the paths to their modification times.
+    """
+    output.write("\n\n")
+    output.write(hw + "report for: " + student +"\n")
+    output.write(DIVIDER)
+
+    if entry is None:
+        result["failure"] = "Missing student directory"
+        return (None, None)
+
+    files = scan240.homework_files(entry, hw)
+    if files is None:
+        output.write(MISSING_MSG)
+        result["failure"] = "Missing " + hw + " directory"
+        return (None, None)
+
+    # make a directory for this student
+    os.makedirs(os.path.join(student_files_dir, student))
+
+    # make sure all needed files are present
+    if any(f not in files for f in bundle["required_files"]):
+        output.write(MISSING_MSG)
+        result["failure"] = "Missing required files"
+        return (None, None)
+
+    # collect paths to student's files based on required file doc
+    student_src = []
+    mtimes = {}
+    for f in bundle["required_files"]:
+        student_src.append(os.path.join(COURSE_DIR, student, hw, f))
+        mtimes[student_src[-1]] = files[f]["mtime"]
+    return (student_src, mtimes)
+
+def compile_inputs(student, hw, args, bundle, student_src):
+    """
+    Works out what compile is given for a student.
+    Returns:
+        obj: The sources to compile (the student's, plus alt_main if it has
+             no shared object).
+        str: The gcc flags.
+        obj: The prebuilt (source, object) pairs to link in.
+    """
+    gccflags = "-I" + os.path.join(COURSE_DIR, student, hw)
+    if args.c99mode:
+        gccflags += " -std=c99"
+    sources = list(student_src)
+    objects = []
+    if args.altmain:
+        # link the alt_main object built once for the run if there is one
+        if bundle.get("alt_main_object"):
+            objects.append((bundle["alt_main"], bundle["alt_main_object"]))
+        else:
+            sources.append(bundle["alt_main"])
+    return (sources, gccflags, objects)
+
+def write_notes(student, hw, args, output, timer):
+    """
+    Adds the student's notes.txt to the report when the homework asks for
+    notes (-n).
+    """
+    if not args.notes:
+        return
+    with timer.stage("source"):
+        notes_path = os.path.join(COURSE_DIR, student, hw, "notes.txt")
+        if os.path.isfile(notes_path):
+            print_source([os.path.join(COURSE_DIR, student, hw, "notes.txt")], output)
+        else:
+            output.write("notes.txt file not found.\n")
+            output.write(DIVIDER)
+
+def test_options(args):
+    """
+    Returns the run_tests keyword arguments given by the command line.
+    """
+    memo = None
+    if args.memo:
+        memo = memo240.RunMemo(RESULT_MEMO_PATH, RESULT_MEMO_MAX_BYTES)
+    return {"diff": args.diff,
+            "max_bytes": args.max_output_bytes,
+            "max_lines": args.max_output_lines,
+            "modes": args.normalize,
+            "tolerance": args.tolerance,
+            "jobs": args.test_jobs,
+            "limits": SANDBOX_LIMITS if args.sandbox else None,
+            "memo": memo}
+
+def finish_report(student, args, output, results_dir, bundle, result, timer,
+                  compile_result):
+    """
+    Ends a student's report with the grading criteria and records the
+    outcome of compiling their submission.
+    """
+    with timer.stage("report"):
+        if compile_result and args.sandbox:
+            write_metrics(student, result["tests"], results_dir)
+
+        output.write(bundle["grading_criteria"])
+
+    if not compile_result:
+        result["failure"] = "Compilation failure"
+
+def write_metrics(student, tests, results_dir):
+    """
+    Writes a student's per-test metrics to results/<hw>_results/metrics as a
+    json sidecar file.
+    Args:
+        student (str): The unix name of the student.
+        tests (obj): The list of test dicts returned by run_tests.
+        results_dir (str): The results directory for the homework.
+    """
+    metrics_dir = os.path.join(results_dir, "metrics")
+    os.makedirs(metrics_dir, exist_ok=True)
+    with open(os.path.join(metrics_dir, student + ".json"), 'w') as f:
+        json.dump({"student": student, "tests": tests}, f, indent=1)
+
+def grade_student_safe(student, hw, args, results_dir, student_files_dir,
+                       bundle, entry):
+    """
+    Wraps grade_student so that an unexpected error while grading one student
+    is recorded as a failure instead of aborting the whole run.
+    Returns:
+        obj: The result dict from grade_student.
+    """
+    try:
+        return grade_student(student, hw, args, results_dir, student_files_dir,
+                             bundle, entry)
+    except Exception as e:
+        return grading_error(student, e)
+
+async def grade_student_safe_async(student, hw, args, results_dir,
+                                   student_files_dir, bundle, entry,
+                                   semaphore):
+    """
+    Wraps grade_student_async the way grade_student_safe wraps
+    grade_student.
+    """
+    import asyncio
+
+    try:
+        return await grade_student_async(student, hw, args, results_dir,
+                                         student_files_dir, bundle, entry,
+                                         semaphore)
+    except asyncio.CancelledError:
+        # an interrupted run is not a grading error (before Python 3.8,
+        # CancelledError is an Exception)
+        raise
+    except Exception as e:
+        return grading_error(student, e)
+
+def grading_error(student, e):
+    """
+    Returns the result dict for a student whose grading raised e.
+    """
+    return {"student": student,
+            "failure": "Grading error: " + type(e).__name__ + ": " + str(e),
+            "compile_cache": None,
+            "tests": [],
+            "timings": []}
+
+def grade_students(students, hw, args, results_dir, student_files_dir, bundle,
+                   index, jobs=1, on_result=None):
+    """
+    Grades a list of students, either one at a time, in a pool of worker
+    processes or, with args.async_processes, with every process run from an
+    asyncio event loop in this process (see async240).
+    Args:
+        students (obj): A list of unix name strings.
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        results_dir (str): The directory report files are written to.
+        student_files_dir (str): The directory executables are built in.
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        index (obj): A course index covering the students (see scan240).
+        jobs (:int): The number of students to grade concurrently.
+        on_result (:obj): Called with each result dict as soon as that
+                          student is finished.
+    Returns:
+        obj: A list of grade_student result dicts, in the same order as
+             students.
+    """
+    if args.async_processes:
+        import async240
+        return async240.grade_students(grade_student_safe_async, students,
+                                       hw, args,
+                                       results_dir, student_files_dir, bundle,
+                                       index, args.async_processes, on_result)
+    results = [None] * len(students)
+    if jobs > 1 and len(students) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            for i, student in enumerate(students):
+                future = executor.submit(grade_student_safe, student, hw, args,
+                                         results_dir, student_files_dir, bundle,
+                                         index["students"].get(student))
+                futures[future] = i
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if on_result is not None:
+                    on_result(future.result())
+    else:
+        for i, student in enumerate(students):
+            results[i] = grade_student_safe(student, hw, args, results_dir,
+                                            student_files_dir, bundle,
+                                            index["students"].get(student))
+            if on_result is not None:
+                on_result(results[i])
+    return results
+
+def watch_students(students, hw, args, results_dir, student_files_dir, bundle,
+                   manifest, submissions, record, pack=None):
+    """
+    Watches each student's homework directory and regrades the student in
+    the background once their files have stopped changing for args.settle
+    seconds, keeping the reports and manifest current until interrupted
+    with Ctrl-C.
+    Args:
+        students (obj): A list of unix name strings.
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        results_dir (str): The directory report files are written to.
+        student_files_dir (str): The directory executables are built in.
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        manifest (obj): The grading manifest, already current.
+        submissions (obj): The file_set of each student, updated here.
+        record (obj): Called with each result dict, as in grade_students.
+        pack (:obj): The PackWriter when reports are packed.
+    Returns:
+        obj: A list of grade_student result dicts for the students graded.
+    """
+    import watch240
+    from concurrent.futures import ProcessPoolExecutor
+
+    paths = {student: os.path.join(COURSE_DIR, student, hw)
+             for student in students}
+    watcher = watch240.make_watcher(paths, WATCH_POLL_INTERVAL)
+    debouncer = watch240.Debouncer(args.settle)
+    finished = queue.Queue()
+    running = {}
+    results = []
+    print("\nWatching " + str(len(paths)) + " students' " + hw +
+          " directories (" + type(watcher).__name__ + "); Ctrl-C to stop.")
+
+    def collect():
+        while not finished.empty():
+            future = finished.get()
+            student = running.pop(future)
+            try:
+                result = future.result()
+            except Exception:
+                # the worker was interrupted; the manifest still marks the
+                # student as not graded
+                continue
+            record(result)
+            if pack is not None:
+                pack.flush()
+            results.append(result)
+            print(time.strftime("%H:%M:%S") + " " + student.ljust(15, '.') +
+                  " " + (result["failure"] or "graded"))
+
+    executor = ProcessPoolExecutor(max_workers=max(1, args.jobs))
+    try:
+        while True:
+            collect()
+            timeout = debouncer.next_deadline()
+            if timeout is None or timeout > 1.0:
+                timeout = 1.0
+            debouncer.touch(watcher.poll(timeout))
+            busy = set(running.values())
+            for student in debouncer.settled():
+                if student in busy:
+                    # check again after another settle period
+                    debouncer.touch([student])
+                    continue
+                entry = scan240.scan_student(os.path.join(COURSE_DIR, student),
+                                             [hw])
+                previous = manifest["students"].get(student, {}).get("files")
+                files = manifest240.hash_files(paths[student],
+                                               scan240.homework_files(entry, hw),
+                                               previous)
+                if manifest240.is_current(manifest, student, files,
+                                          manifest["support"]):
+                    continue
+                clear_student_results(student, results_dir, student_files_dir)
+                manifest["students"].pop(student, None)
+                if pack is not None:
+                    pack.remove(student)
+                submissions[student] = files
+                # workers started by this submit inherit SIGINT being
+                # ignored, so Ctrl-C stops the watch loop and lets the
+                # students being graded finish
+                handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+                try:
+                    future = executor.submit(grade_student_safe, student, hw,
+                                             args, results_dir,
+                                             student_files_dir, bundle, entry)
+                finally:
+                    signal.signal(signal.SIGINT, handler)
+                running[future] = student
+                future.add_done_callback(finished.put)
+    except KeyboardInterrupt:
+        print("\nStopping watch mode.")
+    finally:
+        watcher.close()
+        executor.shutdown(wait=True)
+        collect()
+    return results
+
+def coordinate(students, hw, args, results_dir, record):
+    """
+    Puts students on a shard queue in the results directory for --worker
+    processes to grade, and records their results as shards complete.
+    Shards whose workers crashed are handed out again once their lease
+    expires; students in shards that failed DIST_MAX_ATTEMPTS times are
+    recorded as grading errors.
+    Args:
+        students (obj): A list of unix name strings.
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        results_dir (str): The directory report files are written to.
+        record (obj): Called with each result dict.
+    Returns:
+        obj: A list of grade_student result dicts.
+    """
+    import dist240
+
+    shard_queue = dist240.ShardQueue(os.path.join(results_dir,
+                                                   dist240.QUEUE_DIR_NAME))
+    job_args = dict(vars(args))
+    job_args.update(coordinator=False, worker=False, watch=False)
+    shards = dist240.shard(students, args.shard_size)
+    shard_queue.create({"hw": hw, "args": job_args}, shards)
+    print("Queued " + str(len(students)) + " students in " + str(len(shards)) +
+          " shards; start workers with: grade240.py " + hw + " --worker")
+
+    results = []
+    # the ids of finished shards; a shard given up on as stuck can still be
+    # completed by a worker afterwards, and is only counted once
+    seen = set()
+    while len(seen) < len(shards):
+        finished = len(seen)
+        for entry in shard_queue.collect(seen):
+            for result in entry["results"]:
+                record(result)
+                results.append(result)
+            finished += 1
+            print("Shard " + entry["id"] + " graded by " + entry["worker"] +
+                  " (" + str(finished) + "/" + str(len(shards)) + ")")
+        for item in shard_queue.stuck(DIST_MAX_ATTEMPTS):
+            shard_queue.remove(item["id"])
+            if item["id"] in seen:
+                continue
+            seen.add(item["id"])
+            for student in item["students"]:
+                result = {"student": student,
+                          "failure": "Grading error: worker lost " +
+                                     str(item["attempts"]) + " times",
+                          "compile_cache": None, "tests": [], "timings": []}
+                record(result)
+                results.append(result)
+        if len(seen) < len(shards):
+            time.sleep(DIST_POLL_INTERVAL)
+    shard_queue.finish()
+    return results
+
+def work(hw, args):
+    """
+    Grades shards from a coordinator's queue until none are left, keeping
+    each shard's lease alive while it is graded. Executables are built in
+    a private temporary directory; reports go back through the queue.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments (only jobs is used;
+                    the grading options come from the coordinator).
+    """
+    import dist240
+    import tempfile
+    import threading
+
+    results_dir = os.path.join(RESULTS_PATH_PREFIX, hw + "_results")
+    shard_queue = dist240.ShardQueue(os.path.join(results_dir,
+                                                   dist240.QUEUE_DIR_NAME))
+    job = shard_queue.job()
+    if job is None or job["hw"] != hw:
+        print("Error: no coordinator queue for " + hw + " in " + results_dir + ".")
+        sys.exit()
+    job_args = argparse.Namespace(**job["args"])
+    job_args.jobs = args.jobs
+    # reports are returned in the results rather than written here
+    job_args.pack = True
+    name = dist240.worker_name()
+    build_root = tempfile.mkdtemp(prefix="grade240-")
+    bundle = prepare_bundle(hw, job_args, build_root)
+    graded = 0
+    try:
+        while not shard_queue.finished():
+            item = shard_queue.claim(name, DIST_LEASE_SECONDS,
+                                     DIST_MAX_ATTEMPTS)
+            if item is None:
+                if not shard_queue.items():
+                    break
+                # every remaining shard is leased; one may yet expire
+                time.sleep(DIST_POLL_INTERVAL)
+                continue
+
+            stop = threading.Event()
+
+            def heartbeat():
+                while not stop.wait(DIST_LEASE_SECONDS / 3):
+                    shard_queue.renew(item["id"], name, DIST_LEASE_SECONDS)
+
+            renewer = threading.Thread(target=heartbeat, daemon=True)
+            renewer.start()
+            try:
+                student_files_dir = os.path.join(build_root, item["id"])
+                os.makedirs(student_files_dir)
+                index = scan240.scan_course(COURSE_DIR, item["students"], [hw])
+                results = grade_students(item["students"], hw, job_args,
+                                         results_dir, student_files_dir,
+                                         bundle, index, job_args.jobs)
+                rmtree(student_files_dir, ignore_errors=True)
+            finally:
+                stop.set()
+                renewer.join()
+            shard_queue.complete(item["id"], name, results)
+            graded += len(results)
+            print("Graded shard " + item["id"] + " (" +
+                  str(len(results)) + " students)")
+    finally:
+        rmtree(build_root, ignore_errors=True)
+    print("Worker " + name + " graded " + str(graded) + " students.")
+
+def submission_files(student, hw, index, previous_index, changed, manifest):
+    """
+    Describes a student's homework directory with content hashes (see
+    manifest240.hash_files) and keeps the hashes in their index entry. A
+    directory whose files have the same sizes and modification times as in
+    the previous index takes its hashes from there without further work;
+    otherwise only the files that changed are hashed.
+    Args:
+        student (str): The unix name of the student.
+        hw (str): The homework being graded (e.g., "hw2").
+        index (obj): The course index from this run's scan.
+        previous_index (obj): The index saved by the last run, or None.
+        changed (obj): The set of students whose directory changed since
+                       the previous index.
+        manifest (obj): The grading manifest.
+    Returns:
+        obj: The hash_files description, or None if the directory is
+             missing.
+    """
+    indexed = None
+    if previous_index is not None:
+        indexed = scan240.homework_files(
+            previous_index["students"].get(student), hw)
+    files = scan240.homework_files(index["students"][student], hw)
+    if files is None:
+        return None
+    if student not in changed and manifest240.is_hashed(indexed):
+        files = indexed
+    else:
+        previous = indexed or manifest["students"].get(student, {}).get("files")
+        files = manifest240.hash_files(os.path.join(COURSE_DIR, student, hw),
+                                       files, previous)
+    index["students"][student]["homework"][hw]["files"] = files
+    return files
+
+def clear_student_results(student, results_dir, student_files_dir):
+    """
+    Removes a student's report and build directory from an earlier run so
+    they can be regraded in place.
+    """
+    report_path = os.path.join(results_dir, student)
+    if os.path.isfile(report_path):
+        os.remove(report_path)
+    student_dir = os.path.join(student_files_dir, student)
+    if os.path.isdir(student_dir):
+        rmtree(student_dir)
+    metrics_path = os.path.join(results_dir, "metrics", student + ".json")
+    if os.path.isfile(metrics_path):
+        os.remove(metrics_path)
+
+def support_paths(hw):
+    """
+    Lists the support files and directories that determine a homework's
+    reports.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+    Returns:
+        obj: A list of paths.
+    """
+    return [os.path.join(ALT_MAIN_PATH_PREFIX, hw + "_am.c"),
+            os.path.join(GRADING_CRITERIA_PATH_PREFIX, hw + "_gc.txt"),
+            os.path.join(REQUIRED_FILES_PATH_PREFIX, hw + "_rf.txt"),
+            os.path.join(TEST_FILES_PATH_PREFIX, hw),
+            os.path.join(REFERENCE_PATH_PREFIX, hw)]
+
+def grading_options(args):
+    """
+    Collects the command line options and settings that change the content of
+    a report, for the incremental grading manifest.
+    """
+    return {"c99mode": args.c99mode,
+            "notes": args.notes,
+            "altmain": args.altmain,
+            "diff": args.diff,
+            "make": args.make,
+            "max_output_bytes": args.max_output_bytes,
+            "max_output_lines": args.max_output_lines,
+            "normalize": sorted(args.normalize),
+            "tolerance": args.tolerance,
+            "sandbox": args.sandbox,
+            "perf": ([args.perf_runs, args.perf_warmup, PERF_THRESHOLDS]
+                     if args.perf else None),
+            "deadline": DEADLINE}
+
+def latest_results(results):
+    """
+    Keeps the last result of each student, for a run that graded some
+    students more than once (--watch).
+    Returns:
+        obj: A list of result dicts, in the order the students were first
+             graded.
+    """
+    order = []
+    latest = {}
+    for r in results:
+        if r["student"] not in latest:
+            order.append(r["student"])
+        latest[r["student"]] = r
+    return [latest[student] for student in order]
+
+def print_run_summary(results, evicted=0, skipped=0, memo_evicted=0):
+    """
+    Prints the students that could not be fully graded and why, followed by
+    compile cache statistics.
+    Args:
+        results (obj): A list of grade_student result dicts.
+        evicted (:int): The number of compile cache entries evicted.
+        skipped (:int): The number of unchanged students not regraded.
+        memo_evicted (:int): The number of result memo entries evicted.
+    """
+    failures = [r for r in results if r["failure"] is not None]
+    print("\nGraded " + str(len(results)) + " students, " + str(len(failures)) +
+          " with failures.")
+    if skipped:
+        print("Skipped " + str(skipped) + " unchanged students.")
+    for r in failures:
+        print("  " + r["student"].ljust(15, '.') + " " + r["failure"])
+
+    verdicts = [t["verdict"] for r in results for t in r["tests"]]
+    if verdicts:
+        print("Tests: " + str(verdicts.count("pass")) + " passed, " +
+              str(verdicts.count("partial")) + " partial, " +
+              str(verdicts.count("fail")) + " failed.")
+
+    cache_results = [r["compile_cache"] for r in results]
+    if any(cache_results):
+        print("Compile cache: " + str(cache_results.count("hit")) + " hits, " +
+              str(cache_results.count("miss")) + " misses, " +
+              str(evicted) + " entries evicted.")
+
+    memo_results = [t.get("memo") for r in results for t in r["tests"]]
+    if any(memo_results):
+        hits = memo_results.count("hit")
+        lookups = hits + memo_results.count("miss")
+        print("Result memo: " + str(hits) + " hits, " +
+              str(lookups - hits) + " misses (" +
+              "%.0f" % (100.0 * hits / lookups) + "% of deterministic tests " +
+              "reused), " + str(memo_evicted) + " entries evicted.")
+
+    ratings = [r["performance"]["rating"] or "NOT RATED"
+               for r in results if r.get("performance")]
+    if ratings:
+        labels = [label for _, label in PERF_THRESHOLDS] + ["NOT RATED"]
+        print("Performance: " + ", ".join(str(ratings.count(label)) + " " + label
+                                          for label in labels
+                                          if label in ratings) + ".")
+
+def prepare_bundle(hw, args, student_files_dir):
+    """
+    Loads the assignment bundle for a run and adds what is the same for
+    every student: the alt_main object, the normalized expected output
+    digests and, with --perf, the reference solution's timings. Ends the
+    process if a support file is missing.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        student_files_dir (str): The directory executables are built in.
+    Returns:
+        obj: The bundle dict (see bundle240).
+    """
+    try:
+        bundle = bundle240.load_bundle(hw)
+    except bundle240.BundleError as e:
+        print("Error: " + str(e))
+        sys.exit()
+    if args.altmain and bundle["alt_main"] is None:
+        print("Error: Unable to find alt_main for " + hw + ".")
+        sys.exit()
+    # alt_main is the same for every student, so it is compiled once (or
+    # taken from the object cache) and linked into each student's build
+    if args.altmain:
+        object_dir = (SHARED_OBJECT_PATH if args.cache
+                      else os.path.join(student_files_dir, ".objects"))
+        bundle["alt_main_object"] = shared_object(
+            bundle["alt_main"], "-std=c99" if args.c99mode else "", object_dir)
+    # the normalized expected outputs are the same for every student
+    for test in bundle["tests"]:
+        test["digest"] = compare240.digest(
+            compare240.normalize(test["expected"], args.normalize))
+    # the reference solution is timed on the machine that times the
+    # students, so a coordinator leaves it to its workers
+    if args.perf and not args.coordinator:
+        import perf240
+        bundle["reference_times"] = perf240.time_reference(
+            hw, args, bundle, os.path.join(student_files_dir, ".reference"),
+            compile)
+    return bundle
+
 def main():
     parser = config_argparser()
     args = parser.parse_args()
@@ -329,92 +1643,154 @@ def main():
     # the name of the homework to grade, e.g. hw1
     hw = args.homework
 
+    if args.coordinator and (args.worker or args.watch):
+        parser.error("--coordinator cannot be combined with --worker or --watch")
+    if args.sandbox and which(process240.PRLIMIT) is None:
+        parser.error("--sandbox needs " + process240.PRLIMIT +
+                     " (util-linux) on the PATH")
+    if args.sandbox:
+        # built now so that building it is not timed with the first test
+        process240.rss_wrapper()
+    if args.worker:
+        work(hw, args)
+        return
+
+    # watch mode starts by catching up on changes since the last run
+    if args.watch:
+        args.incremental = True
+
     # create / empty result directories for this hw
+    # (in incremental mode earlier results are kept and regraded selectively)
     results_dir = os.path.join(RESULTS_PATH_PREFIX, hw + "_results")
     student_files_dir = os.path.join(results_dir, "student_files")
-    if os.path.isdir(results_dir):
+    if args.incremental:
+        os.makedirs(student_files_dir, exist_ok=True)
+    elif os.path.isdir(results_dir):
         empty_dir(results_dir)
         empty_dir(student_files_dir)
     else:
         os.makedirs(student_files_dir)
 
+    # an incremental run keeps adding to a pack started by an earlier run
+    if args.incremental and pack240.pack_exists(results_dir):
+        args.pack = True
+    packed = pack240.load_index(results_dir) if args.pack else {}
+
     # get list of active students
-    students = active_students(GRADE_JSON_PATH)
+    try:
+        students = active_students(GRADE_JSON_PATH)
+    except GradebookError as e:
+        print("Error: " + str(e))
+        sys.exit(1)
 
     # if unixname command line argument provided, only process specified student
     if args.unixname:
         students = [args.unixname]
 
-    for student in students:
-        output = open(os.path.join(results_dir, student), "a")
-
-        output.write("\n\n")
-        output.write(hw + "report for: " + student +"\n")
-        output.write(DIVIDER)
-
-        if not os.path.isdir(os.path.join(COURSE_DIR, student)):
-            print("Error: Missing student directory (" + student + ").")
-            continue
+    # load and check all support files once, so that workers only read the
+    # students' own files and never exit part way through
+    bundle = prepare_bundle(hw, args, student_files_dir)
 
-        if hw not in os.listdir(os.path.join(COURSE_DIR, student)) :
-            output.write(MISSING_MSG)
-            output.close()
+    # one pass over the students' directories answers every later question
+    # about their submissions (missing files, submission times, changes)
+    # without another stat of the course directory
+    scan_start = time.perf_counter()
+    previous_index = scan240.load_index(COURSE_INDEX_PATH)
+    index = scan240.scan_course(COURSE_DIR, students, [hw])
+    changed = set(scan240.changed_students(previous_index, index, hw))
+    print("Scanned " + str(len(students)) + " students in " +
+          "%.2f" % (time.perf_counter() - scan_start) + "s; " +
+          str(len(changed)) + " " + hw + " submissions changed since the last scan.")
 
+    # compare each student's submission against the manifest from the last
+    # run; students graded against the same files and support files are
+    # skipped, which also lets an interrupted run pick up where it stopped
+    manifest = manifest240.load_manifest(results_dir)
+    support = manifest240.support_fingerprint(support_paths(hw),
+                                              grading_options(args))
+    if manifest["support"] != support:
+        manifest = {"support": support, "students": {}}
+    submissions = {}
+    to_grade = []
+    for student in students:
+        files = submission_files(student, hw, index, previous_index, changed,
+                                 manifest)
+        submissions[student] = files
+        if args.pack:
+            has_report = student in packed
         else:
-            # make a directory for this student
-            student_dir = os.path.join(student_files_dir, student)
-            os.makedirs(student_dir)
-
-            # path to executable (always named "main" for grading)
-            student_exec_path = os.path.join(student_dir, "main")
-
-            # collect paths to student's files based on required file doc
-            required_files = get_rf_list(hw)
-            student_src = []
-            for f in required_files:
-                student_src.append(os.path.join(COURSE_DIR, student, hw, f))
-
-            # make sure all needed files are present
-            if not files_exist(student_src):
-                output.write(MISSING_MSG)
-                continue
-
-            check_submission_time(student_src, output, hw)
+            has_report = os.path.isfile(os.path.join(results_dir, student))
+        if (args.incremental
+                and manifest240.is_current(manifest, student, files, support)
+                and has_report):
+            continue
+        clear_student_results(student, results_dir, student_files_dir)
+        manifest["students"].pop(student, None)
+        to_grade.append(student)
+    manifest240.save_manifest(manifest, results_dir)
+    # saved with the content hashes, so the next run only hashes files
+    # that changed even if this results directory is emptied
+    scan240.save_index(scan240.merge_index(previous_index, index),
+                       COURSE_INDEX_PATH)
 
-            # print student source code
-            print_source(student_src, output)
+    pack = None
+    if args.pack:
+        pack = pack240.PackWriter(results_dir)
+        for student in to_grade:
+            if student in packed:
+                pack.remove(student)
 
-            # compile student source
-            gccflags = "-I" + os.path.join(COURSE_DIR, student, hw)
-            if args.make:
-                compile_result = True
-                compile_str = run("make")
-            if args.altmain:
-                student_src.append(os.path.join(ALT_MAIN_PATH_PREFIX, hw + "_am.c"))
-            if args.c99mode:
-                compile_result, compile_str = compile(student_src, student_exec_path, gccflags + " -std=c99")
+    def record(result):
+        if "report" in result:
+            report = result.pop("report")
+            if pack is not None:
+                pack.add(result["student"], report)
             else:
-                compile_result, compile_str = compile(student_src, student_exec_path, gccflags)
-
-            output.write(compile_str)
-            output.write(DIVIDER)
-
-
-            if args.notes:
-                notes_path = os.path.join(COURSE_DIR, student, hw, "notes.txt")
-                if os.path.isfile(notes_path):
-                    print_source([os.path.join(COURSE_DIR, student, hw, "notes.txt")], output)
-                else:
-                    output.write("notes.txt file not found.\n")
-                    output.write(DIVIDER)
+                # a report sent back by a --worker
+                with open(os.path.join(results_dir, result["student"]), "w") as f:
+                    f.write(report)
+        if result["failure"] is None or not result["failure"].startswith("Grading error"):
+            manifest["students"][result["student"]] = {
+                "files": submissions[result["student"]]}
+            manifest240.save_manifest(manifest, results_dir)
 
-            if compile_result:
-                # successfully compiled, run program with test input
-                run_tests(hw, student_exec_path, output, args.diff)
+    try:
+        if args.coordinator:
+            results = coordinate(to_grade, hw, args, results_dir, record)
+        else:
+            results = grade_students(to_grade, hw, args, results_dir,
+                                     student_files_dir, bundle, index,
+                                     args.jobs, record)
+        if args.watch:
+            if pack is not None:
+                pack.flush()
+            results += watch_students(students, hw, args, results_dir,
+                                      student_files_dir, bundle, manifest,
+                                      submissions, record, pack)
+    finally:
+        if pack is not None:
+            pack.close()
+    if pack is not None:
+        # replaced reports stay in the pack until it is rewritten
+        pack240.compact(results_dir)
 
-            output.write(get_gc_string(hw))
+    evicted = 0
+    if args.cache:
+        evicted = CompileCache(COMPILE_CACHE_PATH, COMPILE_CACHE_MAX_BYTES).evict()
+        # shared objects are reported as compile cache entries
+        evicted += evict_objects(SHARED_OBJECT_PATH, SHARED_OBJECT_MAX_BYTES)
+    memo_evicted = 0
+    if args.memo:
+        memo_evicted = memo240.RunMemo(RESULT_MEMO_PATH,
+                                       RESULT_MEMO_MAX_BYTES).evict()
+    # a watched student is counted once, with their last grading
+    graded = latest_results(results)
+    print_run_summary(graded, evicted, len(students) - len(graded),
+                      memo_evicted)
 
-            output.close()
+    events = [event for r in results for event in r["timings"]]
+    trace240.write_trace(os.path.join(results_dir, trace240.TRACE_NAME), events)
+    trace240.print_timing_summary(events)
 
 # END METHODS ##################################################################
 
@@ -0,0 +1,286 @@
+#! /usr/bin/env python3.5
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from config.settings240 import GRADE_JSON_PATH, GRADE_DB_PATH
+
+
+# CONSTANTS ####################################################################
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    unix_name TEXT PRIMARY KEY,
+    withdrawn INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_withdrawn ON students (withdrawn, position);
+CREATE TABLE IF NOT EXISTS fields (
+    unix_name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (unix_name, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+# METHODS ######################################################################
+
+class GradebookError(Exception):
+    """
+    The json gradebook is missing, or cannot be imported without losing
+    changes made to the store.
+    """
+
+################################################################################
+# gradebook store
+################################################################################
+
+class Gradebook:
+    """
+    The class gradebook kept in an SQLite file, indexed by unix name and
+    withdrawn status. Each student is stored as one row per gradebook field
+    (e.g. "hw01", "lastName"), so a single score can be changed without
+    rewriting the rest of the gradebook. Students come back as the same
+    dicts the json gradebook holds, in the same order. Fields changed with
+    set_field are marked unexported until the store is exported over the
+    json file it was imported from.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def import_json(self, json_path):
+        """
+        Replaces the contents of the store with a json gradebook (a list of
+        student dicts, as in config/sample_gradebook.json).
+        """
+        with open(json_path) as data_file:
+            data = json.load(data_file)
+        with self.conn:
+            self.conn.execute("DELETE FROM students")
+            self.conn.execute("DELETE FROM fields")
+            for i, student in enumerate(data):
+                unix = student["unixName"]
+                self.conn.execute("INSERT INTO students VALUES (?, ?, ?)",
+                                  (unix, student.get("withdrawn", 0), i))
+                self.conn.executemany(
+                    "INSERT INTO fields VALUES (?, ?, ?, ?)",
+                    [(unix, key, json.dumps(value), j)
+                     for j, (key, value) in enumerate(student.items())])
+            self.set_meta("json_path", os.path.abspath(json_path))
+            self.set_meta("json_mtime", repr(os.path.getmtime(json_path)))
+            self.set_meta("unexported", None)
+
+    def export_json(self, json_path):
+        """
+        Writes the store back out as a json gradebook. Exporting over the
+        json file the store was imported from brings the two back in sync.
+        """
+        with open(json_path, 'w') as f:
+            json.dump(list(self.students()), f, indent=2)
+        if os.path.abspath(json_path) == self.get_meta("json_path"):
+            self.set_meta("json_mtime", repr(os.path.getmtime(json_path)))
+            self.set_meta("unexported", None)
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?",
+                                (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              (key, value))
+
+    def _assemble(self, rows):
+        """
+        Groups (unix_name, key, value) rows into student dicts.
+        """
+        students = []
+        current_unix = None
+        for unix, key, value in rows:
+            if unix != current_unix:
+                current_unix = unix
+                current = {}
+                students.append(current)
+            current[key] = json.loads(value)
+        return students
+
+    def get_student(self, unix):
+        """
+        Looks up one student by unix name.
+        Returns:
+            obj: The student's gradebook dict, or None if there is none.
+        """
+        rows = self.conn.execute(
+            "SELECT unix_name, key, value FROM fields WHERE unix_name = ? "
+            "ORDER BY position", (unix,)).fetchall()
+        students = self._assemble(rows)
+        return students[0] if students else None
+
+    def students(self, withdrawn=None):
+        """
+        Yields student dicts in gradebook order.
+        Args:
+            withdrawn (:int): Only students with this withdrawn value, or
+                              everyone if None.
+        """
+        query = ("SELECT f.unix_name, f.key, f.value FROM students s "
+                 "JOIN fields f ON f.unix_name = s.unix_name ")
+        params = ()
+        if withdrawn is not None:
+            query += "WHERE s.withdrawn = ? "
+            params = (withdrawn,)
+        query += "ORDER BY s.position, f.position"
+        return iter(self._assemble(self.conn.execute(query, params)))
+
+    def active_students(self):
+        """
+        Returns the unix names of all students who have not withdrawn.
+        """
+        return [row[0] for row in self.conn.execute(
+            "SELECT unix_name FROM students WHERE withdrawn = 0 "
+            "ORDER BY position")]
+
+    def set_field(self, unix, key, value):
+        """
+        Sets one gradebook field (e.g. a score) for one student.
+        Raises:
+            KeyError: if there is no such student.
+        """
+        with self.conn:
+            if self.conn.execute("SELECT 1 FROM students WHERE unix_name = ?",
+                                 (unix,)).fetchone() is None:
+                raise KeyError(unix)
+            row = self.conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM fields "
+                "WHERE unix_name = ?", (unix,)).fetchone()
+            updated = self.conn.execute(
+                "UPDATE fields SET value = ? WHERE unix_name = ? AND key = ?",
+                (json.dumps(value), unix, key)).rowcount
+            if not updated:
+                self.conn.execute("INSERT INTO fields VALUES (?, ?, ?, ?)",
+                                  (unix, key, json.dumps(value), row[0]))
+            if key == "withdrawn":
+                self.conn.execute(
+                    "UPDATE students SET withdrawn = ? WHERE unix_name = ?",
+                    (value, unix))
+            self.set_meta("unexported", "1")
+
+def db_path_for(json_path):
+    """
+    Returns the default SQLite path for a json gradebook (gradebook.db next
+    to gradebook.json).
+    """
+    return os.path.splitext(json_path)[0] + ".db"
+
+def open_gradebook(json_path, db_path=None):
+    """
+    Opens the gradebook store for a json gradebook, importing the json first
+    if the store is new or the json file has been edited since it was last
+    imported or exported.
+    Args:
+        json_path (str): The json gradebook from the settings file.
+        db_path (:str): The SQLite file (default: db_path_for(json_path)).
+    Returns:
+        obj: A Gradebook.
+    Raises:
+        GradebookError: if the json file is missing, or was edited while the
+                        store has fields set that were never exported.
+    """
+    if not os.path.isfile(json_path):
+        raise GradebookError("Unable to find gradebook " + json_path + ".")
+    db_path = db_path or db_path_for(json_path)
+    gradebook = Gradebook(db_path)
+    if gradebook.get_meta("json_mtime") != repr(os.path.getmtime(json_path)):
+        if gradebook.get_meta("unexported"):
+            gradebook.close()
+            raise GradebookError(
+                json_path + " was edited after fields were changed with "
+                "\"gradebook240.py set\" in " + db_path + ", and importing it "
+                "would lose those changes. Run \"gradebook240.py export\" to "
+                "write them to the json file (replacing its edits), or "
+                "\"gradebook240.py import\" to discard them.")
+        gradebook.import_json(json_path)
+    return gradebook
+
+################################################################################
+# command line
+################################################################################
+
+def parse_value(value):
+    """
+    Reads a field value from the command line as json if possible (so 10 is
+    a number), otherwise as a string.
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def config_argparser():
+    """
+    Sets up command line options using argparse and returns the argparse
+    argument parser object.
+    """
+    parser = argparse.ArgumentParser(
+        description="Manage the SQLite gradebook store.")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+    p = sub.add_parser("import", help="Load the json gradebook into the store")
+    p.add_argument("json", nargs="?", help="json file (default: from settings)")
+    p = sub.add_parser("export", help="Write the store out as json")
+    p.add_argument("json", nargs="?", help="json file (default: from settings)")
+    p = sub.add_parser("show", help="Print one student's gradebook entry")
+    p.add_argument("unixname")
+    p = sub.add_parser("set", help="Set one field (e.g. a score) for a student")
+    p.add_argument("unixname")
+    p.add_argument("field", help="e.g. hw03")
+    p.add_argument("value", type=parse_value)
+    return parser
+
+
+def main():
+    args = config_argparser().parse_args()
+    if args.command in ("import", "export"):
+        gradebook = Gradebook(GRADE_DB_PATH)
+    else:
+        try:
+            gradebook = open_gradebook(GRADE_JSON_PATH, GRADE_DB_PATH)
+        except GradebookError as e:
+            print("Error: " + str(e))
+            sys.exit(1)
+    try:
+        if args.command == "import":
+            gradebook.import_json(args.json or GRADE_JSON_PATH)
+        elif args.command == "export":
+            gradebook.export_json(args.json or GRADE_JSON_PATH)
+        elif args.command == "show":
+            print(json.dumps(gradebook.get_student(args.unixname), indent=2))
+        elif args.command == "set":
+            try:
+                gradebook.set_field(args.unixname, args.field, args.value)
+            except KeyError:
+                print("Error: no student " + args.unixname + " in gradebook.")
+    finally:
+        gradebook.close()
+
+# END METHODS ##################################################################
+
+
+if __name__ == '__main__':
+    main()
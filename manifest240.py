@@ -0,0 +1,143 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import json
+import os
+
+from cache240 import hash_file
+import scan240
+
+
+# CONSTANTS ####################################################################
+
+MANIFEST_NAME = ".manifest.json"
+
+
+# METHODS ######################################################################
+
+################################################################################
+# fingerprints
+################################################################################
+
+def file_set(dir_path, previous=None):
+    """
+    Describes every file below a directory by size, modification time and
+    content hash. Hashes from a previous description are reused for files whose
+    size and modification time have not changed.
+    Args:
+        dir_path (str): The directory to describe (e.g., a student's hw1).
+        previous (:obj): An earlier result of file_set for the same directory.
+    Returns:
+        obj: A dict mapping relative paths to {"size", "mtime", "sha256"}
+             dicts, or None if dir_path is not a directory.
+    """
+    if not os.path.isdir(dir_path):
+        return None
+    return hash_files(dir_path, scan240.scan_tree(dir_path), previous)
+
+def hash_files(dir_path, files, previous=None):
+    """
+    Adds content hashes to a scan240 description of a directory, giving the
+    same result as file_set without scanning the directory again.
+    Args:
+        dir_path (str): The directory described.
+        files (obj): The scan240.scan_tree description, or None if the
+                     directory is missing.
+        previous (:obj): An earlier result of file_set for the same directory.
+    Returns:
+        obj: As for file_set.
+    """
+    if files is None:
+        return None
+    previous = previous or {}
+    hashed = {}
+    for rel, info in sorted(files.items()):
+        old = previous.get(rel)
+        if old and old["size"] == info["size"] and old["mtime"] == info["mtime"]:
+            digest = old["sha256"]
+        else:
+            try:
+                digest = hash_file(os.path.join(dir_path, rel)).hexdigest()
+            except OSError:
+                digest = None
+        hashed[rel] = {"size": info["size"], "mtime": info["mtime"],
+                       "sha256": digest}
+    return hashed
+
+def is_hashed(files):
+    """
+    Returns True if every file of a hash_files description has its content
+    hash.
+    """
+    return (files is not None and
+            all(info.get("sha256") is not None for info in files.values()))
+
+def support_fingerprint(support_paths, options):
+    """
+    Hashes the support files and grading options used for a homework. If this
+    changes, every student needs to be regraded.
+    Args:
+        support_paths (obj): A list of support file or directory paths.
+        options (obj): A json serializable dict of grading options.
+    Returns:
+        str: A hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for support_path in support_paths:
+        digest.update(b'\0' + support_path.encode('utf-8') + b'\0')
+        if os.path.isdir(support_path):
+            for rel, info in sorted(file_set(support_path).items()):
+                digest.update(rel.encode('utf-8') + b'\0')
+                digest.update(str(info["sha256"]).encode('utf-8'))
+        elif os.path.isfile(support_path):
+            hash_file(support_path, digest)
+    return digest.hexdigest()
+
+################################################################################
+# manifest
+################################################################################
+
+def load_manifest(results_dir):
+    """
+    Loads the grading manifest from a results directory.
+    Args:
+        results_dir (str): The results directory for a homework.
+    Returns:
+        obj: A dict with the support fingerprint and a dict of students, or
+             an empty manifest if none exists.
+    """
+    try:
+        with open(os.path.join(results_dir, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+        if "support" in manifest and "students" in manifest:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"support": None, "students": {}}
+
+def save_manifest(manifest, results_dir):
+    """
+    Writes the grading manifest to a results directory. The file is replaced
+    atomically, so an interrupted run always leaves a readable manifest.
+    Args:
+        manifest (obj): The manifest dict.
+        results_dir (str): The results directory for a homework.
+    """
+    manifest_path = os.path.join(results_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_current(manifest, student, files, support):
+    """
+    Returns True if a student was completely graded against the same
+    submission files and support files.
+    """
+    if manifest["support"] != support:
+        return False
+    entry = manifest["students"].get(student)
+    return entry is not None and entry["files"] == files
+
+# END METHODS ##################################################################
@@ -0,0 +1,139 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import json
+import os
+import tempfile
+
+from cache240 import hash_file
+
+
+# CONSTANTS ####################################################################
+
+# bump when the layout of an entry changes so old entries are ignored
+MEMO_VERSION = 1
+
+
+# METHODS ######################################################################
+
+################################################################################
+# result memo
+################################################################################
+
+class RunMemo:
+    """
+    An on-disk memo of test runs. Byte-identical executables (unchanged
+    starter code, shared or resubmitted solutions, and anything served from
+    the compile cache) given the same input under the same limits produce
+    the same output, so each (executable, input) pair only has to be run and
+    compared once.
+
+    Entries are json files under memo_dir named by a sha256 of the
+    executable, the input, the run limits and the comparison settings. Each
+    holds the output, run status, metrics and comparison. As with the
+    compile cache, an entry's modification time is bumped whenever it is
+    used and evict() removes the least recently used entries once the memo
+    grows past max_bytes.
+    """
+
+    def __init__(self, memo_dir, max_bytes):
+        self.memo_dir = memo_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(memo_dir, exist_ok=True)
+
+    def key(self, executable_hash, test, settings):
+        """
+        Builds the memo key for running one test.
+        Args:
+            executable_hash (str): hash_file(executable).hexdigest().
+            test (obj): A bundle test dict (see bundle240).
+            settings (obj): A json serializable dict of everything else that
+                            changes the result: output limits, resource
+                            limits, normalization modes, tolerance.
+        Returns:
+            str: A hex digest.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"version": MEMO_VERSION,
+                                  "executable": executable_hash,
+                                  "input": test["input_sha256"],
+                                  "expected": test["sha256"],
+                                  "settings": settings},
+                                 sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """
+        Returns the memoized entry for key, a dict with "output", "status",
+        "metrics" and "comparison", or None on a miss.
+        """
+        entry_path = os.path.join(self.memo_dir, key + ".json")
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, output, status, metrics, comparison):
+        """
+        Adds a test run to the memo. Entries are written to a temporary file
+        and renamed into place, so concurrent graders never see a partial
+        entry.
+        """
+        entry_path = os.path.join(self.memo_dir, key + ".json")
+        if os.path.isfile(entry_path):
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.memo_dir, prefix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"output": output, "status": status,
+                           "metrics": metrics, "comparison": comparison}, f)
+            os.rename(tmp, entry_path)
+        except OSError:
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the memo fits in max_bytes.
+        Returns:
+            int: The number of entries removed.
+        """
+        entries = []
+        for name in os.listdir(self.memo_dir):
+            if name.startswith("."):
+                continue
+            entry_path = os.path.join(self.memo_dir, name)
+            try:
+                st = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry_path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+def executable_hash(executable):
+    """
+    Returns the sha256 hex digest of an executable, the part of a memo key
+    that identifies the student's program.
+    """
+    return hash_file(executable).hexdigest()
+
+# END METHODS ##################################################################
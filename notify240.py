@@ -1,77 +1,598 @@
 #! /usr/bin/env python3.5
 
 import argparse
+import hashlib
+import importlib
+import io
 import json
+import os
 from os import path, getcwd
 from config.settings240 import *
-import smtplib
+from gradebook240 import GradebookError, open_gradebook
+import pack240
+import queue
+import sys
+import threading
+import time
+
+# CONSTANTS ####################################################################
+
+LEDGER_NAME = ".delivery.jsonl"
+
+# bytes read from a report, or sent to the server, at a time
+REPORT_CHUNK_BYTES = 64 * 1024
+
+# messages larger than this are built in a temporary file, not in memory
+MESSAGE_SPOOL_BYTES = 1024 * 1024
+
+# report lines kept in the inline summary of a compressed report
+SUMMARY_PREFIXES = (b"COMPILATION", b"OUTPUT", b"RESULT:", b"Execution timed out",
+                    b"LATE SUBMISSION", b"RATING:")
+
+# END CONSTANTS ################################################################
 
-# in test mode no email is sent -- email contents are sent to stdout
-TEST_MODE = True
 
 # METHODS ######################################################################
 
-def send_mail(grader_email, student_email, message):
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is first used, and
+    only then imports it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attr)
+
+# smtplib (with ssl and email) takes longer to import than a test mode run
+# takes in total, so it is imported when a server is first talked to
+smtplib = LazyModule("smtplib")
+
+class SMTPSession:
+    """
+    An authenticated SMTP connection that is kept open across messages.
+    The connection is reopened when the server drops it and after
+    max_messages messages, since providers limit messages per connection.
+    The time taken by each send is kept in timings.
+    """
+
+    def __init__(self, server, port, user, password, tls=True, max_messages=50):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.tls = tls
+        self.max_messages = max_messages
+        self.smtp_obj = None
+        self.sent_on_connection = 0
+        self.connections = 0
+        self.timings = []
+
+    def connect(self):
+        """
+        Opens and authenticates a new connection.
+        """
+        self.close()
+        smtp_obj = smtplib.SMTP(self.server, self.port)
+        if self.tls:
+            smtp_obj.starttls()
+        smtp_obj.ehlo()
+        smtp_obj.login(self.user, self.password)
+        self.smtp_obj = smtp_obj
+        self.sent_on_connection = 0
+        self.connections += 1
+
+    def close(self):
+        """
+        Closes the connection, ignoring errors from a server that already
+        hung up.
+        """
+        if self.smtp_obj is not None:
+            try:
+                self.smtp_obj.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp_obj.close()
+            self.smtp_obj = None
+
+    def send(self, from_addr, to_addr, message):
+        """
+        Sends one message, reconnecting and retrying once if the server has
+        dropped the connection.
+        Args:
+            from_addr (str): the "from" email address
+            to_addr (str): the "to" email address
+            message (obj): the email as a binary file object with CRLF line
+                           endings (see build_message)
+        Returns:
+            float: the time the send took in seconds
+        """
+        start = time.perf_counter()
+        for attempt in range(2):
+            if self.smtp_obj is None or self.sent_on_connection >= self.max_messages:
+                self.connect()
+            try:
+                message.seek(0)
+                send_file(self.smtp_obj, from_addr, to_addr, message)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                # 421: the server is closing the connection
+                self.close()
+                if e.smtp_code != 421 or attempt:
+                    raise
+        self.sent_on_connection += 1
+        elapsed = time.perf_counter() - start
+        self.timings.append(elapsed)
+        return elapsed
+
+def send_file(smtp_obj, from_addr, to_addr, message):
+    """
+    Does what smtplib's sendmail does for one recipient, but sends the
+    message a chunk at a time as it is read from a file.
+    Args:
+        smtp_obj (obj): a connected smtplib.SMTP object
+        from_addr (str): the "from" email address
+        to_addr (str): the "to" email address
+        message (obj): the email as a binary file object with CRLF line
+                       endings and short lines (see build_message)
+    """
+    def reset(code):
+        # 421 means the server is closing the connection
+        if code == 421:
+            smtp_obj.close()
+            return
+        try:
+            smtp_obj.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    code, response = smtp_obj.mail(from_addr)
+    if code != 250:
+        reset(code)
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+    code, response = smtp_obj.rcpt(to_addr)
+    if code not in (250, 251):
+        reset(code)
+        raise smtplib.SMTPRecipientsRefused({to_addr: (code, response)})
+    code, response = smtp_obj.docmd("data")
+    if code != 354:
+        reset(code)
+        raise smtplib.SMTPDataError(code, response)
+    chunk = []
+    size = 0
+    line = b"\r\n"
+    for line in message:
+        # a line starting with "." gets another one, as smtplib does
+        if line.startswith(b"."):
+            line = b"." + line
+        chunk.append(line)
+        size += len(line)
+        if size >= REPORT_CHUNK_BYTES:
+            smtp_obj.send(b"".join(chunk))
+            chunk = []
+            size = 0
+    if not line.endswith(b"\r\n"):
+        chunk.append(b"\r\n")
+    chunk.append(b".\r\n")
+    smtp_obj.send(b"".join(chunk))
+    code, response = smtp_obj.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+
+def send_mail(grader_email, student_email, message, session=None):
     """
     Sends a grade email to the student from the grader.
     Args:
         grader_email (str): the "from" email address
         student_email (str): the "to" email address
-        message (str): the email as a string formatted for smtlib
+        message (obj): the email as a binary file object (see
+                       build_message)
+        session (:obj): an SMTPSession to send through. A connection is
+                        opened just for this message if None.
     """
     if TEST_MODE:
-        print(message)
+        print_message(message)
     else:
-        smtp_obj = smtplib.SMTP(SMT_SERV, SMT_PORT)
-        smtp_obj.starttls()
-        smtp_obj.ehlo()
-        smtp_obj.login(SMT_USER, SMT_PASS)
-
+        close = session is None
+        if session is None:
+            session = new_session()
         try:
-            smtp_obj.sendmail(grader_email, student_email, message)
-        except smtplib.SMTPException:
+            session.send(grader_email, student_email, message)
+        except (smtplib.SMTPException, OSError):
             print("Failed to send email to: " + student_email)
         finally:
-            smtp_obj.quit()
+            if close:
+                session.close()
 
+def print_message(message):
+    """
+    Prints a grade email the way the student reads it (for TEST_MODE): its
+    headers, its text decoded from quoted-printable and a line for each
+    attachment.
+    Args:
+        message (obj): the email as a binary file object (see
+                       build_message)
+    """
+    import email.policy
+    from email.parser import BytesParser
 
-def grade_report(path_to_report):
+    parsed = BytesParser(policy=email.policy.default).parse(message)
+    for name, value in parsed.items():
+        print(name + ": " + str(value))
+    print()
+    for part in parsed.walk():
+        if part.is_multipart():
+            continue
+        if part.get_content_maintype() == "text" and not part.get_filename():
+            text = part.get_content()
+            sys.stdout.write(text.replace('\r\n', '\n').replace('\r', '\n'))
+        else:
+            print("[attachment " + str(part.get_filename()) + ", " +
+                  str(len(part.get_payload(decode=True))) + " bytes]")
+    print()
+
+def new_session():
     """
-    Takes a path to a grade report file and returns it as a string.
-    If the grade file does not exist, returns a missing file message.
+    Creates an SMTPSession from the settings file.
     """
-    if path.isfile(path_to_report):
-        with open(path_to_report,'r') as f:
-            return f.read() + "\n"
-    else:
-        print("Could not find: " + path_to_report)
-        print("Sending missing file message.\n")
-        return MISSING_MSG
+    return SMTPSession(SMT_SERV, SMT_PORT, SMT_USER, SMT_PASS, SMT_TLS,
+                       SMT_MAX_MESSAGES)
 
-def build_message(student, hw):
+def print_send_summary(sessions):
     """
-    Assemble a message string in the format required by smtplib.
+    Prints how many messages were sent over how many connections, and how
+    long the sends took.
     Args:
-        student (obj): a student grade dict generated from a json file
+        sessions (obj): A list of SMTPSession objects.
+    """
+    timings = [t for session in sessions for t in session.timings]
+    if not timings:
+        return
+    connections = sum(session.connections for session in sessions)
+    print("Sent " + str(len(timings)) + " messages over " +
+          str(connections) + " connections in " +
+          "%.2f" % sum(timings) + "s (average " +
+          "%.3f" % (sum(timings) / len(timings)) + "s, slowest " +
+          "%.3f" % max(timings) + "s).")
+
+
+################################################################################
+# send queue
+################################################################################
+
+class RateLimiter:
+    """
+    Spaces out calls to wait() so that, across all threads, no more than rate
+    of them return per second. A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_time, now)
+            self.next_time = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class DeliveryLedger:
+    """
+    A json lines record of the grade emails delivered for one homework. Each
+    delivery is flushed to disk before the next message is sent, so an
+    interrupted run can be resumed without emailing anyone twice. Entries
+    carry a hash of the message, so a student whose report was regraded is
+    emailed again.
+    """
+
+    def __init__(self, ledger_path):
+        self.ledger_path = ledger_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path.isfile(ledger_path):
+            with open(ledger_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interrupted run
+                        continue
+                    self.entries[entry["student"]] = entry
+
+    def delivered(self, student, message_hash):
+        """
+        Returns True if this exact message was already delivered.
+        """
+        entry = self.entries.get(student)
+        return (entry is not None and entry["status"] == "sent"
+                and entry["hash"] == message_hash)
+
+    def record(self, student, status, message_hash, error=None):
+        """
+        Appends a delivery result to the ledger file.
+        """
+        entry = {"student": student, "status": status, "hash": message_hash,
+                 "time": time.strftime("%Y-%m-%d %H:%M:%S"), "error": error}
+        with self.lock:
+            self.entries[student] = entry
+            with open(self.ledger_path, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+def is_transient(error):
+    """
+    Returns True for SMTP errors worth retrying: dropped connections, network
+    errors and 4xx replies.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+def send_queue(jobs, build, ledger, workers=4, rate=5, retries=3,
+               backoff=1.0):
+    """
+    Sends messages from several worker threads, each with its own
+    SMTPSession, under a global messages per second limit. Each message is
+    built by the thread that sends it, so only the messages being sent are
+    in memory at once. Transient errors are retried with exponential
+    backoff; every outcome goes in the ledger.
+    Args:
+        jobs (obj): A list of (unix name, email address, message hash)
+                    tuples.
+        build (obj): A function from a unix name to the message, as a
+                     binary file object that is closed once it is sent.
+        ledger (obj): The DeliveryLedger for this homework.
+        workers (:int): The number of sender threads.
+        rate (:float): The most messages to send per second.
+        retries (:int): How many times to retry a transient failure.
+        backoff (:float): Seconds to wait before the first retry.
+    Returns:
+        obj: A list of (unix name, error string) tuples for failed sends.
+        obj: The SMTPSession objects used, for print_send_summary.
+    """
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    limiter = RateLimiter(rate)
+    failures = []
+    sessions = []
+    lock = threading.Lock()
+
+    def worker():
+        session = new_session()
+        with lock:
+            sessions.append(session)
+        try:
+            while True:
+                try:
+                    student, email, message_hash = pending.get_nowait()
+                except queue.Empty:
+                    return
+                with build(student) as message:
+                    for attempt in range(retries + 1):
+                        limiter.wait()
+                        try:
+                            session.send(GRADER_EMAIL, email, message)
+                            ledger.record(student, "sent", message_hash)
+                            print("Grade sent to " + student)
+                            break
+                        except (smtplib.SMTPException, OSError) as e:
+                            session.close()
+                            if attempt < retries and is_transient(e):
+                                time.sleep(backoff * 2 ** attempt)
+                                continue
+                            error = type(e).__name__ + ": " + str(e)
+                            ledger.record(student, "failed", message_hash,
+                                          error)
+                            with lock:
+                                failures.append((student, error))
+                            print("Failed to send email to: " + email)
+                            break
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(max(1, min(workers, len(jobs))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (failures, sessions)
+
+def open_report(path_to_report, pack=None):
+    """
+    Opens a grade report for reading as bytes.
+    If pack (a pack240.PackReader for the results directory) is given, the
+    report is read from the pack instead, by the file name of path_to_report.
+    Returns:
+        obj: A binary file object, or None if there is no report.
+        int: The size of the report in bytes.
+    """
+    if pack is not None:
+        name = path.basename(path_to_report)
+        report = pack.open(name)
+        if report is not None:
+            return (report, pack.size(name))
+    elif path.isfile(path_to_report):
+        report = open(path_to_report, 'rb')
+        return (report, os.fstat(report.fileno()).st_size)
+    return (None, 0)
+
+def message_text(student, hw):
+    """
+    Returns the parts of a grade email around the report.
     Returns:
-        str: The formatted message string.
+        str: The student's email address.
+        str: The subject.
+        str: The text before the report.
+        str: The text after the report.
     """
     student_email = student + "@cs.umb.edu"
-    body = ""
-    body += ("Sent to: " + student_email + "\n"
-            + "Course: " + COURSE_NAME + "\n"
-            + "Assignment: " + hw + "\n\n"
-            + DIVIDER)
-    body += grade_report(path.join(RESULTS_PATH_PREFIX, hw + "_results", student))
-    body += ("\n" + DIVIDER
-            + "\n\nIf you received this message in error or have questions about your grade,\n"
-            + "reply to this message or contact me at: " + GRADER_EMAIL + ".\n"
-            + "\n" + DIVIDER)
-    # assemble the message in the format required by smtplib
-    message = ("To: " + student_email + "\r\n" +
-               "Subject: " + COURSE_NAME + ", " + hw + " Grade\r\n\r\n" +
-               body)
-    return message.encode('utf-8')
+    header = ("Sent to: " + student_email + "\n"
+              + "Course: " + COURSE_NAME + "\n"
+              + "Assignment: " + hw + "\n\n"
+              + DIVIDER)
+    footer = ("\n" + DIVIDER
+              + "\n\nIf you received this message in error or have questions about your grade,\n"
+              + "reply to this message or contact me at: " + GRADER_EMAIL + ".\n"
+              + "\n" + DIVIDER)
+    return (student_email, COURSE_NAME + ", " + hw + " Grade", header, footer)
+
+def message_digest(student, hw, pack=None):
+    """
+    Hashes what a student's grade email says, reading the report from disk
+    a chunk at a time. The hash covers the same bytes as the plain text
+    messages earlier versions sent, so delivery ledgers written by them
+    still match.
+    Returns:
+        str: A hex digest.
+    """
+    student_email, subject, header, footer = message_text(student, hw)
+    digest = hashlib.sha256()
+    digest.update(("To: " + student_email + "\r\n" +
+                   "Subject: " + subject + "\r\n\r\n" +
+                   header).encode('utf-8'))
+    report, _ = open_report(path.join(RESULTS_PATH_PREFIX, hw + "_results",
+                                      student), pack)
+    if report is None:
+        digest.update(MISSING_MSG.encode('utf-8'))
+    else:
+        with report:
+            for chunk in iter(lambda: report.read(REPORT_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        digest.update(b"\n")
+    digest.update(footer.encode('utf-8'))
+    return digest.hexdigest()
+
+def compress_report(report, name):
+    """
+    Gzips a report a line at a time, keeping the lines that summarize it
+    (compile result, test names and verdicts, lateness, performance rating).
+    Args:
+        report (obj): The report as a binary file object.
+        name (str): The file name stored in the gzip header.
+    Returns:
+        str: The summary lines.
+        bytes: The compressed report.
+    """
+    import gzip
+
+    compressed = io.BytesIO()
+    summary = []
+    # mtime=0 keeps the attachment identical from one run to the next
+    with gzip.GzipFile(filename=name, mode='wb', fileobj=compressed,
+                       mtime=0) as gz:
+        for line in report:
+            gz.write(line)
+            if line.startswith(SUMMARY_PREFIXES):
+                summary.append(line.decode('utf-8', errors='replace'))
+    return ("".join(summary), compressed.getvalue())
+
+def body_lines(header, report, footer):
+    """
+    Yields the lines of a grade email's body (header, report, a newline and
+    footer) as bytes, reading the report a line at a time.
+    """
+    partial = b""
+    for part in (io.BytesIO(header.encode('utf-8')), report,
+                 io.BytesIO(("\n" + footer).encode('utf-8'))):
+        for line in part:
+            if partial:
+                line = partial + line
+                partial = b""
+            if line.endswith(b"\n"):
+                yield line
+            else:
+                partial = line
+    if partial:
+        yield partial
+
+def write_quoted_printable(lines, out):
+    """
+    Writes lines of text to out in the quoted-printable transfer encoding,
+    one line at a time, with CRLF line endings. A carriage return anywhere
+    but at the end of a line is encoded, so none reaches the server bare.
+    """
+    import binascii
+
+    for line in lines:
+        end = line.endswith(b"\n")
+        text = line.rstrip(b"\r\n") if end else line
+        encoded = binascii.b2a_qp(text, istext=True).replace(b"\r", b"=0D")
+        out.write(encoded.replace(b"\n", b"\r\n"))
+        if end:
+            out.write(b"\r\n")
+
+def build_message(student, hw, pack=None, attach_over=None):
+    """
+    Writes a grade email as a MIME message to a temporary file, which stays
+    in memory up to MESSAGE_SPOOL_BYTES. The report is copied into the file
+    a line at a time. A report larger than attach_over bytes is sent as a
+    gzip attachment, with a summary of it in the message body.
+    Args:
+        student (str): the student's unix name
+        hw (str): The homework whose grade to send (e.g., "hw1").
+        pack (:obj): a pack240.PackReader to read the report from
+        attach_over (:int): The size above which reports are attached; None
+                            to always send the report in the body.
+    Returns:
+        obj: The message as a binary file object with CRLF line endings,
+             positioned at its start.
+    """
+    import email.policy
+    import tempfile
+    from email.generator import BytesGenerator
+    from email.message import EmailMessage
+
+    student_email, subject, header, footer = message_text(student, hw)
+    message = EmailMessage(policy=email.policy.SMTP)
+    message["To"] = student_email
+    message["Subject"] = subject
+    out = tempfile.SpooledTemporaryFile(max_size=MESSAGE_SPOOL_BYTES)
+    generator = BytesGenerator(out, policy=email.policy.SMTP)
+
+    path_to_report = path.join(RESULTS_PATH_PREFIX, hw + "_results", student)
+    report, size = open_report(path_to_report, pack)
+    if report is None:
+        print("Could not find: " + path_to_report)
+        print("Sending missing file message.\n")
+        message.set_content(header + MISSING_MSG + footer)
+        generator.flatten(message)
+    elif attach_over is not None and size > attach_over:
+        name = hw + "_report.txt"
+        with report:
+            summary, compressed = compress_report(report, name)
+        message.set_content(header + "SUMMARY (the full " +
+                            str(size // 1024) + " KB report is attached as " +
+                            name + ".gz)\n\n" + summary + footer)
+        message.add_attachment(compressed, maintype="application",
+                               subtype="gzip", filename=name + ".gz")
+        generator.flatten(message)
+    else:
+        # only the headers are generated; the body is encoded from the
+        # report as it is read
+        message["MIME-Version"] = "1.0"
+        message["Content-Type"] = 'text/plain; charset="utf-8"'
+        message["Content-Transfer-Encoding"] = "quoted-printable"
+        generator.flatten(message)
+        with report:
+            write_quoted_printable(body_lines(header, report, footer), out)
+    out.seek(0)
+    return out
 
 def config_argparser():
     """
@@ -84,6 +605,23 @@ def config_argparser():
     parser.add_argument("-u",
                         "--unixname",
                         help="Send grade to the specified unix name only")
+    parser.add_argument("-w",
+                        "--workers",
+                        help="Number of messages to send at the same time",
+                        type=int,
+                        default=SMT_WORKERS)
+    parser.add_argument("-r",
+                        "--rate",
+                        help="Most messages to send per second",
+                        type=float,
+                        default=SMT_RATE)
+    parser.add_argument("-z",
+                        "--compress",
+                        help="Attach reports larger than NOTIFY_INLINE_MAX_BYTES gzipped, with a summary in the message",
+                        action="store_true")
+    parser.add_argument("--resend",
+                        help="Send to everyone, even students the delivery ledger says already have this grade",
+                        action="store_true")
     return parser
 
 
@@ -94,22 +632,55 @@ def main():
     # the homework whose grade to send (e.g., hw1)
     hw = args.homework
 
-    with open(GRADE_JSON_PATH) as data_file:
-        data = json.load(data_file)
-
     if args.unixname:
-        send_mail(GRADER_EMAIL,
-                  args.unixname + "@cs.umb.edu",
-                  build_message(args.unixname, hw))
-        print("\nGrade email sent to " + args.unixname + ".\n")
+        students = [args.unixname]
     else:
-        for student in data:
-            if student["withdrawn"] != 1:
-                send_mail(GRADER_EMAIL,
-                          student["unixName"] + "@cs.umb.edu",
-                          build_message(student["unixName"], hw))
-                print(hw + " grade sent to " + student["unixName"])
-        print("\nGrade emails sent to " + str(len(data)) + " students.\n")
+        try:
+            gradebook = open_gradebook(GRADE_JSON_PATH, GRADE_DB_PATH)
+        except GradebookError as e:
+            print("Error: " + str(e))
+            sys.exit(1)
+        students = [student["unixName"] for student in gradebook.students()
+                    if student["withdrawn"] != 1]
+        gradebook.close()
+
+    # reports graded with --pack are read from the pack file
+    results_dir = path.join(RESULTS_PATH_PREFIX, hw + "_results")
+    pack = None
+    if pack240.pack_exists(results_dir):
+        pack = pack240.PackReader(results_dir)
+
+    attach_over = NOTIFY_INLINE_MAX_BYTES if args.compress else None
+
+    def build(student):
+        return build_message(student, hw, pack, attach_over)
+
+    if TEST_MODE:
+        for student in students:
+            with build(student) as message:
+                send_mail(GRADER_EMAIL, student + "@cs.umb.edu", message)
+        return
+
+    # students already sent this exact message by an earlier run are skipped
+    ledger = DeliveryLedger(path.join(results_dir, LEDGER_NAME))
+    jobs = []
+    for student in students:
+        message_hash = message_digest(student, hw, pack)
+        if (not args.resend and not args.unixname and
+                ledger.delivered(student, message_hash)):
+            continue
+        jobs.append((student, student + "@cs.umb.edu", message_hash))
+
+    failures, sessions = send_queue(jobs, build, ledger, args.workers,
+                                    args.rate, SMT_RETRIES)
+
+    print("\n" + hw + " grade emails sent to " +
+          str(len(jobs) - len(failures)) + " students (" +
+          str(len(students) - len(jobs)) + " already had it, " +
+          str(len(failures)) + " failed).")
+    for student, error in failures:
+        print("  " + student.ljust(15, '.') + " " + error)
+    print_send_summary(sessions)
 
 
 # END METHODS ##################################################################
@@ -0,0 +1,375 @@
+#! /usr/bin/env python3.5
+
+import argparse
+import io
+import json
+import mmap
+import os
+
+from config.settings240 import RESULTS_PATH_PREFIX
+
+
+# CONSTANTS ####################################################################
+
+PACK_NAME = "reports.pack"
+INDEX_NAME = "reports.idx"
+
+# index entries are written in groups of this many, after the reports they
+# point to have been flushed to the pack
+INDEX_FLUSH_ENTRIES = 64
+
+# a pack is compacted once this fraction of it is replaced or removed reports
+PACK_COMPACT_RATIO = 0.5
+
+# a compacted index waits under this name while the compacted pack is put in
+# place (see compact)
+COMPACT_NAME = INDEX_NAME + ".compact"
+
+
+# METHODS ######################################################################
+
+################################################################################
+# index
+################################################################################
+
+def pack_exists(dir_path):
+    """
+    Returns True if a directory holds a packed results archive.
+    """
+    return os.path.isfile(os.path.join(dir_path, INDEX_NAME))
+
+def load_index(dir_path):
+    """
+    Reads a pack's index. The index is a json lines file of
+    {"name", "offset", "length"} entries; a later entry for a name replaces an
+    earlier one, and an entry with a length of None removes the name.
+    Args:
+        dir_path (str): The directory holding the pack.
+    Returns:
+        obj: A dict mapping names to (offset, length) tuples.
+    """
+    finish_compaction(dir_path)
+    index = {}
+    index_path = os.path.join(dir_path, INDEX_NAME)
+    if not os.path.isfile(index_path):
+        return index
+    with open(index_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short by an interrupted run
+                continue
+            if entry["length"] is None:
+                index.pop(entry["name"], None)
+            else:
+                index[entry["name"]] = (entry["offset"], entry["length"])
+    return index
+
+def ends_with_newline(path):
+    """
+    Returns True if a file is empty or its last line is complete.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+################################################################################
+# pack files
+################################################################################
+
+class PackWriter:
+    """
+    Appends reports to the pack file of a results directory. Reports go
+    through one large buffered writer instead of a file per student, and an
+    index entry is only written once the report it points to is on disk, so
+    an interrupted run never leaves the index pointing past the end of the
+    pack.
+    """
+
+    def __init__(self, dir_path, buffer_size=1024 * 1024):
+        self.dir_path = dir_path
+        finish_compaction(dir_path)
+        pack_path = os.path.join(dir_path, PACK_NAME)
+        self.offset = os.path.getsize(pack_path) if os.path.isfile(pack_path) else 0
+        self.pack = open(pack_path, 'ab', buffering=buffer_size)
+        index_path = os.path.join(dir_path, INDEX_NAME)
+        self.index = open(index_path, 'a')
+        if not ends_with_newline(index_path):
+            # end a line cut short by an interrupted run, so it does not
+            # swallow the next entry
+            self.index.write("\n")
+        self.pending = []
+
+    def add(self, name, text):
+        """
+        Appends a report, replacing any earlier report with the same name.
+        """
+        data = text.encode('utf-8')
+        self.pack.write(data)
+        self.pending.append({"name": name, "offset": self.offset,
+                             "length": len(data)})
+        self.offset += len(data)
+        if len(self.pending) >= INDEX_FLUSH_ENTRIES:
+            self.flush()
+
+    def remove(self, name):
+        """
+        Drops a report from the index (its bytes stay in the pack until it
+        is compacted).
+        """
+        self.pending.append({"name": name, "offset": None, "length": None})
+
+    def flush(self):
+        self.pack.flush()
+        self.index.write("".join(json.dumps(entry, sort_keys=True) + "\n"
+                                 for entry in self.pending))
+        self.index.flush()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.pack.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class PackEntry(io.RawIOBase):
+    """
+    A read-only binary file over one report in a pack's memory map. Each
+    read copies only the bytes it returns.
+    """
+
+    def __init__(self, map, offset, length):
+        self.map = map
+        self.pos = offset
+        self.end = offset + length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), self.end - self.pos))
+        buffer[:n] = self.map[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+class PackReader:
+    """
+    Reads reports from a pack file through a memory map, so looking up a
+    report costs no file opens or stats beyond the pack itself.
+    """
+
+    def __init__(self, dir_path):
+        self.index = load_index(dir_path)
+        self.file = open(os.path.join(dir_path, PACK_NAME), 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = (mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                    if size else None)
+
+    def names(self):
+        return sorted(self.index)
+
+    def get(self, name):
+        """
+        Returns a report as a string, or None if the pack does not have it.
+        """
+        if name not in self.index:
+            return None
+        offset, length = self.index[name]
+        return self.map[offset:offset + length].decode('utf-8')
+
+    def open(self, name):
+        """
+        Returns a report as a binary file object, or None if the pack does
+        not have it. The report is read from the map as the file is read,
+        without decoding.
+        """
+        if name not in self.index:
+            return None
+        offset, length = self.index[name]
+        return io.BufferedReader(PackEntry(self.map, offset, length))
+
+    def size(self, name):
+        """
+        Returns the size of a report in bytes, or None if the pack does not
+        have it.
+        """
+        if name not in self.index:
+            return None
+        return self.index[name][1]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+################################################################################
+# compaction
+################################################################################
+
+def dead_bytes(dir_path, index=None):
+    """
+    Returns how many bytes of a pack belong to replaced or removed reports.
+    """
+    if index is None:
+        index = load_index(dir_path)
+    pack_path = os.path.join(dir_path, PACK_NAME)
+    size = os.path.getsize(pack_path) if os.path.isfile(pack_path) else 0
+    return size - sum(length for _, length in index.values())
+
+def compact(dir_path, ratio=PACK_COMPACT_RATIO):
+    """
+    Rewrites a pack with only its live reports, and its index with one
+    entry per report, once replaced and removed reports make up more than
+    ratio of the pack. No PackWriter may have the pack open.
+    The new files are written next to the old ones and renamed into place.
+    The new index is renamed to COMPACT_NAME first, which marks the new
+    pack as complete. An interrupted compaction is finished by the next
+    finish_compaction (every load_index and PackWriter runs it), or left
+    undone if it stopped before that point.
+    Args:
+        dir_path (str): The directory holding the pack.
+        ratio (:float): The fraction of dead bytes that triggers a rewrite;
+                        0 compacts any pack with dead bytes.
+    Returns:
+        int: The number of bytes reclaimed (0 if the pack was left alone).
+    """
+    if not pack_exists(dir_path):
+        return 0
+    index = load_index(dir_path)
+    dead = dead_bytes(dir_path, index)
+    size = dead + sum(length for _, length in index.values())
+    if dead <= 0 or dead <= ratio * size:
+        return 0
+    pack_tmp = os.path.join(dir_path, PACK_NAME + ".tmp")
+    index_tmp = os.path.join(dir_path, INDEX_NAME + ".tmp")
+    with PackReader(dir_path) as reader, \
+            open(pack_tmp, 'wb', buffering=1024 * 1024) as pack, \
+            open(index_tmp, 'w') as index_file:
+        offset = 0
+        for name in reader.names():
+            start, length = reader.index[name]
+            pack.write(reader.map[start:start + length])
+            index_file.write(json.dumps({"name": name, "offset": offset,
+                                         "length": length},
+                                        sort_keys=True) + "\n")
+            offset += length
+        pack.flush()
+        os.fsync(pack.fileno())
+        index_file.flush()
+        os.fsync(index_file.fileno())
+    os.replace(index_tmp, os.path.join(dir_path, COMPACT_NAME))
+    finish_compaction(dir_path)
+    return dead
+
+def finish_compaction(dir_path):
+    """
+    Puts the files of a compaction in place (see compact). Temporary files
+    of a compaction that stopped before its index was complete are left
+    alone; the old pack stays in use and the next compaction overwrites
+    them.
+    """
+    compacted = os.path.join(dir_path, COMPACT_NAME)
+    if not os.path.isfile(compacted):
+        return
+    pack_tmp = os.path.join(dir_path, PACK_NAME + ".tmp")
+    if os.path.isfile(pack_tmp):
+        os.replace(pack_tmp, os.path.join(dir_path, PACK_NAME))
+    os.replace(compacted, os.path.join(dir_path, INDEX_NAME))
+
+def export_pack(dir_path, out_dir=None):
+    """
+    Expands a pack into one file per report, the layout used without packing.
+    Args:
+        dir_path (str): The directory holding the pack.
+        out_dir (:str): Where to write the reports (default: dir_path).
+    Returns:
+        int: The number of reports written.
+    """
+    out_dir = out_dir or dir_path
+    os.makedirs(out_dir, exist_ok=True)
+    with PackReader(dir_path) as reader:
+        names = reader.names()
+        for name in names:
+            with open(os.path.join(out_dir, name), 'w') as f:
+                f.write(reader.get(name))
+    return len(names)
+
+################################################################################
+# command line
+################################################################################
+
+def pack_dir(location):
+    """
+    Resolves a command line location: a directory as is, otherwise a
+    homework name (e.g., "hw1") whose results directory is used.
+    """
+    if os.path.isdir(location):
+        return location
+    return os.path.join(RESULTS_PATH_PREFIX, location + "_results")
+
+def config_argparser():
+    """
+    Sets up command line options using argparse and returns the argparse
+    argument parser object.
+    """
+    parser = argparse.ArgumentParser(
+        description="Work with packed report archives.")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+    p = sub.add_parser("export",
+                       help="Expand a pack into one report file per student")
+    p.add_argument("location",
+                   help="A homework (e.g., hw1) or a directory holding a pack")
+    p.add_argument("-o", "--output",
+                   help="Directory to write reports to (default: the pack's)")
+    p = sub.add_parser("list", help="List the reports in a pack")
+    p.add_argument("location",
+                   help="A homework (e.g., hw1) or a directory holding a pack")
+    p = sub.add_parser("compact",
+                       help="Rewrite a pack without its replaced and removed reports")
+    p.add_argument("location",
+                   help="A homework (e.g., hw1) or a directory holding a pack")
+    return parser
+
+
+def main():
+    args = config_argparser().parse_args()
+    dir_path = pack_dir(args.location)
+    if not pack_exists(dir_path):
+        print("Error: no packed reports in " + dir_path + ".")
+        return
+    if args.command == "export":
+        count = export_pack(dir_path, args.output)
+        print("Wrote " + str(count) + " reports to " +
+              (args.output or dir_path) + ".")
+    elif args.command == "list":
+        for name, (offset, length) in sorted(load_index(dir_path).items()):
+            print(name.ljust(15, '.') + " " + str(length) + " bytes")
+    elif args.command == "compact":
+        print("Reclaimed " + str(compact(dir_path, 0)) + " bytes.")
+
+# END METHODS ##################################################################
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+#! /usr/bin/env python3.5
+
+import math
+import os
+import statistics
+import sys
+
+from config.settings240 import *
+from process240 import run_stream
+
+
+# METHODS ######################################################################
+
+################################################################################
+# timing
+################################################################################
+
+def summarize(times):
+    """
+    Summarizes the cpu times of repeated runs.
+    Args:
+        times (obj): A list of seconds.
+    Returns:
+        obj: A dict with "runs", "median", "spread" (the median absolute
+             deviation from the median), "min" and "max".
+    """
+    median = statistics.median(times)
+    return {"runs": len(times),
+            "median": round(median, 6),
+            "spread": round(statistics.median(abs(t - median) for t in times), 6),
+            "min": round(min(times), 6),
+            "max": round(max(times), 6)}
+
+def time_runs(executable, test, runs=PERF_RUNS, warmup=PERF_WARMUP,
+              limits=None):
+    """
+    Runs an executable on a test's input warmup + runs times, one run at a
+    time, and summarizes the cpu time (user + system, from the kernel) of
+    the timed runs. Cpu time is used rather than wall time because it
+    changes far less with the load on the machine.
+    Args:
+        executable (str): Path to an executable file.
+        test (obj): A bundle test dict (see bundle240).
+        runs (:int): The number of timed runs.
+        warmup (:int): The number of untimed runs first.
+        limits (:obj): Resource limits for each run (see
+                       process240.limit_command).
+    Returns:
+        obj: The summarize dict, or None if a run did not finish normally
+             within PERF_TIMEOUT seconds.
+    """
+    times = []
+    for i in range(warmup + runs):
+        _, status, metrics = run_stream(executable, stdin=test["input"],
+                                        timeout=PERF_TIMEOUT, limits=limits)
+        if not finished(status, metrics):
+            return None
+        if i >= warmup:
+            times.append(metrics["cpu"])
+    return summarize(times)
+
+async def time_runs_async(executable, test, runs=PERF_RUNS,
+                          warmup=PERF_WARMUP, limits=None, semaphore=None):
+    """
+    The asyncio version of time_runs, for async240. The runs still go one
+    at a time, each holding semaphore while it runs.
+    """
+    import async240
+
+    times = []
+    for i in range(warmup + runs):
+        _, status, metrics = await async240.run_stream(
+            executable, stdin=test["input"], timeout=PERF_TIMEOUT,
+            limits=limits, semaphore=semaphore)
+        if not finished(status, metrics):
+            return None
+        if i >= warmup:
+            times.append(metrics["cpu"])
+    return summarize(times)
+
+def finished(status, metrics):
+    """
+    Returns True if a timed run ended normally (output is not compared, only
+    that the program ran to completion).
+    """
+    return status == "ok" and metrics["signal"] is None
+
+def timed_tests(bundle, verdicts=None):
+    """
+    Returns the bundle tests to time, leaving out those the student failed.
+    Args:
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        verdicts (:obj): The student's run_tests verdicts; None for the
+                         reference solution.
+    """
+    failed = set(v["test"] for v in verdicts or [] if v["verdict"] == "fail")
+    return [test for test in bundle["tests"]
+            if test["name"] in bundle["performance"] and
+            test["name"] not in failed]
+
+################################################################################
+# reference solution
+################################################################################
+
+def time_reference(hw, args, bundle, build_dir, compile):
+    """
+    Compiles the reference solution in support_files/reference/<hw> the way
+    students' submissions are compiled and times it on each performance
+    test. Ends the process if the reference is missing or does not run.
+    Args:
+        hw (str): The homework being graded (e.g., "hw2").
+        args (obj): The parsed command line arguments.
+        bundle (obj): The homework's assignment bundle (see bundle240).
+        build_dir (str): Where to build the reference executable.
+        compile (obj): The grader's compile function (grade240.compile).
+    Returns:
+        obj: A dict mapping performance test names to summarize dicts.
+    """
+    if not bundle["performance"] or bundle["reference"] is None:
+        print("Error: --perf needs test_files/" + hw + "/performance and "
+              "a reference solution in " +
+              os.path.join(REFERENCE_PATH_PREFIX, hw) + ".")
+        sys.exit()
+    os.makedirs(build_dir, exist_ok=True)
+    sources = [os.path.join(bundle["reference"], f)
+               for f in bundle["required_files"]]
+    gccflags = "-I" + bundle["reference"]
+    if args.c99mode:
+        gccflags += " -std=c99"
+    objects = []
+    if args.altmain:
+        if bundle.get("alt_main_object"):
+            objects.append((bundle["alt_main"], bundle["alt_main_object"]))
+        else:
+            sources.append(bundle["alt_main"])
+    executable = os.path.join(build_dir, "reference")
+    ok, compile_str = compile(sources, executable, gccflags, objects=objects,
+                              jobs=COMPILE_JOBS)
+    if not ok:
+        print("Error: the reference solution for " + hw + " does not "
+              "compile.\n" + compile_str)
+        sys.exit()
+    limits = SANDBOX_LIMITS if args.sandbox else None
+    reference = {}
+    for test in timed_tests(bundle):
+        summary = time_runs(executable, test, args.perf_runs,
+                            args.perf_warmup, limits)
+        if summary is None:
+            print("Error: the reference solution for " + hw + " did not "
+                  "finish performance test " + test["name"] + ".")
+            sys.exit()
+        reference[test["name"]] = summary
+    return reference
+
+################################################################################
+# rating
+################################################################################
+
+def slowdown(student, reference):
+    """
+    Returns how many times slower a student's median cpu time is than the
+    reference's, with both raised to at least PERF_MIN_SECONDS.
+    """
+    return (max(student["median"], PERF_MIN_SECONDS) /
+            max(reference["median"], PERF_MIN_SECONDS))
+
+def rating(value, thresholds=PERF_THRESHOLDS):
+    """
+    Returns the PERF_THRESHOLDS rating for a slowdown.
+    """
+    for limit, label in thresholds:
+        if limit is None or value <= limit:
+            return label
+    return thresholds[-1][1]
+
+def rate(bundle, timings):
+    """
+    Compares a student's timings with the reference's.
+    Args:
+        bundle (obj): The bundle, with "reference_times" from time_reference.
+        timings (obj): A dict mapping each performance test name to the
+                       student's summarize dict, or None if it was not timed
+                       (the test failed or did not finish).
+    Returns:
+        obj: A dict with "tests" (a list of {"test", "student", "reference",
+             "slowdown"} dicts), "slowdown" (the geometric mean over the
+             tests) and "rating"; both are None unless every test was timed.
+    """
+    tests = []
+    for name in bundle["performance"]:
+        reference = bundle["reference_times"][name]
+        student = timings.get(name)
+        tests.append({"test": name,
+                      "student": student,
+                      "reference": reference,
+                      "slowdown": (round(slowdown(student, reference), 3)
+                                   if student is not None else None)})
+    overall = None
+    label = None
+    if tests and all(t["slowdown"] is not None for t in tests):
+        overall = round(math.exp(sum(math.log(t["slowdown"]) for t in tests) /
+                                 len(tests)), 3)
+        label = rating(overall)
+    return {"tests": tests, "slowdown": overall, "rating": label}
+
+def write_performance(performance, output):
+    """
+    Writes the performance section of a report.
+    Args:
+        performance (obj): The rate dict.
+        output (obj): File to write results to.
+    """
+    runs = performance["tests"][0]["reference"]["runs"]
+    lines = ["PERFORMANCE (cpu seconds, median +/- median deviation of " +
+             str(runs) + " runs)\n\n",
+             "  " + "test".ljust(20) + "submission".rjust(20) +
+             "reference".rjust(20) + "slowdown".rjust(12) + "\n"]
+    for t in performance["tests"]:
+        if t["student"] is None:
+            student = "not timed"
+            factor = "-"
+        else:
+            student = ("%.4f" % t["student"]["median"] + " +/- " +
+                       "%.4f" % t["student"]["spread"])
+            factor = "%.2fx" % t["slowdown"]
+        reference = ("%.4f" % t["reference"]["median"] + " +/- " +
+                     "%.4f" % t["reference"]["spread"])
+        lines.append("  " + t["test"].ljust(20) + student.rjust(20) +
+                     reference.rjust(20) + factor.rjust(12) + "\n")
+    if performance["rating"] is None:
+        lines.append("\nRATING: NOT RATED (tests that fail or do not finish "
+                     "are not timed)\n")
+    else:
+        lines.append("\nRATING: " + performance["rating"] + " (" +
+                     "%.2f" % performance["slowdown"] +
+                     "x the reference solution's time)\n")
+    output.write("".join(lines))
+    output.write(DIVIDER)
+
+def grade_performance(executable, bundle, args, verdicts, output, timer):
+    """
+    Times a student's executable on the performance tests it passed, rates
+    it against the reference solution and writes the report section.
+    Args:
+        executable (str): Path to the student's executable.
+        bundle (obj): The bundle, with "reference_times".
+        args (obj): The parsed command line arguments.
+        verdicts (obj): The student's run_tests verdicts.
+        output (obj): File to write results to.
+        timer (obj): A StageTimer to record the time spent with.
+    Returns:
+        obj: The rate dict.
+    """
+    limits = SANDBOX_LIMITS if args.sandbox else None
+    timings = {}
+    for test in timed_tests(bundle, verdicts):
+        with timer.stage("perf", test["name"]):
+            timings[test["name"]] = time_runs(executable, test,
+                                              args.perf_runs, args.perf_warmup,
+                                              limits)
+    performance = rate(bundle, timings)
+    write_performance(performance, output)
+    return performance
+
+async def grade_performance_async(executable, bundle, args, verdicts, output,
+                                  timer, semaphore):
+    """
+    The asyncio version of grade_performance, for async240.
+    """
+    limits = SANDBOX_LIMITS if args.sandbox else None
+    timings = {}
+    for test in timed_tests(bundle, verdicts):
+        with timer.stage("perf", test["name"]):
+            timings[test["name"]] = await time_runs_async(
+                executable, test, args.perf_runs, args.perf_warmup, limits,
+                semaphore)
+    performance = rate(bundle, timings)
+    write_performance(performance, output)
+    return performance
+
+# END METHODS ##################################################################
@@ -0,0 +1,365 @@
+#! /usr/bin/env python3.5
+
+import hashlib
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+
+from config.settings240 import HELPER_PATH
+
+
+# CONSTANTS ####################################################################
+
+# util-linux prlimit, which sets the sandbox limits and then runs the test
+PRLIMIT = "prlimit"
+
+# rss240 FD COMMAND...: runs COMMAND as its child, writes the child's peak
+# resident set size in KB to FD and then exits the way the child did. A
+# program started straight from the grader inherits the grader's peak RSS
+# when it execs; one forked from this small wrapper starts near zero.
+RSS_WRAPPER_SOURCE = r"""
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+
+int main(int argc, char **argv)
+{
+    struct rlimit no_core = {0, 0};
+    struct rusage usage;
+    int fd, status;
+    pid_t pid;
+
+    if (argc < 3)
+        return 127;
+    fd = atoi(argv[1]);
+    pid = fork();
+    if (pid < 0)
+        return 127;
+    if (pid == 0) {
+        close(fd);
+        execvp(argv[2], argv + 2);
+        _exit(127);
+    }
+    while (wait4(pid, &status, 0, &usage) < 0)
+        if (errno != EINTR)
+            return 127;
+    dprintf(fd, "%ld\n", usage.ru_maxrss);
+    close(fd);
+    if (WIFSIGNALED(status)) {
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        raise(WTERMSIG(status));
+        return 128 + WTERMSIG(status);
+    }
+    return WEXITSTATUS(status);
+}
+"""
+
+# END CONSTANTS ################################################################
+
+
+# METHODS ######################################################################
+
+################################################################################
+# processes
+################################################################################
+
+def limit_command(limits):
+    """
+    Builds the prlimit command that applies resource limits and then execs
+    the student's program in the same process. The limits are not set with
+    a preexec_fn because tests are started from several threads at once,
+    and preexec_fn is not safe to use with threads.
+    Args:
+        limits (obj): A dict with "cpu" (seconds), "memory" (bytes of address
+                      space), "file_size" (bytes) and "processes" limits.
+                      Missing or None entries are left unlimited.
+    Returns:
+        obj: A list of arguments to put in front of the command.
+    """
+    command = [PRLIMIT]
+    for key, option in (("cpu", "--cpu="),
+                        ("memory", "--as="),
+                        ("file_size", "--fsize="),
+                        ("processes", "--nproc=")):
+        if limits.get(key) is not None:
+            command.append(option + str(limits[key]))
+    return command + ["--"]
+
+rss_wrapper_lock = threading.Lock()
+rss_wrapper_path = None
+
+def rss_wrapper():
+    """
+    Returns the path of the rss240 wrapper (see RSS_WRAPPER_SOURCE),
+    compiling it into HELPER_PATH the first time. It is named by the hash
+    of its source, so a changed wrapper is rebuilt.
+    Returns:
+        str: The executable's path, or None if it does not compile.
+    """
+    global rss_wrapper_path
+    with rss_wrapper_lock:
+        if rss_wrapper_path is not None:
+            return rss_wrapper_path
+        name = ("rss240-" + hashlib.sha256(
+            RSS_WRAPPER_SOURCE.encode('utf-8')).hexdigest()[:16])
+        path = os.path.join(HELPER_PATH, name)
+        if not os.path.isfile(path):
+            os.makedirs(HELPER_PATH, exist_ok=True)
+            tmp = path + ".tmp" + str(os.getpid())
+            with open(tmp + ".c", 'w') as f:
+                f.write(RSS_WRAPPER_SOURCE)
+            try:
+                run("gcc -O2 " + tmp + ".c -o " + tmp)
+                if not os.path.isfile(tmp):
+                    return None
+                # another grader may have built it too; either copy works
+                os.replace(tmp, path)
+            finally:
+                os.remove(tmp + ".c")
+        rss_wrapper_path = path
+        return path
+
+def child_rss(proc):
+    """
+    Returns the peak RSS in KB that the rss240 wrapper measured for a
+    reaped process, or None if it was not measured (or the wrapper was
+    killed before it could report).
+    """
+    fd = getattr(proc, "rss_fd", None)
+    if fd is None:
+        return None
+    try:
+        data = os.read(fd, 64)
+    finally:
+        os.close(fd)
+    try:
+        return int(data)
+    except ValueError:
+        return None
+
+def reap(proc, deadline):
+    """
+    Waits for a process to exit, collecting its resource usage.
+    Args:
+        proc (obj): The subprocess.Popen object.
+        deadline (float): A time.monotonic() value after which to give up.
+    Returns:
+        int: The raw wait status, or None if the deadline passed first.
+        obj: The resource usage of the process, or None.
+    """
+    delay = 0.0005
+    while True:
+        pid, wait_status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            return (wait_status, rusage)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return (None, None)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+def start_process(command, stdin = None, limits = None, new_session = False):
+    """
+    Starts an executable with its standard output and error on one pipe.
+    Args:
+        command (str): The command to run (split on whitespace).
+        stdin(:string): File to be treated as standard in.
+        limits(:obj): Resource limits for the process (see limit_command).
+                      Implies new_session. The process is started through
+                      the rss240 wrapper, which measures its peak RSS (see
+                      child_rss).
+        new_session(:bool): Start the process in its own session (and
+                            process group), so that os.killpg stops it
+                            together with anything it forks.
+    Returns:
+        obj: The subprocess.Popen object.
+    """
+    in_file = open(stdin, 'rb') if stdin is not None else None
+    try:
+        if limits is not None:
+            wrapper = rss_wrapper()
+            if wrapper is None:
+                return subprocess.Popen(limit_command(limits) + command.split(),
+                                        stdin=in_file,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+            read_fd, write_fd = os.pipe()
+            try:
+                proc = subprocess.Popen([wrapper, str(write_fd)] +
+                                        limit_command(limits) + command.split(),
+                                        stdin=in_file,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=True,
+                                        pass_fds=(write_fd,))
+            except BaseException:
+                os.close(read_fd)
+                raise
+            finally:
+                os.close(write_fd)
+            proc.rss_fd = read_fd
+            return proc
+        return subprocess.Popen(command.split(),
+                                stdin=in_file,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                start_new_session=new_session)
+    finally:
+        if in_file is not None:
+            in_file.close()
+
+def output_exceeded(n_bytes, n_lines, max_bytes, max_lines):
+    """
+    Returns True once a run's output is past either output limit.
+    """
+    return ((max_bytes is not None and n_bytes > max_bytes) or
+            (max_lines is not None and n_lines > max_lines))
+
+def process_metrics(wall, wait_status, rusage, max_rss_kb=None):
+    """
+    Builds the run_stream metrics dict for a process that has been reaped.
+    Args:
+        wall (float): Seconds from start to exit.
+        wait_status (int): The raw wait status from os.wait4.
+        rusage (obj): The resource usage from os.wait4 (cpu time includes
+                      the children the process waited for).
+        max_rss_kb (:int): The peak RSS from child_rss, if measured.
+    """
+    metrics = {"wall": round(wall, 4),
+               "cpu": round(rusage.ru_utime + rusage.ru_stime, 4),
+               "max_rss_kb": max_rss_kb,
+               "exit_code": None,
+               "signal": None}
+    if os.WIFSIGNALED(wait_status):
+        signum = os.WTERMSIG(wait_status)
+        try:
+            metrics["signal"] = signal.Signals(signum).name
+        except ValueError:
+            metrics["signal"] = str(signum)
+    else:
+        metrics["exit_code"] = os.WEXITSTATUS(wait_status)
+    return metrics
+
+def decode_output(chunks, status, max_bytes = None, max_lines = None):
+    """
+    Joins the chunks a run printed, cuts truncated output at the output
+    limit and decodes it with normalized line endings.
+    """
+    data = b''.join(chunks)
+    if status == "truncated":
+        if max_bytes is not None:
+            data = data[:max_bytes]
+        if max_lines is not None:
+            end = -1
+            for _ in range(max_lines):
+                end = data.find(b'\n', end + 1)
+                if end == -1:
+                    break
+            if end != -1:
+                data = data[:end + 1]
+    text = data.decode('utf-8', errors='replace')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def run_stream(command, stdin = None, timeout = 5, max_bytes = None,
+               max_lines = None, limits = None):
+    """
+    Invokes an executable and reads its output incrementally, stopping the
+    process once it times out or exceeds an output limit, so that memory use
+    stays bounded no matter how much the program prints.
+    Args:
+        command (str): The string to execute in the shell.
+        stdin(:string): File to be treated as standard in.
+        timeout(:int): How long to wait (in seconds) before timing out.
+        max_bytes(:int): Stop the process after this many bytes of output.
+        max_lines(:int): Stop the process after this many lines of output.
+        limits(:obj): Resource limits for the process (see limit_command).
+                      The process also runs in its own session, so anything
+                      it forks is killed along with it.
+    Returns:
+        str: The output produced by the command, cut at the output limit.
+        str: "ok", "timeout" or "truncated".
+        obj: A dict of metrics: "wall" and "cpu" seconds, "max_rss_kb"
+             (peak resident memory, measured only with limits, else None),
+             "exit_code" and "signal" (the name of the signal that ended the
+             process, or None).
+    """
+    start = time.monotonic()
+    proc = start_process(command, stdin, limits)
+
+    deadline = start + timeout
+    chunks = []
+    n_bytes = 0
+    n_lines = 0
+    status = "ok"
+    wait_status = None
+    rusage = None
+    fd = proc.stdout.fileno()
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                status = "timeout"
+                break
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                status = "timeout"
+                break
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            n_bytes += len(chunk)
+            n_lines += chunk.count(b'\n')
+            if output_exceeded(n_bytes, n_lines, max_bytes, max_lines):
+                status = "truncated"
+                break
+        if status == "ok":
+            wait_status, rusage = reap(proc, deadline)
+            if wait_status is None:
+                status = "timeout"
+    finally:
+        if wait_status is None:
+            try:
+                if limits is not None:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                else:
+                    proc.kill()
+            except OSError:
+                pass
+            _, wait_status, rusage = os.wait4(proc.pid, 0)
+        proc.stdout.close()
+        max_rss_kb = child_rss(proc)
+    metrics = process_metrics(time.monotonic() - start, wait_status, rusage,
+                              max_rss_kb)
+    # the process was reaped with os.wait4, so tell Popen not to wait for it
+    proc.returncode = (-os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status)
+                       else os.WEXITSTATUS(wait_status))
+    return (decode_output(chunks, status, max_bytes, max_lines), status,
+            metrics)
+
+def run(command, stdin = None, timeout = 5):
+    """
+    Invokes an executable in the shell and returns the output as a string.
+    Args:
+        command (str): The string to execute in the shell.
+        stdin(:string): File to be treated as standard in.
+        timeout(:int): How long to wait (in seconds) before timing out.
+    Returns:
+        str: The output produced by the command being executed or "__TIMEOUT__"
+             if the command fails to complete within specified timeout.
+    """
+    result, status, _ = run_stream(command, stdin, timeout)
+    if status == "timeout":
+        return "__TIMEOUT__"
+    return result
+
+# END METHODS ##################################################################
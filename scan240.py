@@ -0,0 +1,200 @@
+#! /usr/bin/env python3.5
+
+import json
+import os
+import time
+
+
+# CONSTANTS ####################################################################
+
+# bump when the layout of the index changes so old index files are ignored
+# (2: saved indexes keep the content hashes of manifest240.hash_files)
+INDEX_VERSION = 2
+
+
+# METHODS ######################################################################
+
+################################################################################
+# scanning
+################################################################################
+
+def scan_tree(dir_path):
+    """
+    Describes every file below a directory by size and modification time,
+    with one os.scandir per directory and one stat per file. Like os.walk,
+    symbolic links to directories are not followed.
+    Args:
+        dir_path (str): The directory to describe.
+    Returns:
+        obj: A dict mapping relative paths to {"size", "mtime"} dicts.
+    """
+    files = {}
+    pending = [""]
+    while pending:
+        rel = pending.pop()
+        try:
+            entries = list(os.scandir(os.path.join(dir_path, rel)))
+        except OSError:
+            continue
+        for entry in entries:
+            name = os.path.join(rel, entry.name) if rel else entry.name
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        pending.append(name)
+                    continue
+                st = entry.stat()
+            except OSError:
+                # removed while scanning, or a broken link
+                continue
+            files[name] = {"size": st.st_size, "mtime": st.st_mtime}
+    return files
+
+def scan_student(student_dir, homeworks=None):
+    """
+    Describes a student's homework directories.
+    Args:
+        student_dir (str): The student's directory (COURSE_DIR/<student>).
+        homeworks (:obj): The homework names to describe; None for all.
+    Returns:
+        obj: {"homework": {hw: {"mtime", "files"}}}, with files as for
+             scan_tree, or None if the student has no directory.
+    """
+    try:
+        entries = list(os.scandir(student_dir))
+    except OSError:
+        return None
+    homework = {}
+    for entry in entries:
+        if homeworks is not None and entry.name not in homeworks:
+            continue
+        try:
+            if not entry.is_dir():
+                continue
+            mtime = entry.stat().st_mtime
+        except OSError:
+            continue
+        homework[entry.name] = {"mtime": mtime,
+                                "files": scan_tree(entry.path)}
+    return {"homework": homework}
+
+def scan_course(course_dir, students=None, homeworks=None):
+    """
+    Walks the course directory once and indexes each student's homework
+    directories, so that grading needs no further stat calls to find
+    missing files, submission times or changed submissions.
+    Args:
+        course_dir (str): The course directory (COURSE_DIR).
+        students (:obj): The unix names to scan; None for every directory
+                         in course_dir.
+        homeworks (:obj): The homework names to scan; None for all.
+    Returns:
+        obj: An index dict with "version", "time", "homeworks" and
+             "students", which maps each unix name to its scan_student
+             entry (None if the student has no directory).
+    """
+    if students is None:
+        try:
+            students = sorted(entry.name for entry in os.scandir(course_dir)
+                              if entry.is_dir())
+        except OSError:
+            students = []
+    index = {"version": INDEX_VERSION,
+             "time": time.time(),
+             "homeworks": sorted(homeworks) if homeworks is not None else None,
+             "students": {}}
+    for student in students:
+        index["students"][student] = scan_student(
+            os.path.join(course_dir, student), homeworks)
+    return index
+
+################################################################################
+# lookups
+################################################################################
+
+def homework_files(entry, hw):
+    """
+    Returns the files of a student's homework directory from their index
+    entry (see scan_tree), or None if the student or directory is missing.
+    """
+    if entry is None or hw not in entry["homework"]:
+        return None
+    return entry["homework"][hw]["files"]
+
+def same_files(old_files, new_files):
+    """
+    Returns True if two descriptions of a directory have the same file
+    names, sizes and modification times (content hashes are not compared).
+    Either may be None for a missing directory.
+    """
+    if old_files is None or new_files is None:
+        return old_files is new_files
+    if old_files.keys() != new_files.keys():
+        return False
+    return all(old_files[rel]["size"] == info["size"] and
+               old_files[rel]["mtime"] == info["mtime"]
+               for rel, info in new_files.items())
+
+def changed_students(old, new, hw):
+    """
+    Returns the students in new whose homework directory is different (by
+    file names, sizes and modification times) from the old index.
+    """
+    old_students = old["students"] if old is not None else {}
+    return sorted(student for student, entry in new["students"].items()
+                  if student not in old_students or
+                  not same_files(homework_files(old_students[student], hw),
+                                 homework_files(entry, hw)))
+
+################################################################################
+# persistence
+################################################################################
+
+def load_index(index_path):
+    """
+    Loads the index saved by an earlier run, or returns None.
+    """
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+def merge_index(old, new):
+    """
+    Updates an earlier index with a newer scan of some students or
+    homeworks. Homeworks the newer scan did not look at are kept.
+    Returns:
+        obj: The merged index.
+    """
+    if old is None or new["homeworks"] is None:
+        merged = {"students": {}}
+    else:
+        merged = old
+    for student, entry in new["students"].items():
+        previous = merged["students"].get(student)
+        if entry is not None and previous is not None:
+            homework = {hw: info for hw, info in previous["homework"].items()
+                        if hw not in new["homeworks"]}
+            homework.update(entry["homework"])
+            entry = {"homework": homework}
+        merged["students"][student] = entry
+    merged.update(version=INDEX_VERSION, time=new["time"], homeworks=None)
+    return merged
+
+def save_index(index, index_path):
+    """
+    Writes an index through a temporary file and a rename, so concurrent
+    runs never read a partial index.
+    """
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = index_path + ".tmp." + str(os.getpid())
+    # one write of the whole index; json.dump writes in small pieces
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(index))
+    os.replace(tmp_path, index_path)
+
+# END METHODS ##################################################################
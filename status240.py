@@ -1,15 +1,33 @@
 #! /usr/bin/env python3.5
 
 import argparse
+import hashlib
 import heapq
 import json
-from grade240 import CS240_DIR, JSON_PATH, DIVIDER, empty_dir, active_students
+from config.settings240 import GRADE_JSON_PATH as JSON_PATH, GRADE_DB_PATH, DIVIDER
+from gradebook240 import GradebookError, open_gradebook
 import os
+import pack240
+from shutil import rmtree
+import sys
 import time
 
+# numpy is imported by load_numpy, only when there are enough reports to
+# write for batch_grades to pay for the import
+np = None
+numpy_checked = False
+
 
 # CONSTANTS ####################################################################
 
+STATUS_MANIFEST_NAME = ".status_manifest.json"
+
+# bump when the report format changes, so old reports are rewritten
+STATUS_VERSION = 1
+
+# fewest changed reports worth importing numpy for
+BATCH_MIN_STUDENTS = 50
+
 # END CONSTANTS ################################################################
 
 
@@ -30,18 +48,16 @@ def get_default_counts(student):
             result["qz"] += 1;
     return result
 
-def get_student(data, unix):
+def get_student(gradebook, unix):
     """
-    Extract a particular student from JSON data object, based on unix name.
+    Extract a particular student from the gradebook, based on unix name.
     Args:
-        data (obj): dictionary based on the json score document
+        gradebook (obj): the Gradebook store
         unix (str): name of the student to return
     Returns:
         obj: a dict mapping homeworks/exams/quizzes to their max scores
     """
-    for student in data:
-        if student["unixName"] == unix:
-            return student
+    return gradebook.get_student(unix)
 
 def get_hw_info(student, hw, max_scores):
     """
@@ -111,6 +127,153 @@ def get_qz_info(student):
 
 
 
+def student_status(student, hw, max_scores):
+    """
+    Builds one student's status report with get_hw_info, get_ex_info and
+    get_qz_info.
+    Returns:
+        int: raw final grade
+        str: the report
+    """
+    hw_grade, hw_report = get_hw_info(student, hw, max_scores)
+    ex_grade, ex_report = get_ex_info(student)
+    qz_grade, qz_report = get_qz_info(student)
+    raw_final = round(hw_grade * .3 + ex_grade * .6 + qz_grade * .1)
+    report = ("\n\n" + "Status report for: " + student['unixName'] + "\n" +
+              DIVIDER + hw_report + ex_report + qz_report +
+              "Raw final grade: " + str(raw_final))
+    return (raw_final, report)
+
+################################################################################
+# incremental status reports
+################################################################################
+
+def status_fingerprint(student, hw, max_scores):
+    """
+    Hashes everything that feeds a student's status report: their scores,
+    the max scores they are measured against and the number of homeworks.
+    Returns:
+        str: A hex digest.
+    """
+    keys = item_keys("hw", hw) + item_keys("ex", 3) + item_keys("qz", 3)
+    inputs = [STATUS_VERSION, student["unixName"], hw,
+              [student.get(k) for k in keys],
+              [max_scores.get(k) for k in item_keys("hw", hw)]]
+    return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+def load_status_manifest(results_dir):
+    """
+    Loads the fingerprints and raw final grades of the reports already in a
+    status directory.
+    Returns:
+        obj: A dict mapping unix names to {"fingerprint", "final"} dicts.
+    """
+    try:
+        with open(os.path.join(results_dir, STATUS_MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_status_manifest(manifest, results_dir):
+    """
+    Writes the status manifest, replacing the old one atomically.
+    """
+    manifest_path = os.path.join(results_dir, STATUS_MANIFEST_NAME)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+################################################################################
+# batch grade computation
+################################################################################
+
+def load_numpy():
+    """
+    Imports numpy the first time it is needed.
+    Returns:
+        obj: The numpy module, or None if numpy is not installed (grades are
+             then computed one student at a time).
+    """
+    global np, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+    return np
+
+def item_keys(prefix, count):
+    """
+    Returns gradebook keys such as ["hw01", "hw02"] for prefix "hw", count 2.
+    """
+    return [prefix + str(i).rjust(2, '0') for i in range(1, count + 1)]
+
+def batch_grades(students, hw, max_scores):
+    """
+    Computes the homework, exam, quiz and raw final grades for a whole class
+    with numpy array operations on a students x assessments score matrix.
+    Rounding matches get_hw_info, get_ex_info and get_qz_info exactly (both
+    round halves to even).
+    Args:
+        students (obj): A list of JSON student objects.
+        hw (int): The number of homeworks to look at.
+        max_scores (obj): dict mapping hw/exam/quiz to max score
+    Returns:
+        obj: A dict of numpy arrays, one row per student: "hw_sub" (each
+             homework as a percentage), "hw", "ex", "qz" and "final".
+    """
+    hw_keys = item_keys("hw", hw)
+    hw_scores = np.array([[s[k] for k in hw_keys] for s in students],
+                         dtype=float).reshape(len(students), hw)
+    ex_scores = np.array([[s[k] for k in item_keys("ex", 3)] for s in students],
+                         dtype=float).reshape(len(students), 3)
+    qz_scores = np.array([[s[k] for k in item_keys("qz", 3)] for s in students],
+                         dtype=float).reshape(len(students), 3)
+    hw_max = np.array([max_scores[k] for k in hw_keys], dtype=float)
+
+    hw_sub = np.round((hw_scores * 100) / hw_max)
+    hw_avg = np.round(hw_sub.sum(axis=1) / hw)
+    # best 2 of 3 exams: drop the lowest
+    ex_avg = np.round((ex_scores.sum(axis=1) - ex_scores.min(axis=1)) / 2)
+    qz_avg = np.round(qz_scores.sum(axis=1) / 3)
+    final = np.round(hw_avg * .3 + ex_avg * .6 + qz_avg * .1)
+    return {"hw_sub": hw_sub.astype(int), "hw": hw_avg.astype(int),
+            "ex": ex_avg.astype(int), "qz": qz_avg.astype(int),
+            "final": final.astype(int)}
+
+def render_status(student, hw, max_scores, grades, i):
+    """
+    Renders one student's status report from batch_grades results. The text
+    is the same as the report built by get_hw_info, get_ex_info and
+    get_qz_info.
+    Args:
+        student (obj): A JSON student object with grade information.
+        hw (int): The number of homeworks to look at.
+        max_scores (obj): dict mapping hw/exam/quiz to max score
+        grades (obj): The dict returned by batch_grades.
+        i (int): The student's row in grades.
+    Returns:
+        str: The report.
+    """
+    parts = ["\n\n", "Status report for: ", student['unixName'], "\n", DIVIDER,
+             "Homework\n", DIVIDER]
+    for j, key in enumerate(item_keys("hw", hw)):
+        parts += ["  ", key, ": ", str(student[key]).rjust(2, ' '), " / ",
+                  str(max_scores[key]), " (", str(grades["hw_sub"][i][j]), ")\n"]
+    parts += ["hw average: ", str(grades["hw"][i]), "\n", DIVIDER,
+              "Exams\n", DIVIDER]
+    for j, key in enumerate(item_keys("ex", 3)):
+        parts += ["  ex", str(j + 1), ": ", str(student[key]).rjust(3, ' '), "\n"]
+    parts += ["exam average (best 2): ", str(grades["ex"][i]), "\n", DIVIDER,
+              "Quizzes\n", DIVIDER]
+    for j, key in enumerate(item_keys("qz", 3)):
+        parts += ["  qz", str(j + 1), ": ", str(student[key]).rjust(3, ' '), "\n"]
+    parts += ["quiz average: ", str(grades["qz"][i]), "\n", DIVIDER,
+              "Raw final grade: ", str(grades["final"][i])]
+    return "".join(parts)
+
+
 ################################################################################
 # Generate a grade report for selected student(s).
 ################################################################################
@@ -131,21 +294,37 @@ def main():
                         "--quizzes",
                         type=int,
                         help="The number of quizzes that have been graded.")
+    parser.add_argument("-f",
+                        "--full",
+                        help="Rewrite every report, even if its grades have not changed",
+                        action="store_true")
+    parser.add_argument("-p",
+                        "--pack",
+                        help="Append reports to one packed archive (reports.pack) instead of a file per student",
+                        action="store_true")
     args = parser.parse_args()
 
 
-    # create / empty result directories for this hw
+    # create the result directory for today; reports already in it are
+    # only rewritten if their inputs changed (or with --full)
     results_dir = os.path.join(os.getcwd(), "status" + time.strftime("%m-%d-%y"))
-    if os.path.isdir(results_dir):
-        empty_dir(results_dir)
-    else:
+    if args.full and os.path.isdir(results_dir):
+        rmtree(results_dir)
         os.mkdir(results_dir)
+    elif not os.path.isdir(results_dir):
+        os.mkdir(results_dir)
+
+    try:
+        gradebook = open_gradebook(JSON_PATH, GRADE_DB_PATH)
+    except GradebookError as e:
+        print("Error: " + str(e))
+        sys.exit(1)
 
-    with open(JSON_PATH) as data_file:
-        data = json.load(data_file)
+    # get max_score object
+    max_scores = get_student(gradebook, "max_score")
 
     # get default counts of hw, exams, quizzes
-    counts = get_default_counts(data[0])
+    counts = get_default_counts(max_scores)
     if args.assignments:
         counts["hw"] = args.assignments
     if args.exams:
@@ -153,34 +332,94 @@ def main():
     if args.quizzes:
         counts["qz"] = args.quizzes
 
-    # # get list of active students
-    # students = active_students(JSON_PATH)
-
-    # get max_score object
-    max_scores = get_student(data, "max_score")
-
     # if unixname command line argument provided, only process specified student
     if args.unixname:
-        data = {get_student(data, args.unixname)}
+        data = [get_student(gradebook, args.unixname)]
+    else:
+        data = gradebook.students(withdrawn=0)
+    students = [student for student in data if student['withdrawn'] != 1]
+    gradebook.close()
+
+    # find the students whose report inputs changed since the last run; a
+    # directory started with --pack keeps using its pack, and switching an
+    # existing directory to --pack rewrites every report into the pack and
+    # removes the report files it replaces
+    manifest = load_status_manifest(results_dir)
+    if pack240.pack_exists(results_dir):
+        args.pack = True
+    elif args.pack:
+        if args.unixname and manifest:
+            # the other students' reports would be left as files
+            print("Error: " + results_dir + " has a report file per "
+                  "student; switch it to --pack with a run for every "
+                  "student (without -u).")
+            sys.exit(1)
+        for unix in set(manifest) | set(s["unixName"] for s in students):
+            report = os.path.join(results_dir, unix)
+            if os.path.isfile(report):
+                os.remove(report)
+        manifest = {}
+    fingerprints = {}
+    changed = []
+    for student in students:
+        fp = status_fingerprint(student, counts["hw"], max_scores)
+        fingerprints[student["unixName"]] = fp
+        entry = manifest.get(student["unixName"])
+        if entry is None or entry["fingerprint"] != fp:
+            changed.append(student)
+
+    pack = pack240.PackWriter(results_dir) if args.pack else None
+
+    def write_report(unix, report):
+        if pack is not None:
+            pack.add(unix, report)
+        else:
+            with open(os.path.join(results_dir, unix), "w") as output:
+                output.write(report)
+
+    finals = {}
+    if len(changed) >= BATCH_MIN_STUDENTS and load_numpy() is not None:
+        # compute the changed students' grades at once, then render the reports
+        grades = batch_grades(changed, counts["hw"], max_scores)
+        for i, student in enumerate(changed):
+            write_report(student['unixName'],
+                         render_status(student, counts["hw"], max_scores,
+                                       grades, i))
+            finals[student["unixName"]] = int(grades["final"][i])
+    else:
+        for student in changed:
+            raw_final, report = student_status(student, counts["hw"], max_scores)
+            write_report(student['unixName'], report)
+            finals[student["unixName"]] = raw_final
 
-    raw_grades = {}
+    # a full run drops students who are no longer active; -u only updates
+    # its own entry
+    if args.unixname:
+        updated = manifest
+    else:
+        updated = {}
+        for unix in manifest:
+            if unix not in fingerprints:
+                report = os.path.join(results_dir, unix)
+                if pack is not None:
+                    pack.remove(unix)
+                elif os.path.isfile(report):
+                    os.remove(report)
+    if pack is not None:
+        pack.close()
+        pack240.compact(results_dir)
+    for student in students:
+        unix = student["unixName"]
+        if unix in finals:
+            updated[unix] = {"fingerprint": fingerprints[unix],
+                             "final": finals[unix]}
+        else:
+            updated[unix] = manifest[unix]
+    save_status_manifest(updated, results_dir)
 
-    for student in data:
-        if (student['withdrawn'] != 1):
-            output = open(os.path.join(results_dir, student['unixName']), "a")
-            output.write("\n\n")
-            output.write("Status report for: " + student['unixName'] +"\n")
-            output.write(DIVIDER)
-            hw_grade, hw_report = get_hw_info(student, counts["hw"], max_scores)
-            output.write(hw_report)
-            ex_grade, ex_report = get_ex_info(student)
-            output.write(ex_report)
-            qz_grade, qz_report = get_qz_info(student)
-            output.write(qz_report)
-            raw_final = round(hw_grade * .3 + ex_grade * .6 + qz_grade * .1)
-            raw_grades[student["unixName"]] = raw_final
-            output.write("Raw final grade: " + str(raw_final))
-            output.close()
+    raw_grades = {}
+    for unix, entry in updated.items():
+        raw_grades[unix] = entry["final"]
 
     report_path = os.path.join(results_dir, "final_report.txt");
     rp = open(report_path, 'w')
@@ -188,6 +427,9 @@ def main():
         rp.write(grade.ljust(15, '.') + " " + str(raw_grades[grade]) + "\n")
     rp.close()
 
+    print("Rewrote " + str(len(changed)) + " of " + str(len(students)) +
+          " status reports.")
+
 
 # END METHODS ##################################################################
 
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the tools are top level scripts, and read config/settings.json from the
+# current directory, so the tests run from the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
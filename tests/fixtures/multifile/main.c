@@ -0,0 +1,8 @@
+#include <stdio.h>
+#include "shapes.h"
+
+int main(void)
+{
+    printf("%d\n", area(6, 7));
+    return 0;
+}
@@ -0,0 +1,6 @@
+#include "shapes.h"
+
+int area(int width, int height)
+{
+    return width * height;
+}
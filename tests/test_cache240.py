@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cache240
+from cache240 import CompileCache
+
+
+class CompileKeyTest(unittest.TestCase):
+    """
+    The cache key must change with anything that changes the executable.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.main = self.write("main.c", '#include "util.h"\n'
+                                         '#include <local.h>\n'
+                                         '#include <stdio.h>\n'
+                                         'int main(void) { return 0; }\n')
+        self.write("util.h", "#define UTIL 1\n")
+        self.write("local.h", "#define LOCAL 1\n")
+        self.flags = "-I" + self.tmp
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def key(self, sources=None, flags=None):
+        return cache240.compile_key(sources or [self.main],
+                                    self.flags if flags is None else flags)
+
+    def test_same_inputs_same_key(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_quoted_header_changes_key(self):
+        before = self.key()
+        self.write("util.h", "#define UTIL 2\n")
+        self.assertNotEqual(self.key(), before)
+
+    def test_local_angle_header_changes_key(self):
+        before = self.key()
+        self.write("local.h", "#define LOCAL 2\n")
+        self.assertNotEqual(self.key(), before)
+
+    def test_system_headers_are_left_out(self):
+        names = [name for name, _ in
+                 cache240.local_headers([self.main], [self.tmp])]
+        self.assertEqual(names, ["local.h", "util.h"])
+
+    def test_flags_change_key(self):
+        self.assertNotEqual(self.key(flags=self.flags + " -std=c99"),
+                            self.key())
+
+    def test_alt_main_changes_key(self):
+        alt_main = self.write("alt_main.c", "int helper(void);\n")
+        self.assertNotEqual(self.key([self.main, alt_main]), self.key())
+
+
+class EvictionTest(unittest.TestCase):
+    """
+    The cache and the shared objects are trimmed to their size limits,
+    least recently used first.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.exec_path = os.path.join(self.tmp, "main")
+        with open(self.exec_path, 'wb') as f:
+            f.write(b"x" * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_evicts_least_recently_used(self):
+        cache = CompileCache(os.path.join(self.tmp, "compile"), 2500)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.store(key, self.exec_path, True, "COMPILATION SUCCESSFUL\n")
+            os.utime(os.path.join(cache.cache_dir, key), (i, i))
+        # using "a" makes "b" the least recently used
+        self.assertIsNotNone(cache.lookup("a", self.exec_path))
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual(sorted(os.listdir(cache.cache_dir)), ["a", "c"])
+        self.assertIsNone(cache.lookup("b", self.exec_path))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_failed_compile_is_cached(self):
+        cache = CompileCache(os.path.join(self.tmp, "compile"), 2500)
+        cache.store("a", self.exec_path, False, "COMPILATION FAILURE\n")
+        self.assertEqual(cache.lookup("a", self.exec_path),
+                         (False, "COMPILATION FAILURE\n"))
+
+    def test_evict_objects(self):
+        object_dir = os.path.join(self.tmp, "objects")
+        os.makedirs(object_dir)
+        for i, name in enumerate(["a.o", "b.o", "c.o", "d.o.tmp123"]):
+            path = os.path.join(object_dir, name)
+            with open(path, 'wb') as f:
+                f.write(b"x" * 1000)
+            os.utime(path, (i, i))
+        self.assertEqual(cache240.evict_objects(object_dir, 2000), 1)
+        self.assertEqual(sorted(os.listdir(object_dir)),
+                         ["b.o", "c.o", "d.o.tmp123"])
+
+
+if __name__ == '__main__':
+    unittest.main()
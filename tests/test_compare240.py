@@ -0,0 +1,126 @@
+import random
+import unittest
+
+import compare240
+
+
+def lcs_length(a, b):
+    """
+    The length of the longest common subsequence, by dynamic programming.
+    """
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a)):
+        for j in range(len(b)):
+            if a[i] == b[j]:
+                table[i + 1][j + 1] = table[i][j] + 1
+            else:
+                table[i + 1][j + 1] = max(table[i][j + 1], table[i + 1][j])
+    return table[len(a)][len(b)]
+
+
+class NormalizeTest(unittest.TestCase):
+
+    TEXT = "  Hello   World  \n\nSecond Line\t\n"
+
+    def test_default_strips_only_the_ends(self):
+        self.assertEqual(compare240.normalize(self.TEXT),
+                         ["Hello   World  ", "", "Second Line"])
+
+    def test_modes(self):
+        self.assertEqual(compare240.normalize(self.TEXT + "x  \n", ["trailing"]),
+                         ["Hello   World", "", "Second Line", "x"])
+        self.assertEqual(compare240.normalize("a   b \t c", ["space"]),
+                         ["a b c"])
+        self.assertEqual(compare240.normalize(self.TEXT, ["blank", "case"]),
+                         ["hello   world  ", "second line"])
+
+
+class EditScriptTest(unittest.TestCase):
+    """
+    edit_script finds a shortest edit script, or gives up past max_edits.
+    """
+
+    def script(self, a, b, max_edits=1000):
+        return compare240.edit_script(a, b, lambda i, j: a[i] == b[j],
+                                      max_edits)
+
+    def test_shortest_script(self):
+        rng = random.Random(240)
+        for _ in range(200):
+            a = [rng.randrange(4) for _ in range(rng.randrange(12))]
+            b = [rng.randrange(4) for _ in range(rng.randrange(12))]
+            script = self.script(a, b)
+            # the script turns a into b ...
+            self.assertEqual([b[j] for op, _, j in script if op != "-"], b)
+            self.assertEqual([a[i] for op, i, _ in script if op != "+"], a)
+            for op, i, j in script:
+                if op == "=":
+                    self.assertEqual(a[i], b[j])
+            # ... with as few edits as possible
+            edits = sum(1 for op, _, _ in script if op != "=")
+            self.assertEqual(edits, len(a) + len(b) - 2 * lcs_length(a, b))
+
+    def test_gives_up_past_max_edits(self):
+        a = list(range(10))
+        b = list(range(10, 20))
+        self.assertIsNone(self.script(a, b, max_edits=19))
+        self.assertIsNotNone(self.script(a, b, max_edits=20))
+
+
+class CompareTest(unittest.TestCase):
+
+    def test_identical(self):
+        result = compare240.compare("a\nb\n", "a\nb")
+        self.assertEqual(result["verdict"], "pass")
+        self.assertEqual(result["diff"], [])
+
+    def test_normalized_match(self):
+        self.assertEqual(compare240.compare("A  B\n\nC", "a b\nc",
+                                            ["space", "blank", "case"])
+                         ["verdict"], "pass")
+        self.assertEqual(compare240.compare("A  B\n\nC", "a b\nc")["verdict"],
+                         "fail")
+
+    def test_partial(self):
+        result = compare240.compare("one\ntwo\nthree", "one\n2\nthree")
+        self.assertEqual(result["verdict"], "partial")
+        self.assertEqual(result["matched"], 2)
+        self.assertIn("-two", result["diff"])
+        self.assertIn("+2", result["diff"])
+
+    def test_tolerance(self):
+        actual = "area 3.14159\nsteps 10"
+        expected = "area 3.1416\nsteps 10"
+        self.assertEqual(compare240.compare(actual, expected)["verdict"],
+                         "partial")
+        self.assertEqual(compare240.compare(actual, expected,
+                                            tolerance=0.001)["verdict"],
+                         "pass")
+        # words are still compared exactly
+        self.assertEqual(compare240.compare("area 3.1416", "Area 3.1416",
+                                            tolerance=0.001)["verdict"],
+                         "fail")
+
+    def test_max_edits_cutoff(self):
+        actual = "\n".join(["same"] + ["a" + str(i) for i in range(50)] +
+                           ["end"])
+        expected = "\n".join(["same"] + ["b" + str(i) for i in range(50)] +
+                             ["end"])
+        result = compare240.compare(actual, expected, max_edits=10)
+        self.assertEqual(result["verdict"], "partial")
+        self.assertEqual(result["matched"], 2)
+        self.assertEqual(result["diff"],
+                         ["Outputs differ by more than 10 lines; first "
+                          "difference at line 2:", "-a0", "+b0"])
+
+    def test_diff_truncated(self):
+        actual = "\n".join("a" + str(i) for i in range(50))
+        expected = "\n".join("b" + str(i) for i in range(50))
+        result = compare240.compare(actual, expected, max_diff_lines=20)
+        self.assertEqual(result["verdict"], "fail")
+        self.assertEqual(len(result["diff"]), 20)
+        self.assertTrue(result["diff_truncated"])
+
+
+if __name__ == '__main__':
+    unittest.main()
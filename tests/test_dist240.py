@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import dist240
+from config.settings240 import DIST_MAX_ATTEMPTS
+from dist240 import ShardQueue
+
+
+def claim_all(queue_dir, worker, claimed):
+    """
+    Claims and completes shards until none are left, reporting their ids.
+    """
+    queue = ShardQueue(queue_dir)
+    while True:
+        item = queue.claim(worker, 60.0, DIST_MAX_ATTEMPTS)
+        if item is None:
+            break
+        queue.complete(item["id"], worker, item["students"])
+        claimed.put(item["id"])
+
+
+class ShardQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.queue_dir = os.path.join(self.tmp, dist240.QUEUE_DIR_NAME)
+        self.queue = ShardQueue(self.queue_dir)
+        self.queue.create({"hw": "hw1"},
+                          dist240.shard(["alice", "bob", "carol"], 2))
+        self.now = 1000.0
+        patch = mock.patch.object(dist240.time, "time", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def claim(self, worker="w1"):
+        return self.queue.claim(worker, 10.0, DIST_MAX_ATTEMPTS)
+
+    def test_shard(self):
+        self.assertEqual(dist240.shard(list("abcde"), 2),
+                         [["a", "b"], ["c", "d"], ["e"]])
+        self.assertEqual(dist240.shard(list("ab"), 0), [["a"], ["b"]])
+
+    def test_claims_shards_in_order(self):
+        self.assertEqual(self.queue.job(), {"hw": "hw1"})
+        first = self.claim()
+        self.assertEqual((first["id"], first["students"], first["attempts"]),
+                         ("00000", ["alice", "bob"], 1))
+        self.assertEqual(self.claim("w2")["students"], ["carol"])
+        # both shards are leased
+        self.assertIsNone(self.claim("w3"))
+
+    def test_expired_lease_is_claimed_again(self):
+        self.claim("w1")
+        self.claim("w1")
+        self.now += 5
+        self.assertTrue(self.queue.renew("00000", "w1", 10.0))
+        self.now += 6
+        # 00001's lease ran out, 00000's was renewed
+        item = self.claim("w2")
+        self.assertEqual((item["id"], item["attempts"]), ("00001", 2))
+        self.assertIsNone(self.claim("w3"))
+        # w1 lost the lease
+        self.assertFalse(self.queue.renew("00001", "w1", 10.0))
+
+    def test_max_attempts(self):
+        self.queue.complete("00001", "w1", [])
+        for _ in range(DIST_MAX_ATTEMPTS):
+            self.now += 11
+            self.assertEqual(self.claim()["id"], "00000")
+        # the last attempt is still running
+        self.assertEqual(self.queue.stuck(DIST_MAX_ATTEMPTS), [])
+        self.now += 11
+        self.assertIsNone(self.claim())
+        self.assertEqual([item["id"] for item in
+                          self.queue.stuck(DIST_MAX_ATTEMPTS)], ["00000"])
+        self.queue.remove("00000")
+        self.assertEqual(self.queue.items(), [])
+
+    def test_complete_keeps_first_results(self):
+        first = self.claim("w1")
+        self.now += 11
+        self.assertEqual(self.claim("w2")["id"], first["id"])
+        self.queue.complete(first["id"], "w2", ["from w2"])
+        # the worker whose lease expired finishes late
+        self.queue.complete(first["id"], "w1", ["from w1"])
+        seen = set()
+        done = self.queue.collect(seen)
+        self.assertEqual([(d["id"], d["worker"], d["results"]) for d in done],
+                         [("00000", "w2", ["from w2"])])
+        self.assertEqual(self.queue.collect(seen), [])
+        self.assertEqual([item["id"] for item in self.queue.items()],
+                         ["00001"])
+
+    def test_finished(self):
+        self.assertFalse(self.queue.finished())
+        self.queue.finish()
+        self.assertTrue(self.queue.finished())
+
+
+class ConcurrentClaimTest(unittest.TestCase):
+    """
+    Workers in separate processes never claim the same shard.
+    """
+
+    def test_each_shard_claimed_once(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        queue_dir = os.path.join(tmp, dist240.QUEUE_DIR_NAME)
+        ShardQueue(queue_dir).create({}, [[i] for i in range(40)])
+        claimed = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=claim_all,
+                                           args=(queue_dir, "w" + str(i),
+                                                 claimed))
+                   for i in range(4)]
+        for worker in workers:
+            worker.start()
+        ids = [claimed.get(timeout=30) for _ in range(40)]
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(ids), [str(i).rjust(5, '0')
+                                       for i in range(40)])
+        self.assertEqual(len(ShardQueue(queue_dir).collect(set())), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
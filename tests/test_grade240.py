@@ -0,0 +1,147 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import grade240
+import process240
+
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "fixtures", "multifile")
+
+
+class MultiFileCompileTest(unittest.TestCase):
+    """
+    Building a submission whose sources share a header, the way its
+    required files list them (header first).
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.exec_path = os.path.join(self.tmp, "main")
+        self.sources = [os.path.join(FIXTURE, name)
+                        for name in ("shapes.h", "shapes.c", "main.c")]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assert_runs(self, result):
+        self.assertTrue(result[0], result[1])
+        self.assertEqual(process240.run(self.exec_path), "42\n")
+
+    def test_compile_separately(self):
+        self.assert_runs(grade240.compile(self.sources, self.exec_path,
+                                          "-I" + FIXTURE, jobs=2))
+        # only the two translation units get object files
+        self.assertEqual(sorted(name for name in os.listdir(self.tmp)
+                                if name.endswith(".o")),
+                         ["1_shapes.c.o", "2_main.c.o"])
+
+    def test_compile_with_prebuilt_object(self):
+        object_path = grade240.shared_object(self.sources[1], "",
+                                             os.path.join(self.tmp, "objects"))
+        self.assertIsNotNone(object_path)
+        self.assert_runs(grade240.compile(
+            [self.sources[0], self.sources[2]], self.exec_path,
+            "-I" + FIXTURE, objects=[(self.sources[1], object_path)]))
+
+    def test_make_builds_outside_submission(self):
+        before = sorted(os.listdir(FIXTURE))
+        self.assert_runs(grade240.make(FIXTURE, before, self.exec_path))
+        self.assertEqual(sorted(os.listdir(FIXTURE)), before)
+
+    def test_make_failure(self):
+        files = ["shapes.h", "main.c", "Makefile"]
+        result = grade240.make(FIXTURE, files, self.exec_path)
+        self.assertFalse(result[0])
+        self.assertIn("COMPILATION FAILURE (main)", result[1])
+
+
+def make_bundle(tmp, cases):
+    """
+    Builds the part of an assignment bundle run_tests uses, for (name,
+    input, expected output) cases.
+    """
+    tests = []
+    for name, text, expected in cases:
+        input_path = os.path.join(tmp, name + ".in")
+        with open(input_path, 'w') as f:
+            f.write(text)
+        tests.append({"name": name, "input": input_path,
+                      "input_sha256": text, "expected": expected,
+                      "sha256": expected, "deterministic": True})
+    return {"tests": tests}
+
+
+class RunTestsTest(unittest.TestCase):
+    """
+    A student's tests run concurrently, and their results are reported in
+    test order whichever finishes first.
+    """
+
+    CASES = [("t1", "0.4 one\n", "one\n"),
+             ("t2", "0.1 two\n", "2\n"),
+             ("t3", "0.2 three\n", "three\n")]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.executable = os.path.join(self.tmp, "main")
+        with open(self.executable, 'w') as f:
+            f.write("#!/bin/sh\nread delay word\nsleep $delay\necho $word\n")
+        os.chmod(self.executable, 0o755)
+        self.bundle = make_bundle(self.tmp, self.CASES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assert_report(self, verdicts, report):
+        self.assertEqual([(v["test"], v["verdict"]) for v in verdicts],
+                         [("t1", "pass"), ("t2", "fail"), ("t3", "pass")])
+        self.assertLess(report.index("one"), report.index("two"))
+        self.assertLess(report.index("two"), report.index("three"))
+
+    def test_jobs_run_concurrently(self):
+        output = io.StringIO()
+        start = time.monotonic()
+        verdicts = grade240.run_tests("hw1", self.executable, output, jobs=3,
+                                      bundle=self.bundle)
+        # run one at a time the tests take 0.7s
+        self.assertLess(time.monotonic() - start, 0.65)
+        self.assert_report(verdicts, output.getvalue())
+
+    def test_async_matches(self):
+        sync_output = io.StringIO()
+        grade240.run_tests("hw1", self.executable, sync_output,
+                           bundle=self.bundle)
+        output = io.StringIO()
+        loop = asyncio.new_event_loop()
+        try:
+            verdicts = loop.run_until_complete(grade240.run_tests_async(
+                "hw1", self.executable, output, jobs=3, bundle=self.bundle,
+                semaphore=asyncio.Semaphore(2)))
+        finally:
+            loop.close()
+        self.assert_report(verdicts, output.getvalue())
+        self.assertEqual(output.getvalue(), sync_output.getvalue())
+
+
+class LatestResultsTest(unittest.TestCase):
+    """
+    A student regraded by --watch is counted once, with their last result.
+    """
+
+    def test_last_result_wins(self):
+        results = [{"student": "alice", "failure": "Compilation failure"},
+                   {"student": "bob", "failure": None},
+                   {"student": "alice", "failure": None}]
+        latest = grade240.latest_results(results)
+        self.assertEqual([r["student"] for r in latest], ["alice", "bob"])
+        self.assertIsNone(latest[0]["failure"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gradebook240
+from gradebook240 import GradebookError, open_gradebook
+
+
+STUDENTS = [{"unixName": "alice", "lastName": "Smith", "withdrawn": 0,
+             "hw01": 10, "ex01": 85.5},
+            {"unixName": "bob", "lastName": "Jones", "withdrawn": 1,
+             "hw01": 0, "ex01": None},
+            {"unixName": "carol", "lastName": "Brown", "withdrawn": 0,
+             "hw01": 7, "ex01": 91}]
+
+
+class GradebookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp, "gradebook.json")
+        self.write_json(STUDENTS)
+        self.gradebook = open_gradebook(self.json_path)
+
+    def tearDown(self):
+        self.gradebook.close()
+        shutil.rmtree(self.tmp)
+
+    def write_json(self, students):
+        with open(self.json_path, 'w') as f:
+            json.dump(students, f)
+
+    def edit_json(self, students):
+        """
+        Rewrites the json file with a modification time the store cannot
+        have seen.
+        """
+        self.write_json(students)
+        mtime = os.path.getmtime(self.json_path) + 10
+        os.utime(self.json_path, (mtime, mtime))
+
+    def reopen(self):
+        self.gradebook.close()
+        self.gradebook = open_gradebook(self.json_path)
+
+    def test_students_in_gradebook_order(self):
+        self.assertEqual(list(self.gradebook.students()), STUDENTS)
+        self.assertEqual([s["unixName"] for s in
+                          self.gradebook.students(withdrawn=0)],
+                         ["alice", "carol"])
+        self.assertEqual(self.gradebook.active_students(), ["alice", "carol"])
+        self.assertEqual(self.gradebook.get_student("bob"), STUDENTS[1])
+        self.assertIsNone(self.gradebook.get_student("dave"))
+
+    def test_set_field(self):
+        self.gradebook.set_field("alice", "hw01", 9)
+        self.gradebook.set_field("alice", "hw02", 8)
+        self.gradebook.set_field("carol", "withdrawn", 1)
+        alice = self.gradebook.get_student("alice")
+        self.assertEqual(alice["hw01"], 9)
+        # a new field goes after the existing ones
+        self.assertEqual(list(alice)[-1], "hw02")
+        self.assertEqual(self.gradebook.active_students(), ["alice"])
+        with self.assertRaises(KeyError):
+            self.gradebook.set_field("dave", "hw01", 1)
+
+    def test_edited_json_is_reimported(self):
+        edited = [dict(STUDENTS[0], hw01=5)]
+        self.edit_json(edited)
+        self.reopen()
+        self.assertEqual(list(self.gradebook.students()), edited)
+
+    def test_refuses_to_reimport_over_unexported_changes(self):
+        self.gradebook.set_field("alice", "hw01", 9)
+        self.edit_json(STUDENTS[:1])
+        self.gradebook.close()
+        with self.assertRaises(GradebookError):
+            open_gradebook(self.json_path)
+        # importing on purpose discards the changes
+        self.gradebook = gradebook240.Gradebook(
+            gradebook240.db_path_for(self.json_path))
+        self.gradebook.import_json(self.json_path)
+        self.reopen()
+        self.assertEqual(list(self.gradebook.students()), STUDENTS[:1])
+
+    def test_export_round_trip(self):
+        self.gradebook.set_field("alice", "hw01", 9)
+        self.gradebook.export_json(self.json_path)
+        with open(self.json_path, 'r') as f:
+            exported = json.load(f)
+        self.assertEqual(exported[0]["hw01"], 9)
+        self.assertEqual(exported[1:], STUDENTS[1:])
+        # the store and the json file are in sync again, so an edit of
+        # the json file is imported
+        self.reopen()
+        self.assertEqual(list(self.gradebook.students()), exported)
+        self.edit_json(STUDENTS)
+        self.reopen()
+        self.assertEqual(list(self.gradebook.students()), STUDENTS)
+
+    def test_missing_json(self):
+        with self.assertRaises(GradebookError):
+            open_gradebook(os.path.join(self.tmp, "missing.json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import manifest240
+
+
+class ManifestTest(unittest.TestCase):
+    """
+    A student is only skipped when they were graded against the same
+    submission and support files.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.hw_dir = os.path.join(self.tmp, "hw1")
+        os.makedirs(self.hw_dir)
+        self.write("main.c", "int main(void) { return 0; }\n")
+        self.support = manifest240.support_fingerprint([self.hw_dir], {})
+        self.manifest = {"support": self.support,
+                         "students": {"alice": {"files": self.files()}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        with open(os.path.join(self.hw_dir, name), 'w') as f:
+            f.write(text)
+
+    def files(self, previous=None):
+        return manifest240.file_set(self.hw_dir, previous)
+
+    def test_unchanged_is_current(self):
+        self.assertTrue(manifest240.is_current(self.manifest, "alice",
+                                               self.files(), self.support))
+
+    def test_new_student_is_not_current(self):
+        self.assertFalse(manifest240.is_current(self.manifest, "bob",
+                                                self.files(), self.support))
+
+    def test_changed_file_is_not_current(self):
+        self.write("main.c", "int main(void) { return 1; }\n")
+        self.assertFalse(manifest240.is_current(self.manifest, "alice",
+                                                self.files(), self.support))
+
+    def test_added_file_is_not_current(self):
+        self.write("notes.txt", "notes\n")
+        self.assertFalse(manifest240.is_current(self.manifest, "alice",
+                                                self.files(), self.support))
+
+    def test_support_change_is_not_current(self):
+        support = manifest240.support_fingerprint([self.hw_dir],
+                                                  {"diff": True})
+        self.assertFalse(manifest240.is_current(self.manifest, "alice",
+                                                self.files(), support))
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        previous = self.files()
+        with mock.patch.object(manifest240, "hash_file") as hash_file:
+            self.assertEqual(self.files(previous), previous)
+        hash_file.assert_not_called()
+
+    def test_round_trip(self):
+        manifest240.save_manifest(self.manifest, self.tmp)
+        self.assertEqual(manifest240.load_manifest(self.tmp), self.manifest)
+
+    def test_missing_manifest_is_empty(self):
+        self.assertEqual(manifest240.load_manifest(self.hw_dir),
+                         {"support": None, "students": {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import grade240
+import memo240
+from memo240 import RunMemo
+
+
+SETTINGS = {"max_bytes": 1000, "limits": None, "modes": []}
+
+
+def memo_test(name="t1", text="in\n", expected="out\n"):
+    """
+    The parts of a bundle test dict the memo key uses.
+    """
+    return {"name": name, "input_sha256": "sha-" + text,
+            "sha256": "sha-" + expected}
+
+
+def metrics(signal=None):
+    return {"wall": 0.01, "cpu": 0.0, "max_rss_kb": None,
+            "exit_code": 0 if signal is None else None, "signal": signal}
+
+
+class RunMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.memo = RunMemo(os.path.join(self.tmp, "memo"), 1000)
+
+    def store(self, key, output="out\n"):
+        self.memo.store(key, output, "ok", metrics(), {"verdict": "pass"})
+
+    def test_key(self):
+        key = self.memo.key("exe", memo_test(), SETTINGS)
+        self.assertEqual(self.memo.key("exe", memo_test(),
+                                       dict(reversed(list(SETTINGS.items())))),
+                         key)
+        self.assertEqual(len({key,
+                              self.memo.key("exe2", memo_test(), SETTINGS),
+                              self.memo.key("exe", memo_test(text="x"),
+                                            SETTINGS),
+                              self.memo.key("exe", memo_test(expected="x"),
+                                            SETTINGS),
+                              self.memo.key("exe", memo_test(),
+                                            dict(SETTINGS, max_bytes=10))}),
+                         5)
+        # the test's name is not part of the key
+        self.assertEqual(self.memo.key("exe", memo_test(name="t2"), SETTINGS),
+                         key)
+
+    def test_lookup_and_store(self):
+        self.assertIsNone(self.memo.lookup("k"))
+        self.store("k")
+        # an existing entry is kept
+        self.store("k", "other\n")
+        self.assertEqual(self.memo.lookup("k"),
+                         {"output": "out\n", "status": "ok",
+                          "metrics": metrics(),
+                          "comparison": {"verdict": "pass"}})
+        self.assertEqual((self.memo.hits, self.memo.misses), (1, 1))
+
+    def test_unreadable_entry_is_a_miss(self):
+        with open(os.path.join(self.memo.memo_dir, "k.json"), 'w') as f:
+            f.write('{"output": ')
+        self.assertIsNone(self.memo.lookup("k"))
+
+    def test_evict_least_recently_used(self):
+        for i, key in enumerate(("a", "b", "c")):
+            self.store(key, "x" * 300)
+            entry_path = os.path.join(self.memo.memo_dir, key + ".json")
+            os.utime(entry_path, (1000 + i, 1000 + i))
+        # using an entry makes it the most recent
+        self.memo.lookup("a")
+        self.assertEqual(self.memo.evict(), 1)
+        self.assertEqual(sorted(os.listdir(self.memo.memo_dir)),
+                         ["a.json", "c.json"])
+
+
+class MemoRunTestsTest(unittest.TestCase):
+    """
+    run_tests reuses memoized runs of deterministic tests only.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.memo = RunMemo(os.path.join(self.tmp, "memo"), 1 << 20)
+        self.count_path = os.path.join(self.tmp, "runs")
+        self.executable = os.path.join(self.tmp, "main")
+        with open(self.executable, 'w') as f:
+            f.write("#!/bin/sh\necho run >> " + self.count_path +
+                    "\nread word\necho $word\n")
+        os.chmod(self.executable, 0o755)
+        tests = []
+        for name, deterministic in (("t1", True), ("t2", False)):
+            input_path = os.path.join(self.tmp, name + ".in")
+            with open(input_path, 'w') as f:
+                f.write(name + "\n")
+            tests.append(dict(memo_test(name, name + "\n", name + "\n"),
+                              input=input_path, expected=name + "\n",
+                              deterministic=deterministic))
+        self.bundle = {"tests": tests}
+
+    def run_tests(self):
+        return grade240.run_tests("hw1", self.executable, io.StringIO(),
+                                  bundle=self.bundle, memo=self.memo)
+
+    def runs(self):
+        with open(self.count_path, 'r') as f:
+            return len(f.readlines())
+
+    def test_deterministic_tests_are_memoized(self):
+        first = self.run_tests()
+        self.assertEqual([v["memo"] for v in first], ["miss", None])
+        self.assertEqual(self.runs(), 2)
+        second = self.run_tests()
+        # only the nondeterministic test is run again
+        self.assertEqual(self.runs(), 3)
+        self.assertEqual([v["memo"] for v in second], ["hit", None])
+        self.assertEqual([v["verdict"] for v in second], ["pass", "pass"])
+        self.assertTrue(second[0]["metrics"]["memoized"])
+        self.assertNotIn("memoized", second[1]["metrics"])
+        self.assertTrue(grade240.format_metrics(second[0]["metrics"]).endswith(
+            " (memoized from an earlier run)\n"))
+
+    def check_not_memoized(self, status, signal):
+        run = ("", status, metrics(signal))
+        with mock.patch.object(grade240, "run_stream", return_value=run):
+            self.run_tests()
+        self.assertEqual(os.listdir(self.memo.memo_dir), [])
+        self.assertEqual([v["memo"] for v in self.run_tests()], ["miss", None])
+
+    def test_timeout_is_not_memoized(self):
+        self.check_not_memoized("timeout", "SIGKILL")
+
+    def test_cpu_limit_is_not_memoized(self):
+        self.check_not_memoized("ok", "SIGXCPU")
+
+    def test_kill_by_hard_limit_is_not_memoized(self):
+        self.check_not_memoized("ok", "SIGKILL")
+
+    def test_executable_hash(self):
+        other = os.path.join(self.tmp, "copy")
+        shutil.copy(self.executable, other)
+        self.assertEqual(memo240.executable_hash(other),
+                         memo240.executable_hash(self.executable))
+
+
+if __name__ == '__main__':
+    unittest.main()
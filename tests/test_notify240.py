@@ -0,0 +1,138 @@
+import email
+import email.policy
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import bench240
+import notify240
+import pack240
+
+
+def message(student):
+    return io.BytesIO(("To: " + student + "@cs.umb.edu\r\n" +
+                       "Subject: hw1 Grade\r\n\r\n" +
+                       "report for " + student + "\r\n").encode('utf-8'))
+
+
+class DroppedSessionTest(unittest.TestCase):
+    """
+    Delivery through the stub SMTP server when it drops the session in the
+    middle of a batch: every message must arrive exactly once.
+    """
+
+    def setUp(self):
+        self.students = ["s" + str(i).rjust(2, '0') for i in range(12)]
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def start_server(self, hang_up_at):
+        server = bench240.StubSMTPServer(hang_up_at=hang_up_at)
+        port = server.start()
+        self.addCleanup(server.stop)
+        return (server, port)
+
+    def test_session_reconnects(self):
+        server, port = self.start_server([3, 9])
+        session = notify240.SMTPSession("localhost", port, "u", "p", tls=False)
+        try:
+            for student in self.students:
+                session.send("grader@localhost", student + "@cs.umb.edu",
+                             message(student))
+        finally:
+            session.close()
+        self.assertEqual(server.recipients,
+                         [s + "@cs.umb.edu" for s in self.students])
+        self.assertEqual(session.connections, 3)
+
+    def test_send_queue_delivers_once(self):
+        server, port = self.start_server([2, 5, 9])
+        ledger = notify240.DeliveryLedger(os.path.join(self.tmp, "ledger"))
+        jobs = [(s, s + "@cs.umb.edu", "hash-" + s) for s in self.students]
+
+        def new_session():
+            return notify240.SMTPSession("localhost", port, "u", "p",
+                                         tls=False)
+
+        with mock.patch.object(notify240, "new_session", new_session):
+            failures, sessions = notify240.send_queue(jobs, message, ledger,
+                                                      workers=3, rate=0,
+                                                      retries=2, backoff=0.0)
+        self.assertEqual(failures, [])
+        self.assertEqual(sorted(server.recipients),
+                         [s + "@cs.umb.edu" for s in self.students])
+        for s in self.students:
+            self.assertTrue(ledger.delivered(s, "hash-" + s))
+        self.assertEqual(server.mail_commands, len(self.students) + 3)
+        self.assertEqual(sum(session.connections for session in sessions),
+                         server.logins)
+
+
+class BuildMessageTest(unittest.TestCase):
+    """
+    Grade emails written by build_message must decode to the header, the
+    report as it is on disk and the footer.
+    """
+
+    REPORT = ("COMPILATION SUCCESSFUL (main)\n"
+              ".a line the server would take for the end of the message\n"
+              "trailing spaces   \n" + "x" * 300 + "\n"
+              "caf\u00e9 = 1\tand a tab\t\n"
+              "no newline at the end")
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.results_dir = os.path.join(self.tmp, "hw1_results")
+        os.makedirs(self.results_dir)
+        patch = mock.patch.object(notify240, "RESULTS_PATH_PREFIX", self.tmp)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assert_message(self, message):
+        with message:
+            data = message.read()
+        # every line ends in CRLF and is short enough for any server
+        lines = data.split(b"\r\n")
+        self.assertNotIn(b"\n", b"".join(lines))
+        self.assertNotIn(b"\r", b"".join(lines))
+        self.assertLessEqual(max(len(line) for line in lines), 78)
+        parsed = email.message_from_bytes(data, policy=email.policy.SMTP)
+        self.assertEqual(parsed["To"], "alice@cs.umb.edu")
+        _, _, header, footer = notify240.message_text("alice", "hw1")
+        self.assertEqual(parsed.get_content().replace("\r\n", "\n"),
+                         header + self.REPORT + "\n" + footer)
+
+    def test_report_file(self):
+        with open(os.path.join(self.results_dir, "alice"), 'w') as f:
+            f.write(self.REPORT)
+        self.assert_message(notify240.build_message("alice", "hw1"))
+
+    def test_packed_report(self):
+        with pack240.PackWriter(self.results_dir) as writer:
+            writer.add("bob", "another report\n")
+            writer.add("alice", self.REPORT)
+        with pack240.PackReader(self.results_dir) as pack:
+            self.assert_message(notify240.build_message("alice", "hw1", pack))
+
+    def test_test_mode_prints_decoded_report(self):
+        with open(os.path.join(self.results_dir, "alice"), 'w') as f:
+            f.write(self.REPORT)
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out), \
+                notify240.build_message("alice", "hw1") as message:
+            notify240.print_message(message)
+        _, subject, header, footer = notify240.message_text("alice", "hw1")
+        self.assertIn("Subject: " + subject + "\n", out.getvalue())
+        self.assertIn(header + self.REPORT + "\n" + footer, out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pack240
+from pack240 import PackReader, PackWriter
+
+
+class PackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def reports(self):
+        with PackReader(self.tmp) as reader:
+            return {name: reader.get(name) for name in reader.names()}
+
+    def pack_size(self):
+        return os.path.getsize(os.path.join(self.tmp, pack240.PACK_NAME))
+
+    def test_add_replace_remove(self):
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "first report\n")
+            writer.add("bob", "café\n")
+            writer.add("carol", "to be removed\n")
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "second report\n")
+            writer.remove("carol")
+        self.assertEqual(self.reports(), {"alice": "second report\n",
+                                          "bob": "café\n"})
+        with PackReader(self.tmp) as reader:
+            self.assertEqual(reader.size("bob"), len("café\n".encode()))
+            with reader.open("alice") as f:
+                self.assertEqual(f.read(), b"second report\n")
+            self.assertIsNone(reader.get("carol"))
+            self.assertNotIn("carol", reader)
+
+    def test_reload_after_interrupted_index_line(self):
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "alice's report\n")
+        # a run that stopped while writing the next index entry
+        with open(os.path.join(self.tmp, pack240.INDEX_NAME), 'a') as f:
+            f.write('{"length": 10, "na')
+        self.assertEqual(self.reports(), {"alice": "alice's report\n"})
+        with PackWriter(self.tmp) as writer:
+            writer.add("bob", "bob's report\n")
+        # the cut off line does not take the next entry with it
+        self.assertEqual(self.reports(), {"alice": "alice's report\n",
+                                          "bob": "bob's report\n"})
+
+    def test_compact(self):
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "a" * 100)
+            writer.add("bob", "b" * 100)
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "A" * 100)
+        # a third of the pack is dead: below the default ratio
+        self.assertEqual(pack240.dead_bytes(self.tmp), 100)
+        self.assertEqual(pack240.compact(self.tmp), 0)
+        with PackWriter(self.tmp) as writer:
+            writer.remove("bob")
+        self.assertEqual(pack240.compact(self.tmp), 200)
+        self.assertEqual(self.pack_size(), 100)
+        self.assertEqual(self.reports(), {"alice": "A" * 100})
+        with open(os.path.join(self.tmp, pack240.INDEX_NAME), 'r') as f:
+            self.assertEqual(len(f.readlines()), 1)
+        # the pack keeps working after compaction
+        with PackWriter(self.tmp) as writer:
+            writer.add("bob", "new\n")
+        self.assertEqual(self.reports(), {"alice": "A" * 100, "bob": "new\n"})
+
+    def test_interrupted_compaction(self):
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "old\n")
+            writer.add("alice", "new\n")
+        pack_tmp = os.path.join(self.tmp, pack240.PACK_NAME + ".tmp")
+        compacted = os.path.join(self.tmp, pack240.COMPACT_NAME)
+        # stopped before the new index was complete: the old pack is used
+        with open(pack_tmp, 'wb') as f:
+            f.write(b"partial")
+        self.assertEqual(self.reports(), {"alice": "new\n"})
+        # stopped after it: the compaction is finished on the next read
+        with open(pack_tmp, 'wb') as f:
+            f.write(b"new\n")
+        with open(compacted, 'w') as f:
+            f.write('{"length": 4, "name": "alice", "offset": 0}\n')
+        self.assertEqual(self.reports(), {"alice": "new\n"})
+        self.assertEqual(self.pack_size(), 4)
+        self.assertFalse(os.path.exists(compacted))
+        self.assertFalse(os.path.exists(pack_tmp))
+
+    def test_export(self):
+        with PackWriter(self.tmp) as writer:
+            writer.add("alice", "alice's report\n")
+        out_dir = os.path.join(self.tmp, "export")
+        self.assertEqual(pack240.export_pack(self.tmp, out_dir), 1)
+        with open(os.path.join(out_dir, "alice"), 'r') as f:
+            self.assertEqual(f.read(), "alice's report\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
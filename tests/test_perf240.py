@@ -0,0 +1,123 @@
+import io
+import math
+import unittest
+from unittest import mock
+
+import perf240
+from config.settings240 import PERF_MIN_SECONDS, PERF_THRESHOLDS
+
+
+def timing(median, spread=0.0, runs=5):
+    return {"runs": runs, "median": median, "spread": spread,
+            "min": median - spread, "max": median + spread}
+
+
+BUNDLE = {"tests": [{"name": name, "input": name + ".in"}
+                    for name in ("t1", "t2", "t3")],
+          "performance": ["t1", "t3"],
+          "reference_times": {"t1": timing(1.0), "t3": timing(0.5)}}
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def test_median_and_spread(self):
+        summary = perf240.summarize([1.0, 1.2, 0.9, 5.0, 1.1])
+        # the median and its absolute deviation ignore the outlier
+        self.assertEqual(summary, {"runs": 5, "median": 1.1, "spread": 0.1,
+                                   "min": 0.9, "max": 5.0})
+
+    def test_even_number_of_runs(self):
+        summary = perf240.summarize([1.0, 2.0, 3.0, 4.0])
+        self.assertEqual((summary["median"], summary["spread"]), (2.5, 1.0))
+
+
+class RatingTest(unittest.TestCase):
+
+    def test_slowdown(self):
+        self.assertEqual(perf240.slowdown(timing(2.0), timing(0.5)), 4.0)
+        # very fast runs count as PERF_MIN_SECONDS
+        self.assertEqual(perf240.slowdown(timing(0.0), timing(0.0)), 1.0)
+        self.assertEqual(perf240.slowdown(timing(PERF_MIN_SECONDS * 3),
+                                          timing(0.0)), 3.0)
+
+    def test_rating_thresholds(self):
+        for limit, label in PERF_THRESHOLDS[:-1]:
+            # a slowdown at the limit gets the rating, just above it does not
+            self.assertEqual(perf240.rating(limit), label)
+            self.assertNotEqual(perf240.rating(limit + 0.01), label)
+        self.assertEqual(perf240.rating(1000.0), PERF_THRESHOLDS[-1][1])
+
+    def test_rate_geometric_mean(self):
+        performance = perf240.rate(BUNDLE, {"t1": timing(2.0),
+                                            "t3": timing(4.0)})
+        self.assertEqual([t["slowdown"] for t in performance["tests"]],
+                         [2.0, 8.0])
+        self.assertEqual(performance["slowdown"], 4.0)
+        self.assertEqual(performance["rating"], perf240.rating(4.0))
+        # a single bad test does not dominate the way an average would
+        performance = perf240.rate(BUNDLE, {"t1": timing(1.0),
+                                            "t3": timing(50.0)})
+        self.assertEqual(performance["slowdown"], round(math.sqrt(100.0), 3))
+
+    def test_untimed_test_is_not_rated(self):
+        performance = perf240.rate(BUNDLE, {"t1": timing(1.0), "t3": None})
+        self.assertIsNone(performance["tests"][1]["slowdown"])
+        self.assertIsNone(performance["slowdown"])
+        self.assertIsNone(performance["rating"])
+        output = io.StringIO()
+        perf240.write_performance(performance, output)
+        self.assertIn("not timed", output.getvalue())
+        self.assertIn("RATING: NOT RATED", output.getvalue())
+
+    def test_write_performance(self):
+        output = io.StringIO()
+        perf240.write_performance(perf240.rate(BUNDLE, {"t1": timing(1.0),
+                                                        "t3": timing(0.5)}),
+                                  output)
+        self.assertIn("median deviation of 5 runs", output.getvalue())
+        self.assertIn("RATING: " + perf240.rating(1.0) +
+                      " (1.00x the reference solution's time)",
+                      output.getvalue())
+
+
+class TimedTestsTest(unittest.TestCase):
+
+    def test_timed_tests(self):
+        self.assertEqual([t["name"] for t in perf240.timed_tests(BUNDLE)],
+                         ["t1", "t3"])
+        verdicts = [{"test": "t1", "verdict": "fail"},
+                    {"test": "t3", "verdict": "partial"}]
+        # only failed tests are left out
+        self.assertEqual([t["name"] for t in
+                          perf240.timed_tests(BUNDLE, verdicts)], ["t3"])
+
+    def test_finished(self):
+        self.assertTrue(perf240.finished("ok", {"signal": None}))
+        self.assertFalse(perf240.finished("timeout", {"signal": "SIGKILL"}))
+        self.assertFalse(perf240.finished("truncated", {"signal": None}))
+        self.assertFalse(perf240.finished("ok", {"signal": "SIGSEGV"}))
+
+    def test_time_runs(self):
+        runs = [("", "ok", {"cpu": cpu, "signal": None})
+                for cpu in (9.0, 1.0, 3.0, 2.0)]
+        with mock.patch.object(perf240, "run_stream",
+                               side_effect=runs) as run_stream:
+            summary = perf240.time_runs("main", BUNDLE["tests"][0], runs=3,
+                                        warmup=1)
+        # the warmup run is not timed
+        self.assertEqual(run_stream.call_count, 4)
+        self.assertEqual((summary["runs"], summary["median"], summary["max"]),
+                         (3, 2.0, 3.0))
+
+    def test_time_runs_stops_on_failed_run(self):
+        runs = [("", "ok", {"cpu": 1.0, "signal": None}),
+                ("", "timeout", {"cpu": 30.0, "signal": "SIGKILL"})]
+        with mock.patch.object(perf240, "run_stream",
+                               side_effect=runs) as run_stream:
+            self.assertIsNone(perf240.time_runs("main", BUNDLE["tests"][0],
+                                                runs=5, warmup=1))
+        self.assertEqual(run_stream.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
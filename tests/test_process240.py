@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import process240
+
+
+class RunStreamTest(unittest.TestCase):
+    """
+    run_stream keeps only as much output as the limits allow and stops the
+    programs that go past them.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def script(self, text):
+        path = os.path.join(self.tmp, "script.sh")
+        with open(path, 'w') as f:
+            f.write("#!/bin/sh\n" + text)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_output_and_stdin(self):
+        input_path = os.path.join(self.tmp, "input")
+        with open(input_path, 'w') as f:
+            f.write("one\r\ntwo\n")
+        result, status, metrics = process240.run_stream("cat",
+                                                        stdin=input_path)
+        self.assertEqual((result, status), ("one\ntwo\n", "ok"))
+        self.assertEqual(metrics["exit_code"], 0)
+        self.assertIsNone(metrics["signal"])
+
+    def test_byte_limit(self):
+        result, status, _ = process240.run_stream("cat /dev/zero",
+                                                  max_bytes=1000)
+        self.assertEqual(status, "truncated")
+        self.assertEqual(len(result), 1000)
+
+    def test_line_limit(self):
+        result, status, _ = process240.run_stream("yes", max_lines=5)
+        self.assertEqual(status, "truncated")
+        self.assertEqual(result, "y\n" * 5)
+
+    def test_timeout(self):
+        start = time.monotonic()
+        result, status, _ = process240.run_stream("sleep 30", timeout=0.3)
+        self.assertEqual(status, "timeout")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(process240.run("sleep 30", timeout=0.3),
+                         "__TIMEOUT__")
+
+    def test_exit_status(self):
+        _, _, metrics = process240.run_stream(self.script("exit 3\n"))
+        self.assertEqual(metrics["exit_code"], 3)
+        _, _, metrics = process240.run_stream(self.script("kill -9 $$\n"))
+        self.assertEqual(metrics["signal"], "SIGKILL")
+
+    def test_process_group_is_killed(self):
+        # the script's background child would outlive a kill of the script
+        script = self.script("sleep 30 &\necho $!\nsleep 30\n")
+        result, status, _ = process240.run_stream(script, timeout=0.5,
+                                                  limits={})
+        self.assertEqual(status, "timeout")
+        pid = int(result)
+        deadline = time.monotonic() + 5
+        while alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(alive(pid))
+
+
+def alive(pid):
+    """
+    Returns True if a process is still running (a zombie waiting for its
+    parent to reap it is not).
+    """
+    try:
+        with open("/proc/" + str(pid) + "/stat", 'r') as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import grade240
+import manifest240
+import scan240
+
+
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.write("alice/hw1/main.c", "int main() {}\n")
+        self.write("alice/hw1/src/util.c", "\n")
+        self.write("alice/hw2/main.c", "\n")
+        self.write("bob/hw1/main.c", "int x;\n")
+        os.makedirs(os.path.join(self.tmp, "carol"))
+
+    def write(self, rel, text, mtime=None):
+        file_path = os.path.join(self.tmp, rel)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(file_path, (mtime, mtime))
+
+    def scan(self, students=None, homeworks=None):
+        return scan240.scan_course(self.tmp, students, homeworks)
+
+    def test_scan_tree(self):
+        files = scan240.scan_tree(os.path.join(self.tmp, "alice", "hw1"))
+        self.assertEqual(sorted(files), ["main.c", os.path.join("src", "util.c")])
+        self.assertEqual(files["main.c"]["size"], 14)
+        # the same description file_set gives, without the hashes
+        hashed = manifest240.file_set(os.path.join(self.tmp, "alice", "hw1"))
+        self.assertEqual(manifest240.hash_files(
+            os.path.join(self.tmp, "alice", "hw1"), files), hashed)
+
+    def test_scan_course(self):
+        index = self.scan(homeworks=["hw1"])
+        self.assertEqual(sorted(index["students"]), ["alice", "bob", "carol"])
+        self.assertEqual(list(index["students"]["alice"]["homework"]), ["hw1"])
+        self.assertIsNone(scan240.homework_files(index["students"]["carol"],
+                                                 "hw1"))
+        index = self.scan(students=["alice", "dave"])
+        self.assertEqual(sorted(index["students"]["alice"]["homework"]),
+                         ["hw1", "hw2"])
+        self.assertIsNone(index["students"]["dave"])
+
+    def test_changed_students(self):
+        old = self.scan()
+        self.assertEqual(scan240.changed_students(None, old, "hw1"),
+                         ["alice", "bob", "carol"])
+        self.write("bob/hw1/main.c", "int y;\n", mtime=1000)
+        self.write("carol/hw1/main.c", "\n")
+        self.write("alice/hw2/main.c", "int z;\n")
+        self.assertEqual(scan240.changed_students(old, self.scan(), "hw1"),
+                         ["bob", "carol"])
+
+    def test_content_hashes_are_not_compared(self):
+        old = self.scan()
+        files = scan240.homework_files(old["students"]["alice"], "hw1")
+        hashed = manifest240.hash_files(os.path.join(self.tmp, "alice", "hw1"),
+                                        files)
+        self.assertTrue(scan240.same_files(hashed, files))
+        self.assertTrue(scan240.same_files(None, None))
+        self.assertFalse(scan240.same_files(files, None))
+
+    def test_merge_index_keeps_other_homeworks(self):
+        index = self.scan()
+        self.write("alice/hw1/new.c", "\n")
+        merged = scan240.merge_index(json.loads(json.dumps(index)),
+                                     self.scan(["alice", "dave"], ["hw1"]))
+        alice = merged["students"]["alice"]["homework"]
+        self.assertIn("new.c", alice["hw1"]["files"])
+        self.assertEqual(alice["hw2"], index["students"]["alice"]["homework"]
+                                       ["hw2"])
+        self.assertEqual(merged["students"]["bob"], index["students"]["bob"])
+        self.assertIsNone(merged["students"]["dave"])
+        self.assertIsNone(merged["homeworks"])
+        # a scan of every homework replaces the index
+        merged = scan240.merge_index(index, self.scan(["bob"]))
+        self.assertEqual(list(merged["students"]), ["bob"])
+
+    def test_save_and_load(self):
+        index_path = os.path.join(self.tmp, "index", "index.json")
+        self.assertIsNone(scan240.load_index(index_path))
+        index = self.scan()
+        scan240.save_index(index, index_path)
+        self.assertEqual(scan240.load_index(index_path), index)
+        # an index from an older version is ignored
+        scan240.save_index(dict(index, version=scan240.INDEX_VERSION - 1),
+                           index_path)
+        self.assertIsNone(scan240.load_index(index_path))
+
+
+class SubmissionFilesTest(unittest.TestCase):
+    """
+    grade240 takes content hashes from the previous index for unchanged
+    directories, and hashes only the changed files of the others.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name in ("main.c", "util.c"):
+            with open(os.path.join(self.makedir(), name), 'w') as f:
+                f.write(name + "\n")
+        patch = mock.patch.object(grade240, "COURSE_DIR", self.tmp)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.manifest = {"students": {}}
+
+    def makedir(self):
+        dir_path = os.path.join(self.tmp, "alice", "hw1")
+        os.makedirs(dir_path, exist_ok=True)
+        return dir_path
+
+    def submission_files(self, previous_index):
+        index = scan240.scan_course(self.tmp, ["alice"], ["hw1"])
+        changed = set(scan240.changed_students(previous_index, index, "hw1"))
+        with mock.patch.object(manifest240, "hash_file",
+                               wraps=manifest240.hash_file) as hash_file:
+            files = grade240.submission_files("alice", "hw1", index,
+                                              previous_index, changed,
+                                              self.manifest)
+        return index, files, hash_file.call_count
+
+    def test_hashes_reused(self):
+        index, files, hashed = self.submission_files(None)
+        self.assertEqual(hashed, 2)
+        self.assertEqual(files, manifest240.file_set(self.makedir()))
+        self.assertEqual(scan240.homework_files(index["students"]["alice"],
+                                                "hw1"), files)
+        # unchanged: nothing is hashed
+        index, files, hashed = self.submission_files(index)
+        self.assertEqual(hashed, 0)
+        self.assertTrue(manifest240.is_hashed(files))
+        # one file changed: only it is hashed
+        with open(os.path.join(self.makedir(), "util.c"), 'w') as f:
+            f.write("changed\n")
+        os.utime(os.path.join(self.makedir(), "util.c"), (1000, 1000))
+        _, files, hashed = self.submission_files(index)
+        self.assertEqual(hashed, 1)
+        self.assertEqual(files, manifest240.file_set(self.makedir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pack240
+import status240
+
+
+MAX_SCORES = {"unixName": "max_score", "hw01": 10, "hw02": 36, "hw03": 58,
+              "hw04": 40, "ex01": 100, "ex02": 100, "ex03": 100,
+              "qz01": 100, "qz02": 100, "qz03": 100, "withdrawn": 1}
+
+
+def random_students(count, seed=240):
+    rng = random.Random(seed)
+    students = []
+    for i in range(count):
+        student = {"unixName": "student" + str(i), "withdrawn": 0}
+        for key in status240.item_keys("hw", 4):
+            student[key] = rng.randint(0, MAX_SCORES[key])
+        for key in status240.item_keys("ex", 3) + status240.item_keys("qz", 3):
+            student[key] = rng.randint(0, 100)
+        students.append(student)
+    return students
+
+
+@unittest.skipIf(status240.load_numpy() is None, "numpy is not installed")
+class BatchGradesTest(unittest.TestCase):
+    """
+    The numpy batch computation must give exactly the reports and grades
+    of the one student at a time code.
+    """
+
+    def assert_same(self, students, hw):
+        grades = status240.batch_grades(students, hw, MAX_SCORES)
+        for i, student in enumerate(students):
+            raw_final, report = status240.student_status(student, hw,
+                                                         MAX_SCORES)
+            self.assertEqual(status240.render_status(student, hw, MAX_SCORES,
+                                                     grades, i), report)
+            self.assertEqual(int(grades["final"][i]), raw_final)
+
+    def test_random_class(self):
+        self.assert_same(random_students(300), 4)
+
+    def test_fewer_homeworks(self):
+        self.assert_same(random_students(20, seed=1), 2)
+
+    def test_rounding_halves(self):
+        # hw01 5 / 10 and averages of .5 round half to even in both
+        student = {"unixName": "halves", "withdrawn": 0, "hw01": 5,
+                   "hw02": 9, "hw03": 29, "hw04": 10, "ex01": 80,
+                   "ex02": 81, "ex03": 0, "qz01": 1, "qz02": 2, "qz03": 4}
+        self.assert_same([student], 4)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.student = random_students(1)[0]
+
+    def fingerprint(self, student=None, hw=4, max_scores=MAX_SCORES):
+        return status240.status_fingerprint(student or self.student, hw,
+                                            max_scores)
+
+    def test_report_inputs_change_fingerprint(self):
+        before = self.fingerprint()
+        self.assertEqual(self.fingerprint(dict(self.student)), before)
+        self.assertNotEqual(self.fingerprint(dict(self.student, qz02=-1)),
+                            before)
+        self.assertNotEqual(self.fingerprint(hw=3), before)
+        self.assertNotEqual(self.fingerprint(
+            max_scores=dict(MAX_SCORES, hw02=40)), before)
+
+    def test_other_fields_do_not_change_fingerprint(self):
+        self.assertEqual(self.fingerprint(dict(self.student, lastName="Doe")),
+                         self.fingerprint())
+        # only the homeworks being reported on count
+        self.assertEqual(self.fingerprint(dict(self.student, hw04=0), hw=3),
+                         self.fingerprint(hw=3))
+
+
+class IncrementalStatusTest(unittest.TestCase):
+    """
+    status240 only rewrites the reports whose inputs changed.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp)
+        self.json_path = os.path.join(self.tmp, "gradebook.json")
+        self.students = random_students(3)
+        self.edits = 0
+        self.write_gradebook()
+        for name, value in (("JSON_PATH", self.json_path),
+                            ("GRADE_DB_PATH",
+                             os.path.join(self.tmp, "gradebook.db"))):
+            patch = mock.patch.object(status240, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def write_gradebook(self):
+        with open(self.json_path, 'w') as f:
+            json.dump([MAX_SCORES] + self.students, f)
+        # a new modification time, so the store imports the edit
+        self.edits += 1
+        mtime = os.path.getmtime(self.json_path) + self.edits
+        os.utime(self.json_path, (mtime, mtime))
+
+    def run_status(self, *args):
+        out = io.StringIO()
+        with mock.patch("sys.argv", ["status240.py", "-a", "4"] + list(args)), \
+                mock.patch("sys.stdout", out):
+            status240.main()
+        results_dir = [name for name in os.listdir(self.tmp)
+                       if name.startswith("status")][0]
+        return out.getvalue().strip(), os.path.join(self.tmp, results_dir)
+
+    def test_only_changed_reports_are_rewritten(self):
+        output, results_dir = self.run_status()
+        self.assertEqual(output, "Rewrote 3 of 3 status reports.")
+        self.assertEqual(self.run_status()[0], "Rewrote 0 of 3 status reports.")
+
+        self.students[1]["ex02"] = 0
+        self.write_gradebook()
+        self.assertEqual(self.run_status()[0], "Rewrote 1 of 3 status reports.")
+        _, report = status240.student_status(self.students[1], 4, MAX_SCORES)
+        with open(os.path.join(results_dir, "student1"), 'r') as f:
+            self.assertEqual(f.read(), report)
+        self.assertEqual(self.run_status("-f")[0],
+                         "Rewrote 3 of 3 status reports.")
+
+    def test_switch_to_pack(self):
+        _, results_dir = self.run_status()
+        output, _ = self.run_status("-p")
+        self.assertEqual(output, "Rewrote 3 of 3 status reports.")
+        # the pack replaces the report files
+        self.assertFalse(os.path.exists(os.path.join(results_dir, "student0")))
+        with pack240.PackReader(results_dir) as pack:
+            self.assertEqual(pack.names(),
+                             ["student0", "student1", "student2"])
+        # and later runs keep using it
+        self.assertEqual(self.run_status()[0], "Rewrote 0 of 3 status reports.")
+
+
+if __name__ == '__main__':
+    unittest.main()
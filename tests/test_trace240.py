@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import trace240
+from trace240 import StageTimer
+
+
+def events():
+    """
+    Timing events for two students, as grade_student records them.
+    """
+    alice = StageTimer("alice")
+    alice.record("compile", 0.5)
+    alice.record("run", 0.25, "t1")
+    alice.record("compare", 0.25, "t1")
+    alice.record("run", 2.0, "t2")
+    alice.record("total", 3.0)
+    bob = StageTimer("bob")
+    bob.record("compile", 1.0)
+    bob.record("run", 0.5, "t1")
+    bob.record("total", 1.5)
+    return alice.events + bob.events
+
+
+class StageTimerTest(unittest.TestCase):
+
+    def test_stage_records_event(self):
+        timer = StageTimer("alice")
+        with timer.stage("run", "t1"):
+            pass
+        self.assertEqual(len(timer.events), 1)
+        event = timer.events[0]
+        self.assertEqual((event["student"], event["stage"], event["test"]),
+                         ("alice", "run", "t1"))
+        self.assertGreaterEqual(event["seconds"], 0)
+
+    def test_stage_records_on_error(self):
+        timer = StageTimer("alice")
+        with self.assertRaises(ValueError):
+            with timer.stage("compile"):
+                raise ValueError()
+        self.assertEqual([e["stage"] for e in timer.events], ["compile"])
+
+
+class SummaryTest(unittest.TestCase):
+
+    def summary(self, top=5):
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            trace240.print_timing_summary(events(), top)
+        return out.getvalue().splitlines()
+
+    def test_stage_totals_in_stage_order(self):
+        lines = self.summary()
+        stages = lines[lines.index("Time by stage (summed over students):") + 1:
+                       lines.index("Slowest students:")]
+        self.assertEqual([line.split()[0].strip('.') for line in stages],
+                         ["compile", "run", "compare"])
+        self.assertEqual([line.split()[-1] for line in stages],
+                         ["1.500s", "2.750s", "0.250s"])
+
+    def test_slowest_students_and_tests(self):
+        lines = self.summary(top=2)
+        students = lines[lines.index("Slowest students:") + 1:
+                         lines.index("Slowest tests:")]
+        self.assertEqual([line.split()[0].strip('.') for line in students],
+                         ["alice", "bob"])
+        tests = lines[lines.index("Slowest tests:") + 1:]
+        # a test's run and compare times are added up
+        self.assertEqual([" ".join(line.split()[:2]).strip('.')
+                          for line in tests], ["alice t2", "alice t1"])
+        self.assertEqual(tests[1].split()[-1], "0.500s")
+
+    def test_no_events(self):
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            trace240.print_timing_summary([])
+        self.assertEqual(out.getvalue(), "")
+
+    def test_write_trace(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        trace_path = os.path.join(tmp, trace240.TRACE_NAME)
+        trace240.write_trace(trace_path, events())
+        with open(trace_path, 'r') as f:
+            self.assertEqual([json.loads(line) for line in f], events())
+
+
+if __name__ == '__main__':
+    unittest.main()
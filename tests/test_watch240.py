@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import watch240
+from watch240 import Debouncer
+
+
+class DebouncerTest(unittest.TestCase):
+
+    def test_key_settles_after_last_change(self):
+        debouncer = Debouncer(2.0)
+        debouncer.touch(["alice"], now=10.0)
+        debouncer.touch(["alice"], now=11.5)
+        # a save 1.5s after the first restarts the wait
+        self.assertEqual(debouncer.settled(now=12.5), [])
+        self.assertEqual(debouncer.next_deadline(now=12.5), 1.0)
+        self.assertEqual(debouncer.settled(now=13.5), ["alice"])
+        # a settled key is handed out once
+        self.assertEqual(debouncer.settled(now=20.0), [])
+        self.assertIsNone(debouncer.next_deadline(now=20.0))
+
+    def test_keys_settle_independently(self):
+        debouncer = Debouncer(1.0)
+        debouncer.touch(["bob", "alice"], now=0.0)
+        debouncer.touch(["carol"], now=0.5)
+        self.assertEqual(debouncer.next_deadline(now=0.5), 0.5)
+        self.assertEqual(debouncer.settled(now=1.0), ["alice", "bob"])
+        self.assertEqual(debouncer.next_deadline(now=1.0), 0.5)
+        self.assertEqual(debouncer.settled(now=1.5), ["carol"])
+
+    def test_overdue_deadline_is_zero(self):
+        debouncer = Debouncer(1.0)
+        debouncer.touch(["alice"], now=0.0)
+        self.assertEqual(debouncer.next_deadline(now=5.0), 0.0)
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.paths = {}
+        for name in ("alice", "bob"):
+            self.paths[name] = os.path.join(self.tmp, name, "hw1")
+            os.makedirs(self.paths[name])
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def check_watcher(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.poll(0), set())
+        self.write(os.path.join(self.paths["alice"], "main.c"), "int x;\n")
+        self.assertEqual(watcher.poll(0.5), {"alice"})
+        # files in new subdirectories are seen too
+        os.mkdir(os.path.join(self.paths["bob"], "src"))
+        watcher.poll(0.5)
+        self.write(os.path.join(self.paths["bob"], "src", "main.c"), "\n")
+        self.assertEqual(watcher.poll(0.5), {"bob"})
+        # and so is the directory itself being replaced
+        shutil.rmtree(self.paths["alice"])
+        self.assertEqual(watcher.poll(0.5), {"alice"})
+        os.mkdir(self.paths["alice"])
+        watcher.poll(0.5)
+        self.write(os.path.join(self.paths["alice"], "main.c"), "\n")
+        self.assertEqual(watcher.poll(0.5), {"alice"})
+
+    def test_polling_watcher(self):
+        self.check_watcher(watch240.PollingWatcher(self.paths, interval=0))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "needs inotify")
+    def test_inotify_watcher(self):
+        self.check_watcher(watch240.InotifyWatcher(self.paths))
+
+    def test_dir_signature(self):
+        self.assertIsNone(watch240.dir_signature(
+            os.path.join(self.tmp, "missing")))
+        self.write(os.path.join(self.paths["alice"], "main.c"), "int x;\n")
+        signature = watch240.dir_signature(self.paths["alice"])
+        self.assertEqual([entry[:2] for entry in signature], [("main.c", 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
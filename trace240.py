@@ -0,0 +1,127 @@
+#! /usr/bin/env python3.5
+
+import json
+import time
+
+
+# CONSTANTS ####################################################################
+
+TRACE_NAME = ".trace.jsonl"
+
+# stages in the order they appear in a grading run
+STAGES = ["setup", "source", "compile", "run", "compare", "perf", "report"]
+
+
+# METHODS ######################################################################
+
+################################################################################
+# timing
+################################################################################
+
+class StageTimer:
+    """
+    Records how long each stage of grading one student takes. Events are
+    plain dicts so they can be returned from worker processes:
+        {"student": str, "stage": str, "test": str or None, "seconds": float}
+    """
+
+    def __init__(self, student):
+        self.student = student
+        self.events = []
+        self.start = time.perf_counter()
+
+    def record(self, stage, seconds, test=None):
+        """
+        Adds an event for a stage that was timed elsewhere.
+        """
+        self.events.append({"student": self.student,
+                            "stage": stage,
+                            "test": test,
+                            "seconds": round(seconds, 6)})
+
+    def stage(self, stage, test=None):
+        """
+        Returns a context manager that times the enclosed block as stage.
+        """
+        return _Span(self, stage, test)
+
+    def total(self):
+        """
+        Records and returns the total time since the timer was created.
+        """
+        seconds = time.perf_counter() - self.start
+        self.record("total", seconds)
+        return seconds
+
+class _Span:
+    def __init__(self, timer, stage, test):
+        self.timer = timer
+        self.name = stage
+        self.test = test
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start,
+                          self.test)
+        return False
+
+################################################################################
+# trace output
+################################################################################
+
+def write_trace(trace_path, events):
+    """
+    Writes timing events as json lines.
+    Args:
+        trace_path (str): The file to write.
+        events (obj): A list of event dicts.
+    """
+    with open(trace_path, 'w') as f:
+        f.write("".join(json.dumps(event, sort_keys=True) + "\n"
+                        for event in events))
+
+def print_timing_summary(events, top=5):
+    """
+    Prints total time per stage, and the slowest students and tests.
+    Args:
+        events (obj): A list of event dicts.
+        top (:int): How many of the slowest students and tests to list.
+    """
+    if not events:
+        return
+    stage_totals = {}
+    student_totals = {}
+    test_totals = {}
+    for event in events:
+        if event["stage"] == "total":
+            student_totals[event["student"]] = event["seconds"]
+            continue
+        stage_totals[event["stage"]] = (stage_totals.get(event["stage"], 0) +
+                                        event["seconds"])
+        if event["test"] is not None:
+            key = (event["student"], event["test"])
+            test_totals[key] = test_totals.get(key, 0) + event["seconds"]
+
+    print("\nTime by stage (summed over students):")
+    for stage in STAGES + sorted(set(stage_totals) - set(STAGES)):
+        if stage in stage_totals:
+            print("  " + stage.ljust(15, '.') + " " +
+                  "%8.3f" % stage_totals[stage] + "s")
+
+    print("Slowest students:")
+    for student in sorted(student_totals, key=student_totals.get,
+                          reverse=True)[:top]:
+        print("  " + student.ljust(15, '.') + " " +
+              "%8.3f" % student_totals[student] + "s")
+
+    if test_totals:
+        print("Slowest tests:")
+        for key in sorted(test_totals, key=test_totals.get,
+                          reverse=True)[:top]:
+            print("  " + (key[0] + " " + key[1]).ljust(30, '.') + " " +
+                  "%8.3f" % test_totals[key] + "s")
+
+# END METHODS ##################################################################
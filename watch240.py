@@ -0,0 +1,252 @@
+#! /usr/bin/env python3.5
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+
+# CONSTANTS ####################################################################
+
+# inotify event bits (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+              IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+              IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+# METHODS ######################################################################
+
+################################################################################
+# polling
+################################################################################
+
+def dir_signature(dir_path):
+    """
+    Describes a directory tree by the name, size and modification time of
+    every entry, using os.scandir so that each file costs one stat at most.
+    Args:
+        dir_path (str): The directory to describe.
+    Returns:
+        obj: A tuple of (relative path, size, mtime) tuples, or None if
+             dir_path is not a directory.
+    """
+    entries = []
+    pending = [""]
+    while pending:
+        rel = pending.pop()
+        try:
+            iterator = os.scandir(os.path.join(dir_path, rel))
+        except OSError:
+            if rel == "":
+                return None
+            continue
+        for entry in iterator:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            name = os.path.join(rel, entry.name)
+            entries.append((name, st.st_size, st.st_mtime))
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(name)
+    return tuple(sorted(entries))
+
+class PollingWatcher:
+    """
+    Finds changed directories by comparing dir_signature snapshots. Works on
+    any filesystem, including network mounts where inotify sees nothing.
+    """
+
+    def __init__(self, paths, interval=2.0):
+        """
+        Args:
+            paths (obj): A dict mapping keys (e.g. unix names) to directories.
+            interval (:float): Seconds between scans.
+        """
+        self.paths = paths
+        self.interval = interval
+        self.signatures = {key: dir_signature(dir_path)
+                           for key, dir_path in paths.items()}
+
+    def poll(self, timeout):
+        """
+        Waits up to timeout seconds and returns the keys whose directories
+        changed since the last call.
+        """
+        time.sleep(min(timeout, self.interval))
+        changed = set()
+        for key, dir_path in self.paths.items():
+            signature = dir_signature(dir_path)
+            if signature != self.signatures[key]:
+                self.signatures[key] = signature
+                changed.add(key)
+        return changed
+
+    def close(self):
+        pass
+
+################################################################################
+# inotify
+################################################################################
+
+class InotifyWatcher:
+    """
+    Finds changed directories with Linux inotify, through ctypes so no extra
+    packages are needed. Each directory is watched recursively, together
+    with its parent so that the directory being created, removed or
+    replaced is seen too. The parent directories (e.g. COURSE_DIR/<student>)
+    must exist when the watcher is created.
+    """
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.add_watch_fn = libc.inotify_add_watch
+        self.add_watch_fn.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                      ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = paths
+        # watch descriptor -> (key, directory, True for a parent directory)
+        self.watches = {}
+        try:
+            for key, dir_path in paths.items():
+                self.add_watch(key, os.path.dirname(dir_path), True)
+                self.add_tree(key, dir_path)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, key, dir_path, parent=False):
+        wd = self.add_watch_fn(self.fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                # removed before it could be watched
+                return
+            raise OSError(error, os.strerror(error) + ": " + dir_path)
+        self.watches[wd] = (key, dir_path, parent)
+
+    def add_tree(self, key, dir_path):
+        for root, dirs, files in os.walk(dir_path):
+            self.add_watch(key, root)
+
+    def poll(self, timeout):
+        """
+        Waits up to timeout seconds and returns the keys whose directories
+        changed since the last call.
+        """
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:
+                        offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+            if wd not in self.watches:
+                continue
+            key, dir_path, parent = self.watches[wd]
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            name = os.fsdecode(name)
+            if parent:
+                # only the watched directory itself matters in its parent
+                if name != os.path.basename(self.paths[key]):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(key, self.paths[key])
+            elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(key, os.path.join(dir_path, name))
+            changed.add(key)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def make_watcher(paths, interval=2.0):
+    """
+    Returns an InotifyWatcher for paths where inotify is available, otherwise
+    (or if the kernel's watch limit is reached) a PollingWatcher.
+    Args:
+        paths (obj): A dict mapping keys (e.g. unix names) to directories.
+        interval (:float): Seconds between scans when polling.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths, interval)
+
+################################################################################
+# debouncing
+################################################################################
+
+class Debouncer:
+    """
+    Tracks when each key last changed and hands out keys once they have
+    been left alone for settle seconds, so that a student saving several
+    files in a row is graded once, after the last save.
+    """
+
+    def __init__(self, settle):
+        self.settle = settle
+        self.last_change = {}
+
+    def touch(self, keys, now=None):
+        now = time.monotonic() if now is None else now
+        for key in keys:
+            self.last_change[key] = now
+
+    def settled(self, now=None):
+        """
+        Returns (and forgets) the keys that have settled.
+        """
+        now = time.monotonic() if now is None else now
+        keys = [key for key, last in self.last_change.items()
+                if now - last >= self.settle]
+        for key in keys:
+            del self.last_change[key]
+        return sorted(keys)
+
+    def next_deadline(self, now=None):
+        """
+        Returns the seconds until the next key settles, or None if nothing
+        is pending.
+        """
+        if not self.last_change:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(self.last_change.values()) + self.settle - now)
+
+# END METHODS ##################################################################